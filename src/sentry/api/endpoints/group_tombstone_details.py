@@ -38,6 +38,7 @@ class GroupTombstoneDetailsEndpoint(ProjectEndpoint):
             # will allow new events to be captured
             group_tombstone_id=None,
         )
+        GroupHash.invalidate_cache([project.id])
 
         tombstone.delete()
 
@@ -348,7 +348,10 @@ class ProjectGroupIndexEndpoint(ProjectEndpoint, EnvironmentMixin):
                 return response
 
         try:
-            cursor_result, query_kwargs = self._search(request, project, {'count_hits': True})
+            cursor_result, query_kwargs = self._search(request, project, {
+                'count_hits': True,
+                'paginator_options': {'approximate_hits': True},
+            })
         except ValidationError as exc:
             return Response({'detail': six.text_type(exc)}, status=400)
 
@@ -497,6 +500,8 @@ class ProjectGroupIndexEndpoint(ProjectEndpoint, EnvironmentMixin):
                             group_tombstone_id=tombstone.id,
                         )
 
+            GroupHash.invalidate_cache([project.id])
+
             self._delete_groups(request, project, groups_to_delete)
 
             return Response(status=204)
@@ -10,23 +10,33 @@ from __future__ import absolute_import
 import bisect
 import functools
 import math
+import six
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db import connections
+from django.db.models import Q
 from django.db.models.sql.datastructures import EmptyResultSet
 from django.utils import timezone
 
+from sentry.utils import json, metrics
+from sentry.utils.cache import cache
 from sentry.utils.cursors import build_cursor, Cursor, CursorResult
+from sentry.utils.dates import epoch
+from sentry.utils.db import get_db_engine
+from sentry.utils.hashlib import md5_text
 
 quote_name = connections['default'].ops.quote_name
 
 
 MAX_LIMIT = 100
 MAX_HITS_LIMIT = 1000
+# how long (in seconds) approximate hit counts are cached
+APPROXIMATE_HITS_TTL = 60
 
 
 class BasePaginator(object):
-    def __init__(self, queryset, order_by=None, max_limit=MAX_LIMIT, on_results=None):
+    def __init__(self, queryset, order_by=None, max_limit=MAX_LIMIT, on_results=None,
+                 approximate_hits=False):
         if order_by:
             if order_by.startswith('-'):
                 self.key, self.desc = order_by[1:], True
@@ -38,6 +48,7 @@ class BasePaginator(object):
         self.queryset = queryset
         self.max_limit = max_limit
         self.on_results = on_results
+        self.approximate_hits = approximate_hits
 
     def _is_asc(self, is_prev):
         return (self.desc and is_prev) or not (self.desc or is_prev)
@@ -161,12 +172,52 @@ class BasePaginator(object):
             h_sql, h_params = hits_query.sql_with_params()
         except EmptyResultSet:
             return 0
+        if self.approximate_hits:
+            return self._approximate_hits(h_sql, h_params, max_hits)
+        return self._count_hits(h_sql, h_params)
+
+    def _count_hits(self, h_sql, h_params):
         cursor = connections[self.queryset.db].cursor()
         cursor.execute(u'SELECT COUNT(*) FROM ({}) as t'.format(
             h_sql,
         ), h_params)
         return cursor.fetchone()[0]
 
+    def _estimate_hits(self, h_sql, h_params):
+        """Returns the number of rows the query planner expects the hits
+        query to return, or `None` if the database cannot tell.
+        """
+        if 'postgres' not in get_db_engine(self.queryset.db):
+            return None
+        cursor = connections[self.queryset.db].cursor()
+        cursor.execute(u'EXPLAIN (FORMAT JSON) {}'.format(h_sql), h_params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def _approximate_hits(self, h_sql, h_params, max_hits):
+        """Counts hits cheaply.  If the query planner expects at least
+        `max_hits` rows the count is skipped entirely, otherwise the rows
+        are counted.  Either way the result is cached for a short while.
+        """
+        cache_key = 'api:hits:%s' % md5_text(h_sql, repr(h_params)).hexdigest()
+        hits = cache.get(cache_key)
+        if hits is not None:
+            metrics.incr('api.paginator.approximate_hits', tags={'result': 'cached'})
+            return hits
+
+        hits = self._estimate_hits(h_sql, h_params)
+        if hits is not None and hits >= max_hits:
+            metrics.incr('api.paginator.approximate_hits', tags={'result': 'estimated'})
+            hits = max_hits
+        else:
+            metrics.incr('api.paginator.approximate_hits', tags={'result': 'counted'})
+            hits = self._count_hits(h_sql, h_params)
+
+        cache.set(cache_key, hits, APPROXIMATE_HITS_TTL)
+        return hits
+
 
 class Paginator(BasePaginator):
     def get_item_key(self, item, for_prev=False):
@@ -191,6 +242,99 @@ class DateTimePaginator(BasePaginator):
         )
 
 
+class KeysetPaginator(BasePaginator):
+    """
+    Pages through a queryset by seeking past the sort value and id of the
+    last item of a page, so that deep pages are as cheap to fetch as the
+    first one and items with the same sort value are never skipped.
+
+    The offset of the cursors holds the id of the item to seek past, which
+    requires the sort values in cursors to be exact.
+    """
+
+    def get_item_key(self, item, for_prev=False):
+        return int(getattr(item, self.key))
+
+    def value_from_cursor(self, cursor):
+        return cursor.value
+
+    def _build_queryset(self, cursor):
+        asc = self._is_asc(cursor.is_prev)
+        direction = '' if asc else '-'
+        queryset = self.queryset.order_by(
+            '%s%s' % (direction, self.key),
+            '%sid' % direction,
+        )
+
+        # Ids are always positive, no id means no position to seek from.
+        if cursor.offset:
+            value = self.value_from_cursor(cursor)
+            op = 'gt' if asc else 'lt'
+            queryset = queryset.filter(
+                Q(**{'%s__%s' % (self.key, op): value}) |
+                Q(**{self.key: value, 'id__%s' % op: cursor.offset})
+            )
+
+        return queryset
+
+    def get_result(self, limit=100, cursor=None, count_hits=False):
+        if cursor is None:
+            cursor = Cursor(0, 0, 0)
+
+        limit = min(limit, self.max_limit)
+
+        queryset = self._build_queryset(cursor)
+
+        if count_hits:
+            hits = self.count_hits(MAX_HITS_LIMIT)
+        else:
+            hits = None
+
+        # The + 1 is needed so we know if there is another page.
+        results = list(queryset[:limit + 1])
+        has_more = len(results) > limit
+        results = results[:limit]
+
+        if cursor.is_prev:
+            results.reverse()
+            has_prev, has_next = has_more, bool(cursor.offset)
+        else:
+            has_prev, has_next = bool(cursor.offset), has_more
+
+        if results:
+            first, last = results[0], results[-1]
+            prev_cursor = Cursor(self.get_item_key(first), first.id, True, has_prev)
+            next_cursor = Cursor(self.get_item_key(last), last.id, False, has_next)
+        else:
+            prev_cursor = Cursor(cursor.value, cursor.offset, True, has_prev)
+            next_cursor = Cursor(cursor.value, cursor.offset, False, has_next)
+
+        if self.on_results:
+            results = self.on_results(results)
+
+        return CursorResult(
+            results=results,
+            next=next_cursor,
+            prev=prev_cursor,
+            hits=hits,
+            max_hits=MAX_HITS_LIMIT if count_hits else None,
+        )
+
+
+class DateTimeKeysetPaginator(KeysetPaginator):
+    """
+    A `KeysetPaginator` for datetime keys.  Cursor values are microseconds
+    since the epoch so they are exact.
+    """
+
+    def get_item_key(self, item, for_prev=False):
+        delta = getattr(item, self.key) - epoch
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+    def value_from_cursor(self, cursor):
+        return epoch + timedelta(microseconds=cursor.value)
+
+
 # TODO(dcramer): previous cursors are too complex at the moment for many things
 # and are only useful for polling situations. The OffsetPaginator ignores them
 # entirely and uses standard paging
@@ -260,7 +404,10 @@ def reverse_bisect_left(a, x, lo=0, hi=None):
 
 
 class SequencePaginator(object):
-    def __init__(self, data, reverse=False, max_limit=MAX_LIMIT, on_results=None):
+    # ``approximate_hits`` is accepted for compatibility with the other
+    # paginators, the hits are always known exactly here.
+    def __init__(self, data, reverse=False, max_limit=MAX_LIMIT, on_results=None,
+                 approximate_hits=False):
         self.scores, self.values = map(
             list,
             zip(*sorted(data, reverse=reverse)),
@@ -0,0 +1,105 @@
+from __future__ import absolute_import
+
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.db import connections, transaction
+
+from sentry.app import env
+from sentry.utils import metrics
+
+__all__ = ['LoaderBatch']
+
+# the number of loaders that are run concurrently by each process
+MAX_LOADER_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_LOADER_WORKERS)
+        return _executor
+
+
+def _get_request_cache():
+    request = env.request
+    if request is None:
+        return None
+    try:
+        return request._serializer_loader_cache
+    except AttributeError:
+        request._serializer_loader_cache = rv = {}
+        return rv
+
+
+def _run_loader(name, func):
+    with metrics.timer('serializers.loader', tags={'loader': name}):
+        return func()
+
+
+def _run_loader_in_thread(name, func):
+    try:
+        return _run_loader(name, func)
+    finally:
+        # Database connections are per thread, close the ones opened by the
+        # loader so that the worker does not keep them open indefinitely.
+        for connection in connections.all():
+            connection.close()
+
+
+class LoaderBatch(object):
+    """Runs independent loaders of a serializer concurrently.  Loaders are
+    started as soon as they are added and their results are collected with
+    `get_results`:
+
+    >>> batch = LoaderBatch()
+    >>> batch.add('bookmarks', lambda: load_bookmarks(groups),
+    >>>           key=('group.bookmarks', user.id, group_ids))
+    >>> results = batch.get_results()
+    >>> results['bookmarks']
+
+    Loaders with a `key` are only run once per request, later batches of
+    the same request reuse their results.
+
+    Inside a transaction the loaders are run on the calling thread instead,
+    as other threads use other database connections and would not see the
+    changes made by it.
+    """
+
+    def __init__(self):
+        self.concurrent = not transaction.get_connection().in_atomic_block
+        self.request_cache = _get_request_cache()
+        self.futures = {}
+
+    def add(self, name, func, key=None):
+        assert name not in self.futures, 'Duplicate loader %r' % name
+
+        if key is not None and self.request_cache is not None:
+            future = self.request_cache.get(key)
+            if future is not None:
+                metrics.incr('serializers.loader.deduplicated', tags={'loader': name})
+                self.futures[name] = future
+                return
+
+        if self.concurrent:
+            future = get_executor().submit(_run_loader_in_thread, name, func)
+        else:
+            future = Future()
+            try:
+                future.set_result(_run_loader(name, func))
+            except Exception as e:
+                future.set_exception(e)
+
+        if key is not None and self.request_cache is not None:
+            self.request_cache[key] = future
+        self.futures[name] = future
+
+    def get_results(self):
+        """Waits for all loaders to finish and returns their results by
+        name.  If a loader failed its exception is raised.
+        """
+        return dict((name, future.result()) for name, future in self.futures.items())
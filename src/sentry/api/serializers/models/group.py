@@ -11,6 +11,7 @@ from django.utils import timezone
 
 from sentry import tagstore, tsdb
 from sentry.api.serializers import Serializer, register, serialize
+from sentry.api.serializers.loader import LoaderBatch
 from sentry.api.serializers.models.actor import ActorSerializer
 from sentry.api.fields.actor import Actor
 from sentry.constants import LOG_LEVELS, StatsPeriod
@@ -113,6 +114,23 @@ class GroupSerializer(Serializer):
 
         return results
 
+    def _get_environment_stats(self, project_id, item_ids, environment):
+        environment_tagvalues = tagstore.get_group_list_tag_value(
+            project_id,
+            item_ids,
+            environment.id,
+            'environment',
+            environment.name,
+        )
+        first_seen = {}
+        last_seen = {}
+        times_seen = {}
+        for item_id, value in environment_tagvalues.items():
+            first_seen[item_id] = value.first_seen
+            last_seen[item_id] = value.last_seen
+            times_seen[item_id] = value.times_seen
+        return first_seen, last_seen, times_seen
+
     def get_attrs(self, item_list, user):
         from sentry.plugins import plugins
 
@@ -120,74 +138,56 @@ class GroupSerializer(Serializer):
 
         attach_foreignkey(item_list, Group.project)
 
+        # All of these are independent of each other and are loaded
+        # concurrently.
+        item_ids = frozenset(g.id for g in item_list)
+        loaders = LoaderBatch()
+
         if user.is_authenticated() and item_list:
-            bookmarks = set(
+            loaders.add('bookmarks', lambda: set(
                 GroupBookmark.objects.filter(
                     user=user,
                     group__in=item_list,
                 ).values_list('group_id', flat=True)
-            )
-            seen_groups = dict(
+            ), key=('group.bookmarks', user.id, item_ids))
+            loaders.add('seen_groups', lambda: dict(
                 GroupSeen.objects.filter(
                     user=user,
                     group__in=item_list,
                 ).values_list('group_id', 'last_seen')
-            )
-            subscriptions = self._get_subscriptions(item_list, user)
-        else:
-            bookmarks = set()
-            seen_groups = {}
-            subscriptions = defaultdict(lambda: (False, None))
+            ), key=('group.seen', user.id, item_ids))
+            loaders.add('subscriptions', lambda: self._get_subscriptions(item_list, user),
+                        key=('group.subscriptions', user.id, item_ids))
 
-        assignees = {
+        loaders.add('assignees', lambda: {
             a.group_id: a.assigned_actor() for a in
             GroupAssignee.objects.filter(
                 group__in=item_list,
             )
-        }
-        resolved_assignees = Actor.resolve_dict(assignees)
+        }, key=('group.assignees', item_ids))
 
         try:
             environment = self.environment_func()
         except Environment.DoesNotExist:
-            user_counts = {}
-            first_seen = {}
-            last_seen = {}
-            times_seen = {}
+            has_environment = False
         else:
+            has_environment = True
             project_id = item_list[0].project_id
-            item_ids = [g.id for g in item_list]
-            user_counts = tagstore.get_groups_user_counts(
+            loaders.add('user_counts', lambda: tagstore.get_groups_user_counts(
                 project_id,
-                item_ids,
+                list(item_ids),
                 environment_id=environment and environment.id,
-            )
-            first_seen = {}
-            last_seen = {}
-            times_seen = {}
+            ), key=('group.user_counts', item_ids, environment and environment.id))
             if environment is not None:
-                environment_tagvalues = tagstore.get_group_list_tag_value(
-                    project_id,
-                    item_ids,
-                    environment.id,
-                    'environment',
-                    environment.name,
-                )
-                for item_id, value in environment_tagvalues.items():
-                    first_seen[item_id] = value.first_seen
-                    last_seen[item_id] = value.last_seen
-                    times_seen[item_id] = value.times_seen
-            else:
-                for item in item_list:
-                    first_seen[item.id] = item.first_seen
-                    last_seen[item.id] = item.last_seen
-                    times_seen[item.id] = item.times_seen
+                loaders.add('environment_stats', lambda: self._get_environment_stats(
+                    project_id, list(item_ids), environment,
+                ), key=('group.environment_stats', item_ids, environment.id))
 
-        ignore_items = {g.group_id: g for g in GroupSnooze.objects.filter(
+        loaders.add('ignore_items', lambda: {g.group_id: g for g in GroupSnooze.objects.filter(
             group__in=item_list,
-        )}
+        )}, key=('group.snoozes', item_ids))
 
-        resolutions = {
+        loaders.add('resolutions', lambda: {
             i[0]: i[1:]
             for i in GroupResolution.objects.filter(
                 group__in=item_list,
@@ -197,7 +197,47 @@ class GroupSerializer(Serializer):
                 'release__version',
                 'actor_id',
             )
-        }
+        }, key=('group.resolutions', item_ids))
+
+        loaders.add('share_ids', lambda: dict(GroupShare.objects.filter(
+            group__in=item_list,
+        ).values_list('group_id', 'uuid')), key=('group.shares', item_ids))
+
+        # Plugins are asked for annotations on this thread while the
+        # loaders are running.
+        annotations_by_item = {}
+        for item in item_list:
+            annotations = []
+            for plugin in plugins.for_project(project=item.project, version=1):
+                safe_execute(plugin.tags, None, item, annotations, _with_transaction=False)
+            for plugin in plugins.for_project(project=item.project, version=2):
+                annotations.extend(
+                    safe_execute(plugin.get_annotations, group=item, _with_transaction=False) or ()
+                )
+            annotations_by_item[item] = annotations
+
+        results = loaders.get_results()
+        bookmarks = results.get('bookmarks', set())
+        seen_groups = results.get('seen_groups', {})
+        if 'subscriptions' in results:
+            subscriptions = results['subscriptions']
+        else:
+            subscriptions = defaultdict(lambda: (False, None))
+        resolved_assignees = Actor.resolve_dict(results['assignees'])
+        user_counts = results.get('user_counts', {})
+        ignore_items = results['ignore_items']
+        resolutions = results['resolutions']
+        share_ids = results['share_ids']
+
+        if not has_environment:
+            first_seen, last_seen, times_seen = {}, {}, {}
+        elif environment is not None:
+            first_seen, last_seen, times_seen = results['environment_stats']
+        else:
+            first_seen = {item.id: item.first_seen for item in item_list}
+            last_seen = {item.id: item.last_seen for item in item_list}
+            times_seen = {item.id: item.times_seen for item in item_list}
+
         actor_ids = set(r[-1] for r in six.itervalues(resolutions))
         actor_ids.update(r.actor_id for r in six.itervalues(ignore_items))
         if actor_ids:
@@ -209,22 +249,10 @@ class GroupSerializer(Serializer):
         else:
             actors = {}
 
-        share_ids = dict(GroupShare.objects.filter(
-            group__in=item_list,
-        ).values_list('group_id', 'uuid'))
-
         result = {}
         for item in item_list:
             active_date = item.active_at or item.first_seen
 
-            annotations = []
-            for plugin in plugins.for_project(project=item.project, version=1):
-                safe_execute(plugin.tags, None, item, annotations, _with_transaction=False)
-            for plugin in plugins.for_project(project=item.project, version=2):
-                annotations.extend(
-                    safe_execute(plugin.get_annotations, group=item, _with_transaction=False) or ()
-                )
-
             resolution = resolutions.get(item.id)
             if resolution:
                 resolution_actor = actors.get(resolution[-1])
@@ -242,7 +270,7 @@ class GroupSerializer(Serializer):
                 'is_bookmarked': item.id in bookmarks,
                 'subscription': subscriptions[item.id],
                 'has_seen': seen_groups.get(item.id, active_date) > active_date,
-                'annotations': annotations,
+                'annotations': annotations_by_item[item],
                 'user_count': user_counts.get(item.id, 0),
                 'ignore_until': ignore_item,
                 'ignore_actor': ignore_actor,
@@ -381,7 +409,8 @@ class StreamGroupSerializer(GroupSerializer):
         self.matching_event_id = matching_event_id
 
     def get_attrs(self, item_list, user):
-        attrs = super(StreamGroupSerializer, self).get_attrs(item_list, user)
+        # The stats are loaded while the attributes of the groups are.
+        loaders = LoaderBatch()
 
         if self.stats_period:
             # we need to compute stats at 1d (1h resolution), and 14d
@@ -398,14 +427,21 @@ class StreamGroupSerializer(GroupSerializer):
             try:
                 environment = self.environment_func()
             except Environment.DoesNotExist:
-                stats = {key: tsdb.make_series(0, **query_params) for key in group_ids}
+                loaders.add('stats', lambda: {
+                    key: tsdb.make_series(0, **query_params) for key in group_ids
+                })
             else:
-                stats = tsdb.get_range(
+                loaders.add('stats', lambda: tsdb.get_range(
                     model=tsdb.models.group,
                     keys=group_ids,
                     environment_id=environment and environment.id,
                     **query_params
-                )
+                ))
+
+        attrs = super(StreamGroupSerializer, self).get_attrs(item_list, user)
+
+        if self.stats_period:
+            stats = loaders.get_results()['stats']
 
             for item in item_list:
 
@@ -0,0 +1,63 @@
+"""
+sentry.cache.codecs
+~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import zlib
+
+from sentry.utils import json
+
+
+class Codec(object):
+    def encode(self, value):
+        raise NotImplementedError
+
+    def decode(self, value):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    def encode(self, value):
+        return json.dumps(value)
+
+    def decode(self, value):
+        return json.loads(value)
+
+
+class CompressedJsonCodec(JsonCodec):
+    """
+    Encodes values as JSON and compresses everything larger than
+    ``threshold`` bytes with the fastest zlib level.  Compressed values are
+    marked with a prefix that can never start a JSON document, so plain JSON
+    values (including those written before switching to this codec) are
+    decoded as well.
+    """
+    prefix = b'z1:'
+
+    def __init__(self, threshold=1024, level=1):
+        self.threshold = threshold
+        self.level = level
+
+    def dump(self, value):
+        """
+        Returns the JSON encoded value and what is stored for it.
+        """
+        raw = super(CompressedJsonCodec, self).encode(value)
+        if len(raw) <= self.threshold:
+            return raw, raw
+        if not isinstance(raw, bytes):
+            raw = raw.encode('utf-8')
+        return raw, self.prefix + zlib.compress(raw, self.level)
+
+    def encode(self, value):
+        return self.dump(value)[1]
+
+    def decode(self, value):
+        if value[:len(self.prefix)] == self.prefix:
+            value = zlib.decompress(value[len(self.prefix):])
+        return super(CompressedJsonCodec, self).decode(value)
@@ -8,10 +8,11 @@ sentry.cache.redis
 
 from __future__ import absolute_import
 
-from sentry.utils import json
+from sentry.utils import metrics
 from sentry.utils.redis import get_cluster_from_options
 
 from .base import BaseCache
+from .codecs import CompressedJsonCodec
 
 
 class ValueTooLarge(Exception):
@@ -22,17 +23,20 @@ class RedisCache(BaseCache):
     key_expire = 60 * 60  # 1 hour
     max_size = 50 * 1024 * 1024  # 50MB
 
-    def __init__(self, **options):
+    def __init__(self, compress_threshold=1024, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_CACHE_OPTIONS', options)
         self.client = self.cluster.get_routing_client()
+        self.codec = CompressedJsonCodec(threshold=compress_threshold)
 
         super(RedisCache, self).__init__(**options)
 
     def set(self, key, value, timeout, version=None):
         key = self.make_key(key, version=version)
-        v = json.dumps(value)
-        if len(v) > self.max_size:
-            raise ValueTooLarge('Cache key too large: %r %r' % (key, len(v)))
+        raw, v = self.codec.dump(value)
+        if len(raw) > self.max_size:
+            raise ValueTooLarge('Cache key too large: %r %r' % (key, len(raw)))
+        metrics.timing('cache.redis.size', len(raw), tags={'type': 'raw'})
+        metrics.timing('cache.redis.size', len(v), tags={'type': 'stored'})
         if timeout:
             self.client.setex(key, int(timeout), v)
         else:
@@ -46,5 +50,5 @@ class RedisCache(BaseCache):
         key = self.make_key(key, version=version)
         result = self.client.get(key)
         if result is not None:
-            result = json.loads(result)
+            result = self.codec.decode(result)
         return result
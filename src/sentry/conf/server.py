@@ -433,10 +433,12 @@ CELERY_IMPORTS = (
     'sentry.tasks.check_auth', 'sentry.tasks.clear_expired_snoozes',
     'sentry.tasks.collect_project_platforms', 'sentry.tasks.commits', 'sentry.tasks.deletion',
     'sentry.tasks.digests', 'sentry.tasks.email', 'sentry.tasks.merge',
-    'sentry.tasks.options', 'sentry.tasks.ping', 'sentry.tasks.post_process',
+    'sentry.tasks.options', 'sentry.tasks.partitions', 'sentry.tasks.ping',
+    'sentry.tasks.post_process',
     'sentry.tasks.process_buffer', 'sentry.tasks.reports', 'sentry.tasks.reprocessing',
-    'sentry.tasks.scheduler', 'sentry.tasks.signals', 'sentry.tasks.store', 'sentry.tasks.unmerge',
-    'sentry.tasks.symcache_update', 'sentry.tasks.servicehooks',
+    'sentry.tasks.scheduler', 'sentry.tasks.signals', 'sentry.tasks.similarity',
+    'sentry.tasks.store', 'sentry.tasks.unmerge', 'sentry.tasks.symcache_update',
+    'sentry.tasks.servicehooks',
     'sentry.tagstore.tasks', 'sentry.tasks.assemble', 'sentry.tasks.integrations',
 )
 CELERY_QUEUES = [
@@ -466,7 +468,9 @@ CELERY_QUEUES = [
     Queue('reports.deliver', routing_key='reports.deliver'),
     Queue('reports.prepare', routing_key='reports.prepare'),
     Queue('search', routing_key='search'),
+    Queue('similarity', routing_key='similarity'),
     Queue('stats', routing_key='stats'),
+    Queue('symcache', routing_key='symcache'),
     Queue('unmerge', routing_key='unmerge'),
     Queue('update', routing_key='update'),
 ]
@@ -545,6 +549,14 @@ CELERYBEAT_SCHEDULE = {
             'expires': 30,
         },
     },
+    'flush-similarity-buffer': {
+        'task': 'sentry.tasks.similarity.flush_buffer',
+        'schedule': timedelta(seconds=10),
+        'options': {
+            'expires': 10,
+            'queue': 'similarity',
+        }
+    },
     'clear-expired-snoozes': {
         'task': 'sentry.tasks.clear_expired_snoozes',
         'schedule': timedelta(minutes=5),
@@ -573,6 +585,13 @@ CELERYBEAT_SCHEDULE = {
             'expires': 60 * 25,
         },
     },
+    'create-partitions': {
+        'task': 'sentry.tasks.partitions.create_partitions',
+        'schedule': timedelta(hours=1),
+        'options': {
+            'expires': 3600,
+        },
+    },
     'schedule-deletions': {
         'task': 'sentry.tasks.deletion.run_scheduled_deletions',
         'schedule': timedelta(minutes=15),
@@ -920,6 +939,17 @@ SENTRY_BUFFER_OPTIONS = {}
 SENTRY_CACHE = None
 SENTRY_CACHE_OPTIONS = {}
 
+# Project and organization options are kept in a process local cache for up
+# to this many seconds before their version is checked against the shared
+# cache.
+SENTRY_OPTION_CACHE_TTL = 300
+
+# Redis connection (e.g. ``{'host': 'localhost', 'port': 6379}``) used to
+# publish option changes.  When set, the process local option cache is kept
+# across requests and tasks and dropped when a change is published,
+# otherwise it is cleared at the end of every request and task.
+SENTRY_OPTION_CACHE_PUBSUB = None
+
 # The internal Django cache is still used in many places
 # TODO(dcramer): convert uses over to Sentry's backend
 CACHES = {
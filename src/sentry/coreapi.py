@@ -24,14 +24,14 @@ from gzip import GzipFile
 from six import BytesIO
 from time import time
 
-from sentry import filters
+from sentry import filters, options
 from sentry.cache import default_cache
 from sentry.interfaces.base import get_interface
 from sentry.event_manager import EventManager
 from sentry.models import ProjectKey
-from sentry.tasks.store import preprocess_event, \
+from sentry.tasks.store import get_event_cache_key, preprocess_event, \
     preprocess_event_from_reprocessing
-from sentry.utils import json
+from sentry.utils import json, metrics
 from sentry.utils.auth import parse_auth_header
 from sentry.utils.http import origin_from_request
 from sentry.utils.data_filters import is_valid_ip, \
@@ -353,10 +353,19 @@ class ClientApiHelper(object):
         # we might be passed LazyData
         if isinstance(data, LazyData):
             data = dict(data.items())
-        cache_key = 'e:{1}:{0}'.format(data['project'], data['event_id'])
-        default_cache.set(cache_key, data, timeout=3600)
         task = from_reprocessing and \
             preprocess_event_from_reprocessing or preprocess_event
+
+        # Small events are passed along in the task message, they are only
+        # put into the cache if they need processing.
+        max_inline_size = options.get('store.inline-event-max-size')
+        if max_inline_size and len(json.dumps(data)) <= max_inline_size:
+            metrics.incr('events.inline')
+            task.delay(data=data, start_time=start_time, event_id=data['event_id'])
+            return
+
+        cache_key = get_event_cache_key(data['project'], data['event_id'])
+        default_cache.set(cache_key, data, timeout=3600)
         task.delay(cache_key=cache_key, start_time=start_time,
                    event_id=data['event_id'])
 
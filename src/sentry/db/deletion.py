@@ -1,10 +1,64 @@
 from __future__ import absolute_import
 
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from django.db import connections, router
+from django.db import connections, models, router
 from django.utils import timezone
 
-from sentry.utils import db
+from sentry import options
+from sentry.utils import db, metrics
+from sentry.utils.cache import cache
+from sentry.utils.hashlib import md5_text
+
+logger = logging.getLogger(__name__)
+
+# how long (in seconds) the progress of an interrupted deletion is kept
+CHECKPOINT_TTL = 60 * 60 * 24
+
+
+class WindowProgress(object):
+    """
+    Hands out id windows to the workers of a deletion and tracks up to
+    which id all windows are done, so that an interrupted deletion can be
+    resumed from there.
+    """
+
+    def __init__(self, lower, upper, window_size):
+        self.next = lower
+        self.upper = upper
+        self.window_size = window_size
+        self.pending = set()
+        self.rows = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def claim(self):
+        """Returns the next ``(lower, upper)`` window or `None`."""
+        with self.lock:
+            if self.next > self.upper:
+                return None
+            lower = self.next
+            self.next += self.window_size
+            self.pending.add(lower)
+            return lower, self.next
+
+    def complete(self, window, rows):
+        """
+        Marks a window as done and returns the id everything below of which
+        is done.
+        """
+        with self.lock:
+            self.pending.discard(window[0])
+            self.rows += rows
+            return min(self.pending) if self.pending else self.next
+
+    @property
+    def rate(self):
+        return self.rows / max(time.time() - self.started, 0.001)
 
 
 class BulkDeleteQuery(object):
@@ -15,6 +69,7 @@ class BulkDeleteQuery(object):
         self.days = int(days) if days is not None else None
         self.order_by = order_by
         self.using = router.db_for_write(model)
+        self._warned_replication_lag = False
 
     def execute_postgres(self, chunk_size=10000):
         quote_name = connections[self.using].ops.quote_name
@@ -68,6 +123,32 @@ class BulkDeleteQuery(object):
 
         return self._continuous_query(query)
 
+    def execute_partitioned(self):
+        """
+        Drops the partitions that only hold expired rows if the table is
+        partitioned by `dtfield`.  Returns `False` if the table is not, in
+        which case rows have to be deleted instead.
+
+        Rows are removed a whole partition at a time, so up to one partition
+        interval of expired rows is kept around.
+        """
+        from sentry.db.postgres.partitioning import PartitionManager
+
+        if self.project_id or not self.dtfield or self.days is None:
+            return False
+        if not db.is_postgres(self.using):
+            return False
+
+        table = self.model._meta.db_table
+        manager = PartitionManager(using=self.using)
+        partitioning = manager.get_partitioning(table)
+        column = self.model._meta.get_field(self.dtfield).column
+        if partitioning is None or partitioning.column != column:
+            return False
+
+        manager.drop_partitions(table, timezone.now() - timedelta(days=self.days))
+        return True
+
     def _continuous_query(self, query):
         results = True
         cursor = connections[self.using].cursor()
@@ -122,8 +203,161 @@ class BulkDeleteQuery(object):
                 item.delete()
                 exists = True
 
-    def execute(self, chunk_size=10000):
-        if db.is_postgres():
+    def _get_cutoff(self):
+        if self.dtfield and self.days is not None:
+            return timezone.now() - timedelta(days=self.days)
+        return None
+
+    def _get_queryset(self, cutoff):
+        qs = self.model.objects.all()
+        if cutoff is not None:
+            qs = qs.filter(**{'{}__lt'.format(self.dtfield): cutoff})
+        if self.project_id:
+            if 'project' in self.model._meta.get_all_field_names():
+                qs = qs.filter(project=self.project_id)
+            else:
+                qs = qs.filter(project_id=self.project_id)
+        return qs
+
+    def _get_checkpoint_key(self):
+        return 'bulk-delete:{}'.format(md5_text(
+            self.using, self.model._meta.db_table, self.dtfield, self.days, self.project_id,
+        ).hexdigest())
+
+    def _get_replication_lag(self):
+        """
+        Returns the replay lag of the replicas in seconds, or `None` if the
+        server does not report it (before PostgreSQL 10).
+        """
+        cursor = connections[self.using].cursor()
+        cursor.execute('show server_version_num')
+        if int(cursor.fetchone()[0]) < 100000:
+            return None
+        cursor.execute("""
+            select coalesce(max(extract(epoch from replay_lag)), 0)
+            from pg_stat_replication
+        """)
+        return cursor.fetchone()[0]
+
+    def _throttle(self, progress):
+        max_rate = options.get('cleanup.max-rows-per-second')
+        if max_rate:
+            delay = progress.rows / float(max_rate) - (time.time() - progress.started)
+            if delay > 0:
+                metrics.incr('cleanup.throttled', tags={'reason': 'rate'})
+                time.sleep(delay)
+
+        max_lag = options.get('cleanup.max-replication-lag')
+        if max_lag and db.is_postgres(self.using):
+            lag = self._get_replication_lag()
+            if lag is None and not self._warned_replication_lag:
+                self._warned_replication_lag = True
+                logger.warning('cleanup.replication_lag.unsupported', extra={
+                    'using': self.using,
+                })
+            while lag is not None and lag > max_lag:
+                metrics.incr('cleanup.throttled', tags={'reason': 'replication_lag'})
+                time.sleep(1)
+                lag = self._get_replication_lag()
+
+    def _delete_window(self, window, cutoff):
+        """Deletes the matching rows in an id window, returns their number."""
+        lower, upper = window
+        if db.is_postgres(self.using):
+            quote_name = connections[self.using].ops.quote_name
+            where = ['id >= %s', 'id < %s']
+            params = [lower, upper]
+            if cutoff is not None:
+                where.append('{} < %s'.format(
+                    quote_name(self.model._meta.get_field(self.dtfield).column)))
+                params.append(cutoff)
+            if self.project_id:
+                where.append('project_id = %s')
+                params.append(self.project_id)
+            cursor = connections[self.using].cursor()
+            cursor.execute('delete from {} where {}'.format(
+                quote_name(self.model._meta.db_table),
+                ' and '.join(where),
+            ), params)
+            return cursor.rowcount
+
+        # Other databases delete row by row to keep the cascades and
+        # signals of the models.
+        rows = 0
+        for item in self._get_queryset(cutoff).filter(
+            id__gte=lower,
+            id__lt=upper,
+        ).iterator():
+            item.delete()
+            rows += 1
+        return rows
+
+    def _run_windows(self, progress, cutoff, checkpoint_key):
+        model_name = self.model.__name__
+        while True:
+            window = progress.claim()
+            if window is None:
+                return
+            rows = self._delete_window(window, cutoff)
+            cache.set(checkpoint_key, progress.complete(window, rows), CHECKPOINT_TTL)
+            metrics.incr('cleanup.rows', amount=rows, tags={'model': model_name})
+            self._throttle(progress)
+
+    def _run_windows_in_thread(self, progress, cutoff, checkpoint_key):
+        try:
+            self._run_windows(progress, cutoff, checkpoint_key)
+        finally:
+            connections[self.using].close()
+
+    def execute_windowed(self, chunk_size=10000, concurrency=1):
+        """
+        Deletes the matching rows by walking the primary key range of the
+        matching rows in windows of `chunk_size` ids, `concurrency` windows at a time on separate
+        connections.  Each window is a single statement that only touches
+        the rows it deletes.
+
+        Progress is checkpointed in the cache, so a deletion that was
+        interrupted continues where it left off.  Deletions are throttled
+        by the ``cleanup.max-rows-per-second`` and
+        ``cleanup.max-replication-lag`` options.
+        """
+        cutoff = self._get_cutoff()
+        id_range = self._get_queryset(cutoff).using(self.using).aggregate(
+            lower=models.Min('id'),
+            upper=models.Max('id'),
+        )
+        lower, upper = id_range['lower'], id_range['upper']
+        if lower is None:
+            return
+
+        checkpoint_key = self._get_checkpoint_key()
+        checkpoint = cache.get(checkpoint_key)
+        if checkpoint is not None and lower < checkpoint <= upper:
+            lower = checkpoint
+
+        progress = WindowProgress(lower, upper, chunk_size)
+        if concurrency > 1:
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+            futures = [
+                executor.submit(self._run_windows_in_thread, progress, cutoff, checkpoint_key)
+                for _ in range(concurrency)
+            ]
+            executor.shutdown()
+            for future in futures:
+                future.result()
+        else:
+            self._run_windows(progress, cutoff, checkpoint_key)
+
+        cache.delete(checkpoint_key)
+        metrics.timing('cleanup.rows_per_second', progress.rate,
+                       tags={'model': self.model.__name__})
+
+    def execute(self, chunk_size=10000, concurrency=1):
+        if self.execute_partitioned():
+            return
+        if isinstance(self.model._meta.pk, models.AutoField):
+            self.execute_windowed(chunk_size, concurrency)
+        elif db.is_postgres():
             self.execute_postgres(chunk_size)
         else:
             self.execute_generic(chunk_size)
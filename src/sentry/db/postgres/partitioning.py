@@ -0,0 +1,305 @@
+"""
+sentry.db.postgres.partitioning
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Optional time based partitioning for tables that only ever grow and are
+trimmed by age.  Retention for a partitioned table is implemented by
+dropping whole partitions instead of deleting rows.
+
+A table is converted with ``sentry partitions enable``:
+
+- The existing table is renamed to ``<table>_legacy``.
+- A partitioned table is created in its place and the legacy table is
+  attached as the partition for everything before the next period.
+- An empty ``<table>_template`` table keeps the indexes and constraints that
+  every new partition is created with.  Constraints therefore only hold per
+  partition.  Migrations only alter the partitioned table and its existing
+  partitions, the columns of the template are brought in line with the
+  partitioned table whenever partitions are created.  Indexes that a
+  migration adds to the partitioned table are added to new partitions by
+  PostgreSQL when they are attached.
+- A ``<table>_default`` partition takes rows that no other partition covers,
+  e.g. events with an old timestamp once the partitions for it were dropped,
+  or rows for periods that no partition was created for yet.  Its rows are
+  moved when the partition for them is created and deleted by retention.
+
+Requires PostgreSQL 11 or later, as updated rows (e.g. nodes) can move
+between partitions.
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import re
+import six
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from django.db import connections, transaction
+from django.utils import timezone
+
+__all__ = ['PartitionManager', 'PARTITIONABLE_TABLES']
+
+# table -> timestamp column it can be partitioned by
+PARTITIONABLE_TABLES = {
+    'sentry_message': 'datetime',
+    'sentry_eventtag': 'date_added',
+    'nodestore_node': 'timestamp',
+}
+
+INTERVALS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+}
+
+_comment_re = re.compile(r'^sentry:partitioned:(?P<column>\w+):(?P<interval>\w+)$')
+_bound_re = re.compile(r"FROM \((?P<lower>[^)]+)\) TO \((?P<upper>[^)]+)\)")
+
+Partitioning = namedtuple('Partitioning', ['column', 'interval'])
+Partition = namedtuple('Partition', ['name', 'lower', 'upper'])
+
+
+def floor_period(value, interval):
+    """Returns the start of the period `value` falls into."""
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        value -= timedelta(days=value.weekday())
+    return value
+
+
+def parse_bound(value):
+    """
+    Parses a bound of a range partition as rendered by ``pg_get_expr``,
+    returns `None` for ``MINVALUE`` and ``MAXVALUE``.
+    """
+    value = value.strip()
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.strptime(value.strip("'")[:19], '%Y-%m-%d %H:%M:%S') \
+        .replace(tzinfo=timezone.utc)
+
+
+def get_partition_name(table, lower):
+    return '%s_p%s' % (table, lower.strftime('%Y%m%d'))
+
+
+def get_default_partition_name(table):
+    return '%s_default' % (table, )
+
+
+class PartitionManager(object):
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def quote_name(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def get_partitioning(self, table):
+        """
+        Returns how `table` is partitioned, or `None` if it is a regular
+        table.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """
+            select obj_description(oid, 'pg_class')
+            from pg_class
+            where relname = %s and relkind = 'p'
+        """, [table]
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+        match = _comment_re.match(row[0])
+        if match is None:
+            return None
+        return Partitioning(match.group('column'), match.group('interval'))
+
+    def get_partitions(self, table):
+        """Returns the partitions of `table` ordered by their lower bound."""
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """
+            select child.relname, pg_get_expr(child.relpartbound, child.oid)
+            from pg_inherits
+            join pg_class parent on parent.oid = pg_inherits.inhparent
+            join pg_class child on child.oid = pg_inherits.inhrelid
+            where parent.relname = %s
+        """, [table]
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = _bound_re.search(bound or '')
+            if match is None:
+                continue
+            partitions.append(Partition(
+                name,
+                parse_bound(match.group('lower')),
+                parse_bound(match.group('upper')),
+            ))
+        partitions.sort(key=lambda p: (p.lower is not None, p.lower))
+        return partitions
+
+    def get_columns(self, table):
+        """Returns ``(type, not null)`` of the columns of `table` by name."""
+        cursor = self.connection.cursor()
+        cursor.execute(
+            """
+            select attname, format_type(atttypid, atttypmod), attnotnull
+            from pg_attribute
+            where attrelid = %s::regclass and attnum > 0 and not attisdropped
+        """, [self.quote_name(table)]
+        )
+        return dict((name, (type, not_null)) for name, type, not_null in cursor.fetchall())
+
+    def sync_template(self, table):
+        """
+        Brings the columns of the template of `table` in line with the
+        partitioned table, as partitions can only be attached if their
+        columns match it.
+        """
+        qn = self.quote_name
+        template = qn('%s_template' % table)
+        columns = self.get_columns(table)
+        template_columns = self.get_columns('%s_template' % table)
+
+        cursor = self.connection.cursor()
+        for name in set(template_columns) - set(columns):
+            cursor.execute('alter table %s drop column %s' % (template, qn(name)))
+        for name, (type, not_null) in six.iteritems(columns):
+            if name not in template_columns:
+                cursor.execute('alter table %s add column %s %s%s' % (
+                    template, qn(name), type, ' not null' if not_null else ''))
+                continue
+            template_type, template_not_null = template_columns[name]
+            if template_type != type:
+                cursor.execute('alter table %s alter column %s type %s' % (
+                    template, qn(name), type))
+            if template_not_null != not_null:
+                cursor.execute('alter table %s alter column %s %s not null' % (
+                    template, qn(name), 'set' if not_null else 'drop'))
+
+    def has_default_partition(self, table):
+        cursor = self.connection.cursor()
+        cursor.execute('select to_regclass(%s)', [get_default_partition_name(table)])
+        return cursor.fetchone()[0] is not None
+
+    def enable(self, table, interval='day', ahead=3):
+        """
+        Converts `table` into a partitioned table.  This takes an exclusive
+        lock on the table while the existing rows are validated against the
+        bounds of the legacy partition.
+        """
+        assert interval in INTERVALS, 'Unknown interval %r' % (interval, )
+        column = PARTITIONABLE_TABLES[table]
+        qn = self.quote_name
+        legacy = '%s_legacy' % table
+        template = '%s_template' % table
+        cutover = floor_period(timezone.now(), interval) + INTERVALS[interval]
+
+        with transaction.atomic(using=self.using):
+            cursor = self.connection.cursor()
+            cursor.execute('select pg_get_serial_sequence(%s, %s)', [table, 'id'])
+            sequence = cursor.fetchone()[0]
+
+            cursor.execute('alter table %s rename to %s' % (qn(table), qn(legacy)))
+            cursor.execute(
+                'create table %s (like %s including defaults) partition by range (%s)' %
+                (qn(table), qn(legacy), qn(column))
+            )
+            cursor.execute('create table %s (like %s including all)' % (qn(template), qn(legacy)))
+            if sequence is not None:
+                # Keep the sequence around when the legacy partition is dropped.
+                cursor.execute('alter sequence %s owned by %s.%s' % (sequence, qn(table), qn('id')))
+            cursor.execute(
+                'alter table %s attach partition %s for values from (minvalue) to (%%s)' %
+                (qn(table), qn(legacy)), [cutover]
+            )
+            cursor.execute('create table %s (like %s including all)' % (
+                qn(get_default_partition_name(table)), qn(template)))
+            cursor.execute('alter table %s attach partition %s default' % (
+                qn(table), qn(get_default_partition_name(table))))
+            cursor.execute(
+                'comment on table %s is %%s' % (qn(table), ),
+                ['sentry:partitioned:%s:%s' % (column, interval)]
+            )
+            self.create_partitions(table, ahead=ahead)
+
+    def create_partitions(self, table, ahead=3):
+        """
+        Makes sure partitions exist for the current and the next `ahead`
+        periods.  Returns the names of the created partitions.
+        """
+        partitioning = self.get_partitioning(table)
+        if partitioning is None:
+            return []
+
+        qn = self.quote_name
+        step = INTERVALS[partitioning.interval]
+        partitions = self.get_partitions(table)
+        lower = max(p.upper for p in partitions) if partitions else \
+            floor_period(timezone.now(), partitioning.interval)
+        until = floor_period(timezone.now(), partitioning.interval) + step * (ahead + 1)
+
+        default = get_default_partition_name(table) \
+            if self.has_default_partition(table) else None
+
+        created = []
+        cursor = self.connection.cursor()
+        if lower < until:
+            with transaction.atomic(using=self.using):
+                self.sync_template(table)
+        while lower < until:
+            name = get_partition_name(table, lower)
+            with transaction.atomic(using=self.using):
+                cursor.execute('create table %s (like %s including all)' % (
+                    qn(name), qn('%s_template' % table)))
+                if default is not None:
+                    # Rows in the default partition that belong into the new
+                    # one would make attaching it fail.
+                    column = qn(partitioning.column)
+                    cursor.execute(
+                        """
+                        with moved as (
+                            delete from %s where %s >= %%s and %s < %%s returning *
+                        )
+                        insert into %s select * from moved
+                    """ % (qn(default), column, column, qn(name)), [lower, lower + step]
+                    )
+                cursor.execute(
+                    'alter table %s attach partition %s for values from (%%s) to (%%s)' %
+                    (qn(table), qn(name)), [lower, lower + step]
+                )
+            created.append(name)
+            lower += step
+        return created
+
+    def drop_partitions(self, table, cutoff):
+        """
+        Drops all partitions of `table` that only hold rows older than
+        `cutoff` and deletes the older rows from the default partition.
+        Returns the names of the dropped partitions.
+        """
+        qn = self.quote_name
+        dropped = []
+        cursor = self.connection.cursor()
+
+        partitioning = self.get_partitioning(table)
+        if partitioning is not None and self.has_default_partition(table):
+            cursor.execute('delete from %s where %s < %%s' % (
+                qn(get_default_partition_name(table)), qn(partitioning.column)), [cutoff])
+
+        for partition in self.get_partitions(table):
+            if partition.upper is None or partition.upper > cutoff:
+                continue
+            with transaction.atomic(using=self.using):
+                cursor.execute('alter table %s detach partition %s' % (
+                    qn(table), qn(partition.name)))
+                cursor.execute('drop table %s' % (qn(partition.name), ))
+            dropped.append(partition.name)
+        return dropped
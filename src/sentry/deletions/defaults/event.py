@@ -1,5 +1,8 @@
 from __future__ import absolute_import, print_function
 
+from django.db import router
+from django.db.models.sql import DeleteQuery
+
 from sentry import nodestore
 
 from ..base import (BaseDeletionTask, BaseRelation, ModelDeletionTask)
@@ -20,3 +23,11 @@ class EventDeletionTask(ModelDeletionTask):
         node_ids = [i.data.id for i in instance_list]
 
         return [BaseRelation({'nodes': node_ids}, NodeDeletionTask)]
+
+    def delete_instance_bulk(self, instance_list):
+        # Events have no relations the database would need to cascade to,
+        # their nodes and tags are removed as child relations beforehand.
+        DeleteQuery(self.model).delete_batch(
+            [i.id for i in instance_list],
+            router.db_for_write(self.model),
+        )
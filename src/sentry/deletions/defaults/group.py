@@ -1,13 +1,15 @@
 from __future__ import absolute_import, print_function
 
+from collections import defaultdict
+
 from ..base import ModelDeletionTask, ModelRelation
 
 
 class GroupDeletionTask(ModelDeletionTask):
-    def get_child_relations(self, instance):
+    def get_child_relations_bulk(self, instance_list):
         from sentry import models
 
-        relations = []
+        group_ids = [i.id for i in instance_list]
 
         model_list = (
             # prioritize GroupHash
@@ -33,17 +35,59 @@ class GroupDeletionTask(ModelDeletionTask):
             models.Event,
         )
 
-        relations.extend([ModelRelation(m, {'group_id': instance.id}) for m in model_list])
-
-        return relations
+        return [ModelRelation(m, {'group_id__in': group_ids}) for m in model_list]
 
-    def delete_instance(self, instance):
+    def delete_instance_bulk(self, instance_list):
+        from sentry import tsdb
         from sentry.similarity import features
 
         if not self.skip_models or features not in self.skip_models:
-            features.delete(instance)
+            for instance in instance_list:
+                features.delete(instance)
+
+        if not self.skip_models or tsdb not in self.skip_models:
+            self.delete_tsdb_data(instance_list)
+
+        # The children are gone already, this lets Django collect whatever
+        # is left for all groups of the chunk at once.
+        self.model.objects.filter(
+            id__in=[i.id for i in instance_list],
+        ).delete()
+        for instance in instance_list:
+            self.logger.info(
+                'object.delete.executed',
+                extra={
+                    'object_id': instance.id,
+                    'transaction_id': self.transaction_id,
+                    'app_label': instance._meta.app_label,
+                    'model': type(instance).__name__,
+                }
+            )
+
+    def delete_tsdb_data(self, instance_list):
+        from sentry import tsdb
+        from sentry.models import Environment
+
+        group_ids_by_project = defaultdict(list)
+        for instance in instance_list:
+            group_ids_by_project[instance.project_id].append(instance.id)
 
-        return super(GroupDeletionTask, self).delete_instance(instance)
+        for project_id, group_ids in group_ids_by_project.items():
+            environment_ids = list(
+                Environment.objects.filter(
+                    projects=project_id,
+                ).values_list('id', flat=True)
+            )
+            tsdb.delete([
+                tsdb.models.group,
+            ], group_ids, environment_ids=environment_ids)
+            tsdb.delete_distinct_counts([
+                tsdb.models.users_affected_by_group,
+            ], group_ids, environment_ids=environment_ids)
+            tsdb.delete_frequencies([
+                tsdb.models.frequent_releases_by_group,
+                tsdb.models.frequent_environments_by_group,
+            ], group_ids)
 
     def mark_deletion_in_progress(self, instance_list):
         from sentry.models import GroupStatus
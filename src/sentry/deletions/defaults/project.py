@@ -40,10 +40,14 @@ class ProjectDeletionTask(ModelDeletionTask):
         # special case event due to nodestore
         relations.extend([ModelRelation(models.Event, {'project_id': instance.id})])
 
+        # Groups go through their own task, which removes their remaining
+        # children and time series data in bulk.
+        relations.append(ModelRelation(models.Group, {'project_id': instance.id}))
+
         # in bulk
         # Release needs to handle deletes after Group is cleaned up as the foreign
         # key is protected
-        model_list = (models.Group, models.ReleaseProject, models.ReleaseProjectEnvironment, models.ProjectDSymFile,
+        model_list = (models.ReleaseProject, models.ReleaseProjectEnvironment, models.ProjectDSymFile,
                       models.ProjectSymCacheFile)
         relations.extend(
             [ModelRelation(m, {'project_id': instance.id}, ModelDeletionTask) for m in model_list]
@@ -13,7 +13,7 @@ def load(options):
 
 
 DEFAULT_CODEC = {
-    'path': 'sentry.digests.codecs.CompressedPickleCodec',
+    'path': 'sentry.digests.codecs.NotificationReferenceCodec',
 }
 
 
@@ -56,7 +56,9 @@ class Backend(Service):
     be preempted by a new record being added to the timeline, requiring it to
     be transitioned to "waiting" instead.)
     """
-    __all__ = ('add', 'delete', 'digest', 'enabled', 'maintenance', 'schedule', 'validate')
+    __all__ = (
+        'add', 'delete', 'digest', 'digest_many', 'enabled', 'maintenance', 'schedule', 'validate'
+    )
 
     def __init__(self, **options):
         # The ``minimum_delay`` option defines the default minimum amount of
@@ -159,6 +161,28 @@ class Backend(Service):
         """
         raise NotImplementedError
 
+    def digest_many(self, keys, minimum_delays=None):
+        """
+        Extract records from several timelines for processing.
+
+        This method acts as a context manager, similar to ``digest``. The
+        target of the ``as`` clause is a mapping of timeline keys to the
+        records contained within their digests. Timelines that could not be
+        opened (for example, because they were not in the ready state or
+        their lock could not be acquired) are omitted from the mapping rather
+        than causing the entire operation to fail.
+
+        The ``minimum_delays`` argument is an optional mapping of timeline key
+        to the minimum delay to use when placing that timeline back in the
+        "waiting" state.
+
+        If the context manager successfully exits, all of the returned
+        timelines are closed. If an exception is raised during the execution of
+        the context manager, none of the timelines are closed, and all of
+        their records are preserved.
+        """
+        raise NotImplementedError
+
     def schedule(self, deadline):
         """
         Identify timelines that are ready for processing.
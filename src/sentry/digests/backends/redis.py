@@ -4,11 +4,13 @@ import logging
 import six
 import time
 
+from collections import defaultdict
 from contextlib import contextmanager
 from redis.client import ResponseError
 
 from sentry.digests import Record, ScheduleEntry
 from sentry.digests.backends.base import Backend, InvalidState
+from sentry.utils.locking import UnableToAcquireLock
 from sentry.utils.locking.backends.redis import RedisLockBackend
 from sentry.utils.locking.manager import LockManager
 from sentry.utils.redis import (check_cluster_versions, get_cluster_from_options, load_script)
@@ -227,14 +229,7 @@ class RedisBackend(Backend):
                 else:
                     raise
 
-            records = map(
-                lambda key__value__timestamp: Record(
-                    key__value__timestamp[0],
-                    self.codec.decode(key__value__timestamp[1]) if key__value__timestamp[1] is not None else None,
-                    float(key__value__timestamp[2]),
-                ),
-                response,
-            )
+            records = self.__decode_records(response)
 
             # If the record value is `None`, this means the record data was
             # missing (it was presumably evicted by Redis) so we don't need to
@@ -251,6 +246,106 @@ class RedisBackend(Backend):
                 [record.key for record in records],
             )
 
+    def __decode_records(self, response):
+        return [
+            Record(
+                key,
+                self.codec.decode(value) if value is not None else None,
+                float(timestamp),
+            ) for key, value, timestamp in response
+        ]
+
+    def __partition_keys(self, keys):
+        router = self.cluster.get_router()
+        partitions = defaultdict(list)
+        for key in keys:
+            partitions[router.get_host_for_key('{}:t:{}'.format(self.namespace, key))].append(key)
+        return partitions
+
+    @contextmanager
+    def digest_many(self, keys, minimum_delays=None, timestamp=None):
+        if minimum_delays is None:
+            minimum_delays = {}
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        locks = []
+        try:
+            acquired = []
+            for key in keys:
+                lock = self._get_timeline_lock(key, duration=30)
+                try:
+                    lock.acquire()
+                except UnableToAcquireLock as error:
+                    logger.info('Skipped digest for %r: %s', key, error)
+                    continue
+                locks.append(lock)
+                acquired.append(key)
+
+            # Timelines are opened (and later closed) with a single round trip
+            # to each host, rather than one round trip per timeline.
+            partitions = self.__partition_keys(acquired)
+            timelines = {}
+            for host, host_keys in six.iteritems(partitions):
+                with self.cluster.get_local_client(host).pipeline(transaction=False) as pipeline:
+                    for key in host_keys:
+                        script(
+                            pipeline, [key], [
+                                'DIGEST_OPEN',
+                                self.namespace,
+                                self.ttl,
+                                timestamp,
+                                key,
+                                self.capacity if self.capacity else -1,
+                            ]
+                        )
+                    responses = pipeline.execute(raise_on_error=False)
+
+                for key, response in zip(host_keys, responses):
+                    if isinstance(response, Exception):
+                        if 'err(invalid_state):' in six.text_type(response):
+                            logger.info(
+                                'Skipped digest for %r: timeline is not in the ready state.',
+                                key,
+                            )
+                        else:
+                            logger.error(
+                                'Failed to open digest for %r due to error: %r',
+                                key,
+                                response,
+                            )
+                        continue
+                    timelines[key] = self.__decode_records(response)
+
+            yield {
+                key: filter(lambda record: record.value is not None, records)
+                for key, records in six.iteritems(timelines)
+            }
+
+            for host, host_keys in six.iteritems(self.__partition_keys(timelines)):
+                with self.cluster.get_local_client(host).pipeline(transaction=False) as pipeline:
+                    for key in host_keys:
+                        minimum_delay = minimum_delays.get(key)
+                        if minimum_delay is None:
+                            minimum_delay = self.minimum_delay
+                        script(
+                            pipeline,
+                            [key],
+                            [
+                                'DIGEST_CLOSE',
+                                self.namespace,
+                                self.ttl,
+                                timestamp,
+                                key,
+                                minimum_delay,
+                            ] + [record.key for record in timelines[key]],
+                        )
+                    pipeline.execute()
+        finally:
+            for lock in locks:
+                lock.release()
+
     def delete(self, key, timestamp=None):
         if timestamp is None:
             timestamp = time.time()
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 import zlib
 
+from sentry.utils import json
 from sentry.utils.compat import pickle
 
 
@@ -19,3 +20,31 @@ class CompressedPickleCodec(Codec):
 
     def decode(self, value):
         return pickle.loads(zlib.decompress(value))
+
+
+class NotificationReferenceCodec(CompressedPickleCodec):
+    """
+    Encodes ``NotificationReference`` values as a short JSON array of
+    identifiers. Any other values (including records that were written by
+    ``CompressedPickleCodec`` before switching to this codec) are encoded and
+    decoded as compressed pickles.
+    """
+    # zlib streams always start with a header byte of "x" for the default
+    # window size, so this prefix can't collide with a compressed pickle.
+    prefix = b'r1:'
+
+    def encode(self, value):
+        from sentry.digests.notifications import NotificationReference
+
+        if isinstance(value, NotificationReference):
+            return self.prefix + json.dumps(list(value))
+
+        return super(NotificationReferenceCodec, self).encode(value)
+
+    def decode(self, value):
+        from sentry.digests.notifications import NotificationReference
+
+        if value.startswith(self.prefix):
+            return NotificationReference(*json.loads(value[len(self.prefix):]))
+
+        return super(NotificationReferenceCodec, self).decode(value)
@@ -15,6 +15,7 @@ from six.moves import reduce
 from sentry.app import tsdb
 from sentry.digests import Record
 from sentry.models import (
+    Event,
     Project,
     Group,
     GroupStatus,
@@ -26,6 +27,11 @@ logger = logging.getLogger('sentry.digests')
 
 Notification = namedtuple('Notification', 'event rules')
 
+# This is the value that is stored in digest timelines. Rather than storing a
+# copy of the event, only the identifiers are stored, and events are loaded
+# (in bulk) when the digest is built.
+NotificationReference = namedtuple('NotificationReference', 'event_pk group_id rules')
+
 
 def split_key(key):
     from sentry.plugins import plugins  # XXX
@@ -33,13 +39,27 @@ def split_key(key):
     return plugins.get(plugin_slug), Project.objects.get(pk=project_id)
 
 
-def unsplit_key(plugin, project):
-    return '{plugin.slug}:p:{project.id}'.format(plugin=plugin, project=project)
+def split_keys(keys):
+    """
+    Resolve the plugins and projects for several digest keys at once,
+    returning a mapping of key to ``(plugin, project)``. Keys that refer to
+    projects that no longer exist are omitted from the result.
+    """
+    from sentry.plugins import plugins  # XXX
+    parts = {}
+    for key in keys:
+        plugin_slug, _, project_id = key.split(':', 2)
+        parts[key] = (plugin_slug, int(project_id))
 
+    projects = Project.objects.in_bulk(set(project_id for _, project_id in parts.values()))
+    return {
+        key: (plugins.get(plugin_slug), projects[project_id])
+        for key, (plugin_slug, project_id) in six.iteritems(parts) if project_id in projects
+    }
 
-def strip_for_serialization(instance):
-    cls = type(instance)
-    return cls(**{field.attname: getattr(instance, field.attname) for field in cls._meta.fields})
+
+def unsplit_key(plugin, project):
+    return '{plugin.slug}:p:{project.id}'.format(plugin=plugin, project=project)
 
 
 def event_to_record(event, rules):
@@ -48,35 +68,121 @@ def event_to_record(event, rules):
 
     return Record(
         event.event_id,
-        Notification(strip_for_serialization(event), [rule.id for rule in rules]),
+        NotificationReference(event.id, event.group_id, [rule.id for rule in rules]),
         to_timestamp(event.datetime),
     )
 
 
+def fetch_events(records):
+    """
+    Fetch the events (including their data) that are referenced by records,
+    returning a mapping of event primary key to event.
+    """
+    event_ids = set(
+        record.value.event_pk for record in records
+        if isinstance(record.value, NotificationReference)
+    )
+    if not event_ids:
+        return {}
+
+    events = Event.objects.in_bulk(event_ids)
+    Event.objects.bind_nodes(events.values(), 'data')
+    return events
+
+
+def load_records(records, events=None):
+    """
+    Replace the ``NotificationReference`` values of records with
+    ``Notification`` values, loading the referenced events and their data in
+    bulk. Records that reference events that no longer exist are removed.
+
+    Records that already contain a ``Notification`` (such as those created
+    before references were used) are returned unchanged.
+
+    If ``events`` is provided, it is used as the mapping of event primary
+    key to event instead of querying for the referenced events.
+    """
+    if events is None:
+        events = fetch_events(records)
+
+    if not events:
+        return records
+
+    results = []
+    for record in records:
+        if isinstance(record.value, NotificationReference):
+            event = events.get(record.value.event_pk)
+            if event is None:
+                logger.debug('%r could not be associated with an event.', record)
+                continue
+
+            record = Record(
+                record.key,
+                Notification(event, record.value.rules),
+                record.timestamp,
+            )
+
+        results.append(record)
+
+    return results
+
+
 def fetch_state(project, records):
+    return fetch_states([(project, records)])[0]
+
+
+def fetch_states(items):
+    """
+    Fetch the state for several ``(project, records)`` pairs, using one
+    query for each of groups and rules regardless of the number of pairs.
+
+    The event and user counts cover the time range of the records of each
+    pair.  Pairs that span the same time range share the TSDB reads.
+    """
+    if not items:
+        return []
+
     # This reads a little strange, but remember that records are returned in
     # reverse chronological order, and we query the database in chronological
     # order.
     # NOTE: This doesn't account for any issues that are filtered out later.
-    start = records[-1].datetime
-    end = records[0].datetime
+    ranges = [(records[-1].datetime, records[0].datetime) for project, records in items]
+
+    group_ids = [
+        set(record.value.event.group_id for record in records) for project, records in items
+    ]
+    rule_ids = [
+        set(itertools.chain.from_iterable(record.value.rules for record in records))
+        for project, records in items
+    ]
+
+    groups = Group.objects.in_bulk(set(itertools.chain.from_iterable(group_ids)))
+    rules = Rule.objects.in_bulk(set(itertools.chain.from_iterable(rule_ids)))
+
+    group_ids_by_range = defaultdict(set)
+    for i, key in enumerate(ranges):
+        group_ids_by_range[key].update(id for id in group_ids[i] if id in groups)
+
+    event_counts = {}
+    user_counts = {}
+    for (start, end), ids in six.iteritems(group_ids_by_range):
+        event_counts[(start, end)] = tsdb.get_sums(tsdb.models.group, ids, start, end)
+        user_counts[(start, end)] = tsdb.get_distinct_counts_totals(
+            tsdb.models.users_affected_by_group, ids, start, end
+        )
 
-    groups = Group.objects.in_bulk(record.value.event.group_id for record in records)
-    return {
-        'project':
-        project,
-        'groups':
-        groups,
-        'rules':
-        Rule.objects.
-        in_bulk(itertools.chain.from_iterable(record.value.rules for record in records)),
-        'event_counts':
-        tsdb.get_sums(tsdb.models.group, groups.keys(), start, end),
-        'user_counts':
-        tsdb.get_distinct_counts_totals(
-            tsdb.models.users_affected_by_group, groups.keys(), start, end
-        ),
-    }
+    def select(values, ids):
+        return {id: values[id] for id in ids if id in values}
+
+    return [
+        {
+            'project': project,
+            'groups': select(groups, group_ids[i]),
+            'rules': select(rules, rule_ids[i]),
+            'event_counts': select(event_counts[ranges[i]], group_ids[i]),
+            'user_counts': select(user_counts[ranges[i]], group_ids[i]),
+        } for i, (project, records) in enumerate(items)
+    ]
 
 
 def attach_state(project, groups, rules, event_counts, user_counts):
@@ -207,6 +313,10 @@ def build_digest(project, records, state=None):
     if not records:
         return
 
+    records = load_records(records)
+    if not records:
+        return
+
     # XXX: This is a hack to allow generating a mock digest without actually
     # doing any real IO!
     if state is None:
@@ -226,3 +336,21 @@ def build_digest(project, records, state=None):
         apply(sort_rule_groups)
 
     return pipeline(records)
+
+
+def build_digests(items):
+    """
+    Build digests for several ``(project, records)`` pairs, loading events
+    and fetching state for all of them at once. Returns a list of digests in
+    the same order as the provided pairs (where a digest is ``None`` if it
+    has no records to be delivered.)
+    """
+    items = [(project, list(records)) for project, records in items]
+    events = fetch_events(list(itertools.chain.from_iterable(records for _, records in items)))
+    items = [(project, load_records(records, events)) for project, records in items]
+
+    states = iter(fetch_states([(project, records) for project, records in items if records]))
+    return [
+        build_digest(project, records, state=next(states)) if records else None
+        for project, records in items
+    ]
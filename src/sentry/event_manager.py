@@ -1007,13 +1007,99 @@ class EventManager(object):
         return euser
 
     def _find_hashes(self, project, hash_list):
-        return map(
-            lambda hash: GroupHash.objects.get_or_create(
+        # Resolve the hashes with as few queries and cache calls as possible.
+        # In the best case (hashes that are already associated with a group),
+        # this is a single cache call. Otherwise, all of the misses are
+        # fetched with one query, and any hashes that don't exist yet are
+        # created with one bulk insert (and one more query to get their ids.)
+        hash_list = list(hash_list)
+        results, version = GroupHash.fetch_cached(project.id, hash_list)
+
+        remaining = set(hash_list) - set(results)
+        if not remaining:
+            metrics.incr('event_manager.find_hashes.cache', tags={'result': 'hit'})
+            return [results[hash] for hash in hash_list]
+
+        metrics.incr('event_manager.find_hashes.cache', tags={'result': 'miss'})
+
+        found = {}
+        for instance in GroupHash.objects.filter(project=project, hash__in=remaining):
+            found[instance.hash] = instance
+            remaining.remove(instance.hash)
+
+        if remaining:
+            try:
+                with transaction.atomic(using=router.db_for_write(GroupHash)):
+                    GroupHash.objects.bulk_create([
+                        GroupHash(project=project, hash=hash) for hash in remaining
+                    ])
+            except IntegrityError:
+                # Another process created some of these hashes in the meantime,
+                # the remainder will be created individually below.
+                pass
+
+            for instance in GroupHash.objects.filter(project=project, hash__in=remaining):
+                found[instance.hash] = instance
+                remaining.remove(instance.hash)
+
+            for hash in remaining:
+                found[hash] = GroupHash.objects.get_or_create(
+                    project=project,
+                    hash=hash,
+                )[0]
+
+        GroupHash.cache_many(found.values(), version)
+        results.update(found)
+
+        return [results[hash] for hash in hash_list]
+
+    def _refresh_hashes(self, project, hash_list):
+        # Reads the hashes from the database again, bypassing the cache. The
+        # cached resolution of the project is only invalidated if it turns out
+        # to be stale, as the hashes may still belong to a group that is
+        # pending merge or deletion.
+        found = {
+            instance.hash: instance for instance in GroupHash.objects.filter(
                 project=project,
-                hash=hash,
-            )[0],
-            hash_list,
-        )
+                hash__in=[h.hash for h in hash_list],
+            )
+        }
+        if len(found) < len(hash_list):
+            GroupHash.invalidate_cache([project.id])
+            return self._find_hashes(project, [h.hash for h in hash_list])
+
+        results = [found[h.hash] for h in hash_list]
+        if any((h.group_id, h.group_tombstone_id) != (r.group_id, r.group_tombstone_id)
+               for h, r in zip(hash_list, results)):
+            GroupHash.invalidate_cache([project.id])
+        return results
+
+    def _find_existing_group_id(self, hash_list):
+        for h in hash_list:
+            if h.group_id is not None:
+                return h.group_id
+            if h.group_tombstone_id is not None:
+                raise HashDiscarded('Matches group tombstone %s' % h.group_tombstone_id)
+        return None
+
+    def _get_existing_group(self, group_id):
+        # Returns ``None`` if the group no longer exists or is being merged or
+        # deleted, in which case the hashes that referenced it may have been
+        # served from a stale hash cache and need to be read again. The group
+        # itself is always read from the database, as its status and counts
+        # are changed by bulk updates that would not invalidate a cached copy.
+        try:
+            group = Group.objects.get(id=group_id)
+        except Group.DoesNotExist:
+            return None
+
+        if group.status in (
+            GroupStatus.PENDING_MERGE, GroupStatus.PENDING_DELETION,
+            GroupStatus.DELETION_IN_PROGRESS,
+        ):
+            return None
+
+        return group
 
     def _ensure_hashes_merged(self, group, hash_list):
         # TODO(dcramer): there is a race condition with selecting/updating
@@ -1048,14 +1134,16 @@ class EventManager(object):
 
         # attempt to find a matching hash
         all_hashes = self._find_hashes(project, hashes)
+        existing_group_id = self._find_existing_group_id(all_hashes)
 
-        existing_group_id = None
-        for h in all_hashes:
-            if h.group_id is not None:
-                existing_group_id = h.group_id
-                break
-            if h.group_tombstone_id is not None:
-                raise HashDiscarded('Matches group tombstone %s' % h.group_tombstone_id)
+        group = None
+        if existing_group_id is not None:
+            group = self._get_existing_group(existing_group_id)
+            if group is None:
+                all_hashes = self._refresh_hashes(project, all_hashes)
+                existing_group_id = self._find_existing_group_id(all_hashes)
+                if existing_group_id is not None:
+                    group = Group.objects.get(id=existing_group_id)
 
         # XXX(dcramer): this has the opportunity to create duplicate groups
         # it should be resolved by the hash merging function later but this
@@ -1085,8 +1173,6 @@ class EventManager(object):
             )
 
         else:
-            group = Group.objects.get(id=existing_group_id)
-
             group_is_new = False
 
         # If all hashes are brand new we treat this event as new
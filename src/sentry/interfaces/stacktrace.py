@@ -16,6 +16,7 @@ import posixpath
 
 from django.conf import settings
 from django.utils.translation import ugettext as _
+from functools32 import lru_cache
 from six.moves.urllib.parse import urlparse
 
 from sentry.app import env
@@ -60,6 +61,21 @@ RECURSION_COMPARISON_FIELDS = [
     'colno',
 ]
 
+# fields that are used when computing the hash of a frame (in addition to
+# the platform), and make up the key of the frame hash cache
+FRAME_HASH_FIELDS = (
+    'abs_path',
+    'context_line',
+    'filename',
+    'function',
+    'lineno',
+    'module',
+    'symbol',
+)
+
+# maximum number of frame hashes to keep in the per-process cache
+FRAME_HASH_CACHE_SIZE = 5000
+
 
 def max_addr(cur, addr):
     if addr is None:
@@ -282,6 +298,17 @@ def is_recursion(frame1, frame2):
     return True
 
 
+@lru_cache(maxsize=FRAME_HASH_CACHE_SIZE)
+def get_frame_hash(platform, *values):
+    """
+    Compute the hash components of a frame from the values of
+    ``FRAME_HASH_FIELDS``. The same frames recur across many events, so the
+    results are cached.
+    """
+    frame = Frame(platform=None, **dict(zip(FRAME_HASH_FIELDS, values)))
+    return tuple(frame.compute_hash(platform))
+
+
 class Frame(Interface):
 
     path = 'frame'
@@ -406,6 +433,15 @@ class Frame(Interface):
 
         This is one of the few areas in Sentry that isn't platform-agnostic.
         """
+        platform = self._data.get('platform') or platform
+        values = [self._data.get(name) for name in FRAME_HASH_FIELDS]
+        try:
+            return list(get_frame_hash(platform, *values))
+        except TypeError:
+            # One of the values is not hashable, so it can't be cached.
+            return self.compute_hash(platform)
+
+    def compute_hash(self, platform=None):
         platform = self.platform or platform
         output = []
         # Safari throws [native code] frames in for calls like ``forEach``
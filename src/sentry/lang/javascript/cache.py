@@ -1,10 +1,15 @@
 from __future__ import absolute_import, print_function
 
+import threading
+
+from collections import OrderedDict
 from six import text_type
 from symbolic import SourceView
+from sentry import options
+from sentry.utils import metrics
 from sentry.utils.strings import codec_lookup
 
-__all__ = ['SourceCache', 'SourceMapCache']
+__all__ = ['SourceCache', 'SourceMapCache', 'ParsedSourceCache']
 
 
 def is_utf8(codec):
@@ -12,6 +17,20 @@ def is_utf8(codec):
     return name in ('utf-8', 'ascii')
 
 
+def make_source_view(source, encoding=None):
+    if isinstance(source, text_type):
+        source = source.encode('utf-8')
+    # If an encoding is provided and it's not utf-8 compatible
+    # we try to re-encoding the source and create a source view
+    # from it.
+    elif encoding is not None and not is_utf8(encoding):
+        try:
+            source = source.decode(encoding).encode('utf-8')
+        except UnicodeError:
+            pass
+    return SourceView.from_bytes(source)
+
+
 class SourceCache(object):
     def __init__(self):
         self._cache = {}
@@ -42,17 +61,7 @@ class SourceCache(object):
         url = self._get_canonical_url(url)
 
         if not isinstance(source, SourceView):
-            if isinstance(source, text_type):
-                source = source.encode('utf-8')
-            # If an encoding is provided and it's not utf-8 compatible
-            # we try to re-encoding the source and create a source view
-            # from it.
-            elif encoding is not None and not is_utf8(encoding):
-                try:
-                    source = source.decode(encoding).encode('utf-8')
-                except UnicodeError:
-                    pass
-            source = SourceView.from_bytes(source)
+            source = make_source_view(source, encoding)
         self._cache[url] = source
 
     def add_error(self, url, error):
@@ -84,3 +93,57 @@ class SourceMapCache(object):
             sourcemap = self.get(sourcemap_url)
             return (sourcemap_url, sourcemap)
         return (None, None)
+
+
+class ParsedSourceCache(object):
+    """Keeps parsed source views and sourcemap views around across events
+    so that the same files do not have to be parsed over and over again.
+    The total size of the sources is bounded by the
+    ``sourcemaps.parsed-cache-size`` option, least recently used views are
+    evicted first.
+    """
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return None
+            self._items[key] = value
+            return value[0]
+
+    def put(self, key, view, size):
+        max_size = options.get('sourcemaps.parsed-cache-size')
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key)[1]
+            self._items[key] = (view, size)
+            self._size += size
+            while self._size > max_size and self._items:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+                metrics.incr('sourcemaps.parsed_cache.evicted')
+
+    def get_or_parse(self, key, parse, size):
+        """Returns the view for the given key, calling `parse` to create
+        it if it is not cached yet.
+        """
+        kind = key[0]
+        view = self.get(key)
+        if view is not None:
+            metrics.incr('sourcemaps.parsed_cache', tags={'result': 'hit', 'kind': kind})
+            return view
+        metrics.incr('sourcemaps.parsed_cache', tags={'result': 'miss', 'kind': kind})
+        view = parse()
+        self.put(key, view, size)
+        return view
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
@@ -2,17 +2,23 @@ from __future__ import absolute_import, print_function
 
 __all__ = ['JavaScriptStacktraceProcessor']
 
+import functools
 import logging
 import re
 import base64
 import six
 import zlib
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
 from django.conf import settings
+from django.core.files.base import File as FileObj
+from hashlib import sha1
 from os.path import splitext
 from requests.utils import get_encoding_from_headers
 from six.moves.urllib.parse import urljoin, urlsplit
 from symbolic import SourceMapView
+from time import time
 
 # In case SSL is unavailable (light builds) we can't import this here.
 try:
@@ -25,7 +31,8 @@ except ImportError:
 
 from sentry import http
 from sentry.interfaces.stacktrace import Stacktrace
-from sentry.models import EventError, ReleaseFile
+from sentry.models import EventError, FileBlobIndex, ReleaseFile
+from sentry.models.file import ChunkedFileBlobIndexWrapper
 from sentry.utils.cache import cache
 from sentry.utils.files import compress_file
 from sentry.utils.hashlib import md5_text
@@ -33,7 +40,7 @@ from sentry.utils.http import is_valid_origin
 from sentry.utils import metrics
 from sentry.stacktraces import StacktraceProcessor
 
-from .cache import SourceCache, SourceMapCache
+from .cache import SourceCache, SourceMapCache, ParsedSourceCache, make_source_view
 
 # number of surrounding lines (on each side) to fetch
 LINES_OF_CONTEXT = 5
@@ -62,9 +69,16 @@ CACHE_CONTROL_MIN = 60
 # the maximum number of remote resources (i.e. source files) that should be
 # fetched
 MAX_RESOURCE_FETCHES = 100
+# the number of remote resources that are fetched concurrently per event
+MAX_CONCURRENT_FETCHES = 8
+# the maximum time (in seconds) spent prefetching the resources of an event
+MAX_PREFETCH_TIME = 30
 
 logger = logging.getLogger(__name__)
 
+# parsed sources and sourcemaps shared by all events processed in this process
+parsed_sources = ParsedSourceCache()
+
 
 class UnparseableSourcemap(http.BadSource):
     error_type = EventError.JS_INVALID_SOURCEMAP
@@ -197,17 +211,129 @@ def discover_sourcemap(result):
     return sourcemap
 
 
+def get_release_file_cache_key(filename, release):
+    return 'releasefile:v1:%s:%s' % (release.id, md5_text(filename).hexdigest(), )
+
+
+def get_release_file_idents(filename, dist=None):
+    dist_name = dist and dist.name or None
+    filename_choices = ReleaseFile.normalize(filename)
+    return [ReleaseFile.get_ident(f, dist_name) for f in filename_choices]
+
+
+class ReleaseFileResult(http.UrlResult):
+    """The `UrlResult` of a release artifact, along with the checksum of its
+    file if it is known.
+    """
+
+    def __new__(cls, url, headers, body, status, encoding, checksum=None):
+        self = super(ReleaseFileResult, cls).__new__(cls, url, headers, body, status, encoding)
+        self.checksum = checksum
+        return self
+
+
+def cache_release_file(cache_key, filename, releasefile, getfile):
+    """Reads the contents of a release file and stores them compressed in
+    the cache.  Returns a `UrlResult` or `None` if the file could not be
+    read.
+    """
+    try:
+        with metrics.timer('sourcemaps.release_file_read'):
+            with getfile() as fp:
+                z_body, body = compress_file(fp)
+    except Exception as e:
+        logger.exception(six.text_type(e))
+        cache.set(cache_key, -1, 3600)
+        return None
+
+    headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
+    encoding = get_encoding_from_headers(headers)
+    checksum = releasefile.file.checksum
+    cache.set(cache_key, (headers, z_body, 200, encoding, checksum), 3600)
+    return ReleaseFileResult(filename, headers, body, 200, encoding, checksum)
+
+
+def prefetch_release_files(filenames, release, dist=None):
+    """Looks up the release artifacts of many files at once.  Returns a
+    function by filename that returns the `UrlResult` of the artifact, or
+    `None` if the release has none.  These functions neither query the
+    database nor depend on the cache entries written here, so they can be
+    called on another thread.
+    """
+    cache_keys = dict((get_release_file_cache_key(f, release), f) for f in filenames)
+    cached = cache.get_many(list(cache_keys))
+
+    rv = {}
+    missing = []
+    for cache_key, filename in six.iteritems(cache_keys):
+        if cache_key not in cached:
+            missing.append(filename)
+        elif cached[cache_key] == -1:
+            rv[filename] = lambda: None
+        else:
+            rv[filename] = functools.partial(
+                load_cached_release_file, filename, cached[cache_key])
+    if not missing:
+        return rv
+
+    idents_by_filename = dict((f, get_release_file_idents(f, dist)) for f in missing)
+    releasefiles_by_ident = dict((rf.ident, rf) for rf in ReleaseFile.objects.filter(
+        release=release,
+        dist=dist,
+        ident__in=set(i for idents in six.itervalues(idents_by_filename) for i in idents),
+    ).select_related('file'))
+
+    releasefiles = {}
+    for filename, idents in six.iteritems(idents_by_filename):
+        # Pick first one that matches in priority order.
+        releasefile = next((releasefiles_by_ident[i] for i in idents
+                            if i in releasefiles_by_ident), None)
+        if releasefile is None:
+            cache.set(get_release_file_cache_key(filename, release), -1, 60)
+            rv[filename] = lambda: None
+        else:
+            releasefiles[filename] = releasefile
+
+    indexes_by_file_id = defaultdict(list)
+    for index in FileBlobIndex.objects.filter(
+        file__in=[rf.file_id for rf in six.itervalues(releasefiles)],
+    ).select_related('blob').order_by('offset'):
+        indexes_by_file_id[index.file_id].append(index)
+
+    def make_getfile(file):
+        return lambda: FileObj(ChunkedFileBlobIndexWrapper(indexes_by_file_id[file.id]),
+                               file.name)
+
+    for filename, releasefile in six.iteritems(releasefiles):
+        rv[filename] = functools.partial(
+            cache_release_file,
+            get_release_file_cache_key(filename, release),
+            filename,
+            releasefile,
+            make_getfile(releasefile.file),
+        )
+    return rv
+
+
+def load_cached_release_file(filename, result):
+    """Returns the `UrlResult` of a release file from its cache entry."""
+    # Previous caches would be a 3-tuple or 4-tuple instead of a 5-tuple,
+    # so this is being maintained for backwards compatibility
+    encoding = result[3] if len(result) > 3 else None
+    checksum = result[4] if len(result) > 4 else None
+    return ReleaseFileResult(
+        filename, result[0], zlib.decompress(result[1]), result[2], encoding, checksum
+    )
+
+
 def fetch_release_file(filename, release, dist=None):
-    cache_key = 'releasefile:v1:%s:%s' % (release.id, md5_text(filename).hexdigest(), )
+    cache_key = get_release_file_cache_key(filename, release)
 
     logger.debug('Checking cache for release artifact %r (release_id=%s)', filename, release.id)
     result = cache.get(cache_key)
 
-    dist_name = dist and dist.name or None
-
     if result is None:
-        filename_choices = ReleaseFile.normalize(filename)
-        filename_idents = [ReleaseFile.get_ident(f, dist_name) for f in filename_choices]
+        filename_idents = get_release_file_idents(filename, dist)
 
         logger.debug(
             'Checking database for release artifact %r (release_id=%s)', filename, release.id
@@ -243,43 +369,42 @@ def fetch_release_file(filename, release, dist=None):
         logger.debug(
             'Found release artifact %r (id=%s, release_id=%s)', filename, releasefile.id, release.id
         )
-        try:
-            with metrics.timer('sourcemaps.release_file_read'):
-                with releasefile.file.getfile() as fp:
-                    z_body, body = compress_file(fp)
-        except Exception as e:
-            logger.exception(six.text_type(e))
-            cache.set(cache_key, -1, 3600)
-            result = None
-        else:
-            headers = {k.lower(): v for k, v in releasefile.file.headers.items()}
-            encoding = get_encoding_from_headers(headers)
-            result = http.UrlResult(filename, headers, body, 200, encoding)
-            cache.set(cache_key, (headers, z_body, 200, encoding), 3600)
+        result = cache_release_file(cache_key, filename, releasefile, releasefile.file.getfile)
 
     elif result == -1:
         # We cached an error, so normalize
         # it down to None
         result = None
     else:
-        # Previous caches would be a 3-tuple instead of a 4-tuple,
-        # so this is being maintained for backwards compatibility
-        try:
-            encoding = result[3]
-        except IndexError:
-            encoding = None
-        result = http.UrlResult(
-            filename, result[0], zlib.decompress(result[1]), result[2], encoding
-        )
+        result = load_cached_release_file(filename, result)
 
     return result
 
 
-def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
+def get_scrape_options(url, project):
+    """Returns the headers and whether to verify SSL certificates when
+    scraping `url` for `project`, as ``(headers, verify_ssl)``.
+    """
+    headers = {}
+    verify_ssl = False
+    if project and is_valid_origin(url, project=project):
+        verify_ssl = bool(project.get_option('sentry:verify_ssl', False))
+        token = project.get_option('sentry:token')
+        if token:
+            token_header = project.get_option('sentry:token_header') or 'X-Sentry-Token'
+            headers[token_header] = token
+    return headers, verify_ssl
+
+
+def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True,
+               prefetched=None, scrape_options=None):
     """
     Pull down a URL, returning a UrlResult object.
 
-    Attempts to fetch from the cache.
+    Attempts to fetch from the cache.  The release artifact can be passed
+    as `prefetched`, a function returned by `prefetch_release_files`, and
+    the result of `get_scrape_options` as `scrape_options`, in which case
+    neither the database nor the options of the project are used.
     """
     # If our url has been truncated, it'd be impossible to fetch
     # so we check for this early and bail
@@ -290,7 +415,10 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
                 'url': http.expose_url(url),
             }
         )
-    if release:
+    if prefetched is not None:
+        with metrics.timer('sourcemaps.release_file'):
+            result = prefetched()
+    elif release:
         with metrics.timer('sourcemaps.release_file'):
             result = fetch_release_file(url, release, dist)
     else:
@@ -322,14 +450,9 @@ def fetch_file(url, project=None, release=None, dist=None, allow_scraping=True):
             )
 
     if result is None:
-        headers = {}
-        verify_ssl = False
-        if project and is_valid_origin(url, project=project):
-            verify_ssl = bool(project.get_option('sentry:verify_ssl', False))
-            token = project.get_option('sentry:token')
-            if token:
-                token_header = project.get_option('sentry:token_header') or 'X-Sentry-Token'
-                headers[token_header] = token
+        if scrape_options is None:
+            scrape_options = get_scrape_options(url, project)
+        headers, verify_ssl = scrape_options
 
         with metrics.timer('sourcemaps.fetch'):
             result = http.fetch_file(url, headers=headers, verify_ssl=verify_ssl)
@@ -413,19 +536,47 @@ def fetch_sourcemap(url, project=None, release=None, dist=None, allow_scraping=T
                 'url': '<base64>',
                 'reason': e.message,
             })
+        checksum = None
     else:
         result = fetch_file(
             url, project=project, release=release, dist=dist, allow_scraping=allow_scraping
         )
         body = result.body
-    try:
-        return SourceMapView.from_json_bytes(body)
-    except Exception as exc:
-        # This is in debug because the product shows an error already.
-        logger.debug(six.text_type(exc), exc_info=True)
-        raise UnparseableSourcemap({
-            'url': http.expose_url(url),
-        })
+        checksum = getattr(result, 'checksum', None)
+    return parse_sourcemap(url, body, release, dist, checksum)
+
+
+def parse_sourcemap(url, body, release=None, dist=None, checksum=None):
+    def parse():
+        try:
+            return SourceMapView.from_json_bytes(body)
+        except Exception as exc:
+            # This is in debug because the product shows an error already.
+            logger.debug(six.text_type(exc), exc_info=True)
+            raise UnparseableSourcemap({
+                'url': http.expose_url(url),
+            })
+
+    return parsed_sources.get_or_parse(
+        get_parsed_source_key('sourcemap', url, body, release, dist, checksum),
+        parse, len(body))
+
+
+def get_parsed_source_key(kind, url, body, release=None, dist=None, checksum=None):
+    """Returns the key of a parsed source or sourcemap view.  As the key
+    contains the checksum of the body, a changed file never hits a view
+    that was parsed from an older version of it.  The body is only hashed
+    if its SHA1 `checksum` is not passed, e.g. for scraped files.
+    """
+    if is_data_uri(url):
+        url = None
+    return (
+        kind,
+        release and release.id,
+        dist and dist.id,
+        url,
+        checksum or sha1(body).hexdigest(),
+    )
 
 
 def is_data_uri(url):
@@ -759,13 +910,10 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         return self.cache.get(filename)
 
     def cache_source(self, filename):
-        sourcemaps = self.sourcemaps
-        cache = self.cache
-
         self.fetch_count += 1
 
         if self.fetch_count > self.max_fetches:
-            cache.add_error(filename, {
+            self.cache.add_error(filename, {
                 'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
             })
             return
@@ -773,43 +921,113 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         # TODO: respect cache-control/max-age headers to some extent
         logger.debug('Fetching remote source %r', filename)
         try:
-            result = fetch_file(
-                filename,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping
-            )
+            result = self.fetch_file(filename)
         except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
+            result = exc
+
+        sourcemap_url = self.add_source(filename, result)
+        if sourcemap_url is not None and sourcemap_url not in self.sourcemaps:
+            self.add_sourcemap(filename, sourcemap_url)
+
+    def fetch_file(self, url, prefetched=None, scrape_options=None):
+        return fetch_file(
+            url,
+            project=self.project,
+            release=self.release,
+            dist=self.dist,
+            allow_scraping=self.allow_scraping,
+            prefetched=prefetched,
+            scrape_options=scrape_options,
+        )
+
+    def fetch_files(self, executor, urls, deadline):
+        """Fetches the given urls concurrently.  Returns a dictionary of the
+        results by url, fetches that failed or did not finish before the
+        deadline are represented by a `BadSource` exception.
+        """
+        if not urls:
+            return {}
+
+        # Look up all the release artifacts at once and resolve the options
+        # for scraping up front, so that the database is only queried on
+        # this thread.
+        prefetched = {}
+        if self.release is not None:
+            prefetched = prefetch_release_files(urls, self.release, self.dist)
+        scrape_options = {}
+        if self.allow_scraping:
+            scrape_options = dict((url, get_scrape_options(url, self.project)) for url in urls
+                                  if url.startswith(('http:', 'https:')))
+
+        futures = dict((executor.submit(self.fetch_file, url, prefetched.get(url),
+                                        scrape_options.get(url)), url)
+                       for url in urls)
+        done, not_done = wait(futures, timeout=max(0, deadline - time()))
+
+        rv = {}
+        for future in not_done:
+            future.cancel()
+            url = futures[future]
+            rv[url] = http.CannotFetch({
+                'type': EventError.FETCH_TIMEOUT,
+                'url': http.expose_url(url),
+                'timeout': MAX_PREFETCH_TIME,
+            })
+        for future in done:
+            try:
+                rv[futures[future]] = future.result()
+            except http.BadSource as exc:
+                rv[futures[future]] = exc
+        return rv
+
+    def add_source(self, filename, result):
+        """Adds the result of fetching a source to the cache.  Returns the
+        url of the sourcemap of the source if it has one.
+        """
+        if isinstance(result, http.BadSource):
+            self.cache.add_error(filename, result.data)
             return
 
-        cache.add(filename, result.body, result.encoding)
-        cache.alias(result.url, filename)
+        source_view = parsed_sources.get_or_parse(
+            get_parsed_source_key('source', filename, result.body, self.release, self.dist,
+                                  getattr(result, 'checksum', None)) + (result.encoding, ),
+            lambda: make_source_view(result.body, result.encoding),
+            len(result.body))
+        self.cache.add(filename, source_view)
+        self.cache.alias(result.url, filename)
 
         sourcemap_url = discover_sourcemap(result)
         if not sourcemap_url:
             return
 
         logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], result.url)
-        sourcemaps.link(filename, sourcemap_url)
-        if sourcemap_url in sourcemaps:
-            return
+        self.sourcemaps.link(filename, sourcemap_url)
+        return sourcemap_url
 
-        # pull down sourcemap
+    def add_sourcemap(self, filename, sourcemap_url, result=None):
+        """Adds the sourcemap of the given file to the cache.  Unless the
+        result of fetching it is passed the sourcemap is fetched now.
+        """
         try:
-            sourcemap_view = fetch_sourcemap(
-                sourcemap_url,
-                project=self.project,
-                release=self.release,
-                dist=self.dist,
-                allow_scraping=self.allow_scraping,
-            )
+            if result is None:
+                sourcemap_view = fetch_sourcemap(
+                    sourcemap_url,
+                    project=self.project,
+                    release=self.release,
+                    dist=self.dist,
+                    allow_scraping=self.allow_scraping,
+                )
+            elif isinstance(result, http.BadSource):
+                raise result
+            else:
+                sourcemap_view = parse_sourcemap(
+                    sourcemap_url, result.body, self.release, self.dist,
+                    getattr(result, 'checksum', None))
         except http.BadSource as exc:
-            cache.add_error(filename, exc.data)
+            self.cache.add_error(filename, exc.data)
             return
 
-        sourcemaps.add(sourcemap_url, sourcemap_view)
+        self.sourcemaps.add(sourcemap_url, sourcemap_view)
 
         # cache any inlined sources
         for src_id, source_name in sourcemap_view.iter_sources():
@@ -824,6 +1042,10 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
         """
         Fetch all sources that we know are required (being referenced directly
         in frames).
+
+        The sources are fetched concurrently, followed by their sourcemaps.
+        Fetches that did not finish within `MAX_PREFETCH_TIME` are reported
+        as timed out.
         """
         pending_file_list = set()
         for f in frames:
@@ -842,10 +1064,39 @@ class JavaScriptStacktraceProcessor(StacktraceProcessor):
                 continue
             pending_file_list.add(f['abs_path'])
 
-        for idx, filename in enumerate(pending_file_list):
-            self.cache_source(
-                filename=filename,
-            )
+        filenames = []
+        for filename in pending_file_list:
+            self.fetch_count += 1
+            if self.fetch_count > self.max_fetches:
+                self.cache.add_error(filename, {
+                    'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+                })
+                continue
+            filenames.append(filename)
+
+        if not filenames:
+            return
+
+        deadline = time() + MAX_PREFETCH_TIME
+        executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES)
+        try:
+            results = self.fetch_files(executor, filenames, deadline)
+
+            sourcemap_urls = {}
+            for filename in filenames:
+                sourcemap_url = self.add_source(filename, results[filename])
+                if sourcemap_url is not None and sourcemap_url not in self.sourcemaps:
+                    sourcemap_urls.setdefault(sourcemap_url, filename)
+
+            # Inline sourcemaps do not need to be fetched.
+            results = self.fetch_files(
+                executor, [url for url in sourcemap_urls if not is_data_uri(url)], deadline)
+
+            for sourcemap_url, filename in six.iteritems(sourcemap_urls):
+                self.add_sourcemap(filename, sourcemap_url, results.get(sourcemap_url))
+        finally:
+            # Fetches that timed out are not waited for.
+            executor.shutdown(wait=False)
 
     def close(self):
         StacktraceProcessor.close(self)
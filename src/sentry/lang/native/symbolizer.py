@@ -5,6 +5,7 @@ import six
 
 from symbolic import SymbolicError, ObjectLookup, LineInfo, parse_addr
 
+from sentry import options
 from sentry.utils.safe import trim
 from sentry.utils.compat import implements_to_string
 from sentry.models import EventError, ProjectDSymFile
@@ -125,7 +126,8 @@ class Symbolizer(object):
             ProjectDSymFile.dsymcache.get_symcaches(
                 project, referenced_images,
                 on_dsym_file_referenced=on_dsym_file_referenced,
-                with_conversion_errors=True)
+                with_conversion_errors=True,
+                wait=options.get('dsym.symcache-conversion-wait'))
 
     def _process_frame(self, sym, obj, package=None, addr_off=0):
         frame = {
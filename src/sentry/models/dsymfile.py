@@ -18,6 +18,10 @@ import shutil
 import hashlib
 import logging
 import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
 
 from jsonfield import JSONField
@@ -34,6 +38,9 @@ from sentry.cache import default_cache
 from sentry.db.models import FlexibleForeignKey, Model, \
     sane_repr, BaseManager, BoundedPositiveIntegerField
 from sentry.models.file import File, ChunkFileState
+from sentry.utils import metrics
+from sentry.utils.cache import cache
+from sentry.utils.locking import UnableToAcquireLock
 from sentry.utils.zip import safe_extract_zip
 from sentry.constants import KNOWN_DSYM_TYPES
 from sentry.reprocessing import resolve_processing_issue, \
@@ -49,6 +56,23 @@ ONE_DAY_AND_A_HALF = int(ONE_DAY * 1.5)
 # 10 minutes is assumed to be a reasonable value here.
 CONVERSION_ERROR_TTL = 60 * 10
 
+# How long a conversion of a debug file into a symcache may take before
+# another worker is allowed to attempt the same conversion.
+SYMCACHE_CONVERSION_TIMEOUT = 60 * 10
+
+# How often to check for conversions that are running elsewhere while
+# waiting for them to finish.
+SYMCACHE_CONVERSION_POLL_INTERVAL = 0.5
+
+# How long an event should wait before processing is attempted again if the
+# symcaches it needs are still being converted.
+SYMCACHE_CONVERSION_RETRY_DELAY = 30
+
+# How long we cache the database lookups of debug files and their symcaches.
+# The cache is invalidated when debug files are uploaded or deleted, so this
+# only bounds how long stale results could be served if that fails.
+SYMCACHE_LOOKUP_TTL = 60 * 5
+
 DSYM_MIMETYPES = dict((v, k) for k, v in KNOWN_DSYM_TYPES.items())
 
 _proguard_file_re = re.compile(r'/proguard/(?:mapping-)?(.*?)\.txt$')
@@ -87,10 +111,53 @@ def set_assemble_status(project, checksum, state, detail=None):
         default_cache.set(cache_key, (state, detail), 300)
 
 
+def _get_symcache_scheduled_cache_key(project_id, debug_id):
+    return 'dsym-scheduled:%s:%s' % (project_id, debug_id)
+
+
+def _get_symcache_lookup_cache_key(project_id, debug_id):
+    return 'dsym-lookup:%s:%s' % (project_id, debug_id)
+
+
+def invalidate_symcache_lookups(project_id, debug_ids):
+    """Clears the cached database lookups for the given debug ids."""
+    cache.delete_many([
+        _get_symcache_lookup_cache_key(project_id, debug_id) for debug_id in debug_ids
+    ])
+
+
 class BadDif(Exception):
     pass
 
 
+class SymCacheConversionPending(Exception):
+    """Raised when symcaches that are required are still being converted
+    by another worker and did not become available in time.
+    """
+
+    def __init__(self, debug_ids, retry_after=SYMCACHE_CONVERSION_RETRY_DELAY):
+        Exception.__init__(self, 'Symcache conversion pending for %s' % ', '.join(debug_ids))
+        self.debug_ids = debug_ids
+        self.retry_after = retry_after
+
+
+_conversion_state = threading.local()
+
+
+@contextmanager
+def pending_symcaches_as_errors():
+    """Within this context symcaches that are still being converted are not
+    waited for.  Instead of raising `SymCacheConversionPending` they are
+    reported as conversion errors, so an event that waited for them too
+    long can be processed without them.
+    """
+    _conversion_state.give_up = True
+    try:
+        yield
+    finally:
+        _conversion_state.give_up = False
+
+
 class VersionDSymFile(Model):
     __core__ = False
 
@@ -242,6 +309,7 @@ class ProjectDSymFile(Model):
     def delete(self, *args, **kwargs):
         super(ProjectDSymFile, self).delete(*args, **kwargs)
         self.file.delete()
+        invalidate_symcache_lookups(self.project_id, [self.debug_id])
 
 
 class ProjectSymCacheFile(Model):
@@ -263,6 +331,7 @@ class ProjectSymCacheFile(Model):
     def delete(self, *args, **kwargs):
         super(ProjectSymCacheFile, self).delete(*args, **kwargs)
         self.cache_file.delete()
+        invalidate_symcache_lookups(self.project_id, [self.dsym_file.debug_id])
 
 
 def create_dsym_from_id(project, dsym_type, cpu_name, debug_id,
@@ -346,6 +415,8 @@ def create_dsym_from_id(project, dsym_type, cpu_name, debug_id,
         rv.file.headers['Content-Type'] = DSYM_MIMETYPES[dsym_type]
         rv.file.save()
 
+    invalidate_symcache_lookups(project.id, [debug_id])
+
     resolve_processing_issue(
         project=project,
         scope='native',
@@ -466,7 +537,48 @@ def find_dsym_file(project, debug_id):
         pass
 
 
+class SymCacheLRU(object):
+    """A process wide cache of open (memory mapped) symcaches. Symcaches
+    are evicted in least recently used order once their total size exceeds
+    the ``dsym.symcache-lru-size`` option.
+    """
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return None
+            self._items[key] = value
+            return value[0]
+
+    def put(self, key, symcache, size):
+        max_size = options.get('dsym.symcache-lru-size')
+        with self._lock:
+            if key in self._items:
+                self._size -= self._items.pop(key)[1]
+            self._items[key] = (symcache, size)
+            self._size += size
+            while self._size > max_size and len(self._items) > 1:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+                metrics.incr('dsymcache.symcache_lru.evicted')
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
 class DSymCache(object):
+    def __init__(self):
+        self.symcaches = SymCacheLRU()
+
     @property
     def cache_path(self):
         return options.get('dsym.cache-path')
@@ -478,13 +590,31 @@ class DSymCache(object):
         """Given some debug ids of dsyms this will update the symcaches for
         all of these if a symcache is supported for that symbol.
         """
-        self._get_symcaches_impl(project, debug_ids)
+        in_flight = set()
+        self._get_symcaches_impl(project, debug_ids, in_flight=in_flight)
+
+        # Lets events that are waiting for the conversion know that it
+        # finished, even if it did not produce a symcache.  Files that are
+        # being converted elsewhere keep their marker, the waiting events pick
+        # up their symcache once it has been stored.  If the conversion
+        # failed the markers expire and the events are retried.
+        cache.delete_many([
+            _get_symcache_scheduled_cache_key(project.id, debug_id)
+            for debug_id in debug_ids
+            if debug_id not in in_flight
+        ])
 
     def get_symcaches(self, project, debug_ids, on_dsym_file_referenced=None,
-                      with_conversion_errors=False):
-        """Given some debug ids returns the symcaches loaded for these debug ids."""
+                      with_conversion_errors=False, wait=None):
+        """Given some debug ids returns the symcaches loaded for these debug ids.
+
+        By default symcaches that are missing or outdated are converted
+        inline.  If `wait` is given the conversion is instead handed off to
+        the `symcache_update` task, and this waits up to `wait` seconds for
+        it to finish before raising `SymCacheConversionPending`.
+        """
         cachefiles, conversion_errors = self._get_symcaches_impl(
-            project, debug_ids, on_dsym_file_referenced)
+            project, debug_ids, on_dsym_file_referenced, wait=wait)
         symcaches = self._load_cachefiles_via_fs(project, cachefiles)
         if with_conversion_errors:
             return symcaches, dict((k, v) for k, v in conversion_errors.items())
@@ -496,15 +626,40 @@ class DSymCache(object):
         """
         if not debug_file.supports_symcache:
             raise RuntimeError('This file type does not support symcaches')
+        lock = self._get_conversion_lock(debug_file)
+        deadline = time.time() + SYMCACHE_CONVERSION_TIMEOUT
+        while True:
+            # Another worker might be converting this file already, in which
+            # case its result is used once it has been stored.
+            current = self._fetch_current_cachefiles(project, [debug_file])
+            if current:
+                return current[0][1], None
+            conversion_errors = self._get_conversion_errors([debug_file])
+            if conversion_errors:
+                return None, conversion_errors[debug_file.debug_id]
+            try:
+                lock.acquire()
+            except UnableToAcquireLock:
+                if time.time() >= deadline:
+                    raise
+                time.sleep(SYMCACHE_CONVERSION_POLL_INTERVAL)
+                continue
+            break
+
         close_tf = False
-        if tf is None:
-            tf = debug_file.file.getfile(as_tempfile=True)
-            close_tf = True
-        else:
-            tf.seek(0)
         try:
+            # The file may have been converted while waiting for the lock.
+            current = self._fetch_current_cachefiles(project, [debug_file])
+            if current:
+                return current[0][1], None
+            if tf is None:
+                tf = debug_file.file.getfile(as_tempfile=True)
+                close_tf = True
+            else:
+                tf.seek(0)
             return self._update_cachefile(debug_file, tf)
         finally:
+            lock.release()
             if close_tf:
                 tf.close()
 
@@ -530,15 +685,59 @@ class DSymCache(object):
 
         return rv
 
-    def _get_symcaches_impl(self, project, debug_ids, on_dsym_file_referenced=None):
-        # Fetch dsym files first and invoke the callback if we need
+    def _get_cached_lookups(self, project, debug_ids):
+        """Returns the cached lookups for the given debug ids as a mapping of
+        debug id to either a ``(debug_file, cache_file)`` tuple or ``False``
+        if there is no debug file supporting symcaches for it.
+        """
+        cache_key_to_debug_id = dict(
+            (_get_symcache_lookup_cache_key(project.id, debug_id), debug_id)
+            for debug_id in debug_ids)
+        return dict(
+            (cache_key_to_debug_id[cache_key], value)
+            for cache_key, value in six.iteritems(
+                cache.get_many(list(cache_key_to_debug_id.keys()))))
+
+    def _set_cached_lookups(self, project, lookups):
+        cache.set_many(dict(
+            (_get_symcache_lookup_cache_key(project.id, debug_id), value)
+            for debug_id, value in six.iteritems(lookups)
+        ), SYMCACHE_LOOKUP_TTL)
+
+    def _get_symcaches_impl(self, project, debug_ids, on_dsym_file_referenced=None,
+                            wait=None, in_flight=None):
         debug_ids = list(map(six.text_type, debug_ids))
+
+        # Debug files that are known to have an up to date symcache (or to not
+        # exist at all) are served from the cache.
+        cachefiles = []
+        cached_lookups = self._get_cached_lookups(project, debug_ids)
+        for value in six.itervalues(cached_lookups):
+            if value is False:
+                continue
+            debug_file, cache_file = value
+            if on_dsym_file_referenced is not None:
+                on_dsym_file_referenced(debug_file)
+            cachefiles.append((debug_file.debug_id, cache_file))
+
+        debug_ids = [x for x in debug_ids if x not in cached_lookups]
+
+        if not debug_ids:
+            return cachefiles, {}
+
+        # Fetch dsym files first and invoke the callback if we need
         debug_files = [x for x in ProjectDSymFile.objects.filter(
             project=project,
             debug_id__in=debug_ids,
         ).select_related('file') if x.supports_symcache]
+
+        lookups = dict.fromkeys(debug_ids, False)
+        for debug_file in debug_files:
+            lookups.pop(debug_file.debug_id, None)
+
         if not debug_files:
-            return {}, {}
+            self._set_cached_lookups(project, lookups)
+            return cachefiles, {}
 
         debug_files_by_id = {}
         for debug_file in debug_files:
@@ -553,7 +752,6 @@ class DSymCache(object):
         ).select_related('cache_file', 'dsym_file__debug_id')
 
         conversion_errors = {}
-        cachefiles = []
         cachefiles_to_update = dict.fromkeys(x.debug_id for x in debug_files)
         for cache_file in q:
             debug_id = cache_file.dsym_file.debug_id
@@ -562,6 +760,7 @@ class DSymCache(object):
                cache_file.checksum == debug_file.file.checksum:
                 cachefiles_to_update.pop(debug_id, None)
                 cachefiles.append((debug_id, cache_file))
+                lookups[debug_id] = (debug_file, cache_file)
             else:
                 cachefiles_to_update[debug_id] = \
                     (cache_file, debug_file)
@@ -576,56 +775,199 @@ class DSymCache(object):
                     cache_file, debug_file = it
                     cache_file.delete()
                 to_update.append(debug_file)
-            updated_cachefiles, conversion_errors = self._update_cachefiles(
-                project, to_update)
+            if wait is None:
+                updated_cachefiles, conversion_errors = self._update_cachefiles(
+                    project, to_update, in_flight=in_flight)
+            else:
+                updated_cachefiles, conversion_errors = self._wait_for_cachefiles(
+                    project, to_update, wait)
             cachefiles.extend(updated_cachefiles)
+            for debug_id, cache_file in updated_cachefiles:
+                lookups[debug_id] = (debug_files_by_id[debug_id], cache_file)
+
+        self._set_cached_lookups(project, lookups)
 
         return cachefiles, conversion_errors
 
-    def _update_cachefiles(self, project, debug_files):
-        rv = []
+    def _get_conversion_lock(self, debug_file):
+        from sentry.app import locks
+        return locks.get(
+            'symcache-convert:%s:%s' % (debug_file.id, debug_file.file.checksum),
+            duration=SYMCACHE_CONVERSION_TIMEOUT,
+        )
 
-        # Find all the known bad files we could not convert last time
-        # around
+    def _get_conversion_errors(self, debug_files):
+        """Find all the known bad files we could not convert last time
+        around.
+        """
         conversion_errors = {}
         for debug_file in debug_files:
             cache_key = 'scbe:%s:%s' % (debug_file.debug_id, debug_file.file.checksum)
             err = default_cache.get(cache_key)
             if err is not None:
                 conversion_errors[debug_file.debug_id] = err
+        return conversion_errors
+
+    def _fetch_current_cachefiles(self, project, debug_files):
+        """Returns the up to date symcache files that exist for the given
+        debug files as a list of ``(debug_id, cache_file)`` tuples.
+        """
+        debug_files_by_id = dict((x.id, x) for x in debug_files)
+        rv = []
+        for cache_file in ProjectSymCacheFile.objects.filter(
+            project=project,
+            dsym_file_id__in=list(debug_files_by_id.keys()),
+            version=SYMCACHE_LATEST_VERSION,
+        ).select_related('cache_file'):
+            debug_file = debug_files_by_id[cache_file.dsym_file_id]
+            if cache_file.checksum == debug_file.file.checksum:
+                rv.append((debug_file.debug_id, cache_file))
+        return rv
 
+    def _wait_for_cachefiles(self, project, debug_files, wait):
+        """Schedules the conversion of the given debug files and waits for
+        up to `wait` seconds for the conversions to finish.
+        """
+        from sentry.tasks.symcache_update import symcache_update
+
+        conversion_errors = self._get_conversion_errors(debug_files)
+        pending = [x for x in debug_files if x.debug_id not in conversion_errors]
+        if not pending:
+            return [], conversion_errors
+
+        # Only schedule one conversion per debug file, even if many events
+        # that reference it are processed at the same time.  The marker is
+        # removed by the task once the conversion finished.
+        to_schedule = [x.debug_id for x in pending if cache.add(
+            _get_symcache_scheduled_cache_key(project.id, x.debug_id), True,
+            SYMCACHE_CONVERSION_TIMEOUT)]
+        if to_schedule:
+            symcache_update.delay(project_id=project.id, debug_ids=to_schedule)
+
+        give_up = getattr(_conversion_state, 'give_up', False)
+        rv = []
+        deadline = time.time() + (0 if give_up else wait)
+        with metrics.timer('dsymcache.wait_for_conversion'):
+            while True:
+                # Check the markers first so that a conversion finishing in
+                # between cannot be mistaken for one without a result.
+                scheduled = cache.get_many([
+                    _get_symcache_scheduled_cache_key(project.id, x.debug_id)
+                    for x in pending
+                ])
+                rv.extend(self._fetch_current_cachefiles(project, pending))
+                done = set(debug_id for debug_id, _ in rv)
+                conversion_errors.update(self._get_conversion_errors(
+                    [x for x in pending if x.debug_id not in done]))
+                pending = [
+                    x for x in pending
+                    if x.debug_id not in done and x.debug_id not in conversion_errors and
+                    _get_symcache_scheduled_cache_key(project.id, x.debug_id) in scheduled
+                ]
+                if not pending or time.time() >= deadline:
+                    break
+                time.sleep(SYMCACHE_CONVERSION_POLL_INTERVAL)
+
+        if pending and give_up:
+            metrics.incr('dsymcache.conversion_abandoned')
+            for debug_file in pending:
+                conversion_errors[debug_file.debug_id] = \
+                    'The debug file is still being processed, try again later'
+        elif pending:
+            metrics.incr('dsymcache.conversion_pending')
+            raise SymCacheConversionPending([x.debug_id for x in pending])
+
+        return rv, conversion_errors
+
+    def _update_cachefiles(self, project, debug_files, in_flight=None):
+        """Converts the given debug files.  Files that are being converted
+        elsewhere are skipped, their debug ids are added to `in_flight`.
+        """
+        rv = []
+
+        conversion_errors = self._get_conversion_errors(debug_files)
+        debug_files = [x for x in debug_files if x.debug_id not in conversion_errors]
+
+        # Conversions that are already running elsewhere are skipped
+        # rather than performed twice.
+        locks = []
+        to_convert = []
         for debug_file in debug_files:
-            dsym_id = debug_file.debug_id
-            if dsym_id in conversion_errors:
+            lock = self._get_conversion_lock(debug_file)
+            try:
+                lock.acquire()
+            except UnableToAcquireLock:
+                metrics.incr('dsymcache.conversion_in_flight')
+                if in_flight is not None:
+                    in_flight.add(debug_file.debug_id)
                 continue
+            locks.append(lock)
+            to_convert.append(debug_file)
 
-            with debug_file.file.getfile(as_tempfile=True) as tf:
-                symcache_file, conversion_error = self._update_cachefile(
-                    debug_file, tf)
-            if symcache_file is not None:
-                rv.append((dsym_id, symcache_file))
-            elif conversion_error is not None:
-                conversion_errors[dsym_id] = conversion_error
+        try:
+            # Files may have been converted while we were acquiring the locks.
+            current = self._fetch_current_cachefiles(project, to_convert)
+            rv.extend(current)
+            done = set(debug_id for debug_id, _ in current)
+            to_convert = [x for x in to_convert if x.debug_id not in done]
+
+            # The conversions run concurrently in a thread pool (symbolic
+            # releases the GIL while converting), while downloading the debug
+            # files and storing the symcaches remains on this thread.
+            max_workers = options.get('dsym.symcache-conversion-workers')
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as exe:
+                futures = []
+                for debug_file in to_convert:
+                    tf = debug_file.file.getfile(as_tempfile=True)
+                    futures.append((debug_file, tf, exe.submit(
+                        self._make_symcache, debug_file, tf.name)))
+
+                for debug_file, tf, future in futures:
+                    with tf:
+                        symcache_file, conversion_error = \
+                            self._store_symcache(debug_file, *future.result())
+                    if symcache_file is not None:
+                        rv.append((debug_file.debug_id, symcache_file))
+                    elif conversion_error is not None:
+                        conversion_errors[debug_file.debug_id] = conversion_error
+        finally:
+            for lock in locks:
+                lock.release()
 
         return rv, conversion_errors
 
-    def _update_cachefile(self, debug_file, tf):
+    def _make_symcache(self, debug_file, path):
+        """Converts the debug file at the given path into a symcache.  Returns
+        a tuple in the form ``(symcache, error)``.
+        """
         try:
-            fo = FatObject.from_path(tf.name)
+            fo = FatObject.from_path(path)
             o = fo.get_object(id=debug_file.debug_id)
             if o is None:
                 return None, None
-            symcache = o.make_symcache()
+            return o.make_symcache(), None
         except SymbolicError as e:
+            return None, e
+
+    def _update_cachefile(self, debug_file, tf):
+        return self._store_symcache(debug_file, *self._make_symcache(debug_file, tf.name))
+
+    def _store_symcache(self, debug_file, symcache, error):
+        if error is not None:
             default_cache.set('scbe:%s:%s' % (
-                debug_file.debug_id, debug_file.file.checksum), e.message,
+                debug_file.debug_id, debug_file.file.checksum), error.message,
                 CONVERSION_ERROR_TTL)
 
-            if not isinstance(e, (SymCacheErrorMissingDebugSection, SymCacheErrorMissingDebugInfo)):
+            if not isinstance(error, (SymCacheErrorMissingDebugSection,
+                                      SymCacheErrorMissingDebugInfo)):
                 logger.error('dsymfile.symcache-build-error',
-                             exc_info=True, extra=dict(debug_id=debug_file.debug_id))
+                             exc_info=(type(error), error, None),
+                             extra=dict(debug_id=debug_file.debug_id))
+
+            return None, error.message
 
-            return None, e.message
+        if symcache is None:
+            return None, None
 
         # We seem to have this task running onconcurrently or some
         # other task might delete symcaches while this is running
@@ -664,6 +1006,14 @@ class DSymCache(object):
         rv = {}
         base = self.get_project_path(project)
         for dsym_id, symcache_file in cachefiles:
+            key = (project.id, dsym_id, symcache_file.checksum, symcache_file.version)
+            symcache = self.symcaches.get(key)
+            if symcache is not None:
+                metrics.incr('dsymcache.symcache_lru', tags={'result': 'hit'})
+                rv[dsym_id] = symcache
+                continue
+
+            metrics.incr('dsymcache.symcache_lru', tags={'result': 'miss'})
             cachefile_path = os.path.join(base, dsym_id + '.symcache')
             try:
                 stat = os.stat(cachefile_path)
@@ -673,7 +1023,9 @@ class DSymCache(object):
                 symcache_file.cache_file.save_to(cachefile_path)
             else:
                 self._try_bump_timestamp(cachefile_path, stat)
-            rv[dsym_id] = SymCache.from_path(cachefile_path)
+            symcache = SymCache.from_path(cachefile_path)
+            self.symcaches.put(key, symcache, symcache_file.cache_file.size or 0)
+            rv[dsym_id] = symcache
         return rv
 
     def _try_bump_timestamp(self, path, old_stat):
@@ -13,6 +13,7 @@ import six
 import mmap
 import tempfile
 
+from collections import deque
 from hashlib import sha1
 from uuid import uuid4
 from concurrent.futures import ThreadPoolExecutor
@@ -21,18 +22,21 @@ from django.conf import settings
 from django.core.files.base import File as FileObj
 from django.core.files.base import ContentFile
 from django.core.files.storage import get_storage_class
-from django.db import models, transaction
+from django.db import models
 from django.utils import timezone
 from jsonfield import JSONField
 
 from sentry.app import locks
 from sentry.db.models import (BoundedPositiveIntegerField, FlexibleForeignKey, Model)
 from sentry.utils import metrics
+from sentry.utils.locking import UnableToAcquireLock
 from sentry.utils.retries import TimedRetryPolicy
 
 ONE_DAY = 60 * 60 * 24
 
 DEFAULT_BLOB_SIZE = 1024 * 1024  # one mb
+MAX_UPLOAD_WORKERS = 4  # concurrent blob uploads per file
+UPLOAD_WINDOW = 8  # chunks that are checked for existence at once
 CHUNK_STATE_HEADER = '__state'
 
 
@@ -96,9 +100,14 @@ class FileBlob(Model):
             checksum.update(chunk)
         checksum = checksum.hexdigest()
 
+        # Blobs that already exist can be returned without taking the lock.
+        existing = cls.objects.filter(checksum=checksum).first()
+        if existing is not None:
+            return existing
+
         # TODO(dcramer): the database here is safe, but if this lock expires
         # and duplicate files are uploaded then we need to prune one
-        lock = locks.get('fileblob:upload:{}'.format(checksum), duration=60 * 10)
+        lock = cls.get_upload_lock(checksum)
         with TimedRetryPolicy(60)(lock.acquire):
             # test for presence
             try:
@@ -122,6 +131,10 @@ class FileBlob(Model):
         metrics.timing('filestore.blob-size', size)
         return blob
 
+    @classmethod
+    def get_upload_lock(cls, checksum):
+        return locks.get('fileblob:upload:{}'.format(checksum), duration=60 * 10)
+
     @classmethod
     def generate_unique_path(cls, timestamp):
         pieces = [six.text_type(x) for x in divmod(int(timestamp.strftime('%s')), ONE_DAY)]
@@ -129,7 +142,7 @@ class FileBlob(Model):
         return u'/'.join(pieces)
 
     def delete(self, *args, **kwargs):
-        lock = locks.get('fileblob:upload:{}'.format(self.checksum), duration=60 * 10)
+        lock = self.get_upload_lock(self.checksum)
         with TimedRetryPolicy(60)(lock.acquire):
             if self.path:
                 self.deletefile(commit=False)
@@ -242,29 +255,48 @@ class File(Model):
         """
         Save a fileobj into a number of chunks.
 
+        Chunks are hashed as they are read while the chunks before them are
+        still being uploaded.  Chunks that already exist as blobs are not
+        uploaded again.
+
         Returns a list of `FileBlobIndex` items.
 
         >>> indexes = file.putfile(fileobj)
         """
-        results = []
+        chunks = []
+        blobs = {}
         offset = 0
         checksum = sha1(b'')
 
-        while True:
-            contents = fileobj.read(blob_size)
-            if not contents:
-                break
-            checksum.update(contents)
-
-            blob_fileobj = ContentFile(contents)
-            blob = FileBlob.from_file(blob_fileobj)
+        with FileBlobUploader() as uploader:
+            while True:
+                window = []
+                while len(window) < UPLOAD_WINDOW:
+                    contents = fileobj.read(blob_size)
+                    if not contents:
+                        break
+                    checksum.update(contents)
+                    window.append((sha1(contents).hexdigest(), contents))
+                if not window:
+                    break
+
+                to_upload = {}
+                for blob_checksum, contents in window:
+                    chunks.append((offset, blob_checksum))
+                    offset += len(contents)
+                    if blob_checksum not in blobs:
+                        to_upload[blob_checksum] = contents
+                blobs.update(uploader.upload(to_upload))
+
+            blobs.update(uploader.finish())
+
+        results = [FileBlobIndex(
+            file=self,
+            blob=blobs[blob_checksum],
+            offset=blob_offset,
+        ) for blob_offset, blob_checksum in chunks]
+        FileBlobIndex.objects.bulk_create(results)
 
-            results.append(FileBlobIndex.objects.create(
-                file=self,
-                blob=blob,
-                offset=offset,
-            ))
-            offset += blob.size
         self.size = offset
         self.checksum = checksum.hexdigest()
         metrics.timing('filestore.file-size', offset)
@@ -272,44 +304,216 @@ class File(Model):
             self.save()
         return results
 
-    def assemble_from_file_blob_ids(self, file_blob_ids, checksum, commit=True):
+    def assemble_from_file_blob_ids(self, file_blob_ids, checksum, commit=True,
+                                    materialize=True):
         """
         This creates a file, from file blobs and returns a temp file with the
         contents.
+
+        The blobs are fetched concurrently and the checksum is verified while
+        they arrive.  If `materialize` is disabled the contents are only
+        checksummed and `None` is returned instead of a temp file.
         """
-        tf = tempfile.NamedTemporaryFile()
-        with transaction.atomic():
-            file_blobs = FileBlob.objects.filter(id__in=file_blob_ids).all()
-            # Make sure the blobs are sorted with the order provided
-            file_blobs = sorted(file_blobs, key=lambda blob: file_blob_ids.index(blob.id))
-
-            new_checksum = sha1(b'')
-            offset = 0
-            for blob in file_blobs:
-                FileBlobIndex.objects.create(
-                    file=self,
-                    blob=blob,
-                    offset=offset,
-                )
-                for chunk in blob.getfile().chunks():
-                    new_checksum.update(chunk)
-                    tf.write(chunk)
-                offset += blob.size
-
-            self.size = offset
-            self.checksum = new_checksum.hexdigest()
-
-            if checksum != self.checksum:
-                raise AssembleChecksumMismatch('Checksum mismatch')
+        blobs_by_id = FileBlob.objects.in_bulk(file_blob_ids)
+        # Make sure the blobs are in the order provided
+        file_blobs = [blobs_by_id[blob_id] for blob_id in file_blob_ids]
 
-        metrics.timing('filestore.file-size', offset)
+        offsets = []
+        size = 0
+        for blob in file_blobs:
+            offsets.append(size)
+            size += blob.size
+
+        new_checksum = sha1(b'')
+        if materialize:
+            tf = tempfile.NamedTemporaryFile()
+            mem = _allocate_mmap(tf, size)
+            try:
+                with ThreadPoolExecutor(max_workers=4) as exe:
+                    futures = [exe.submit(_fetch_blob_into, mem, offset, blob.getfile)
+                               for offset, blob in zip(offsets, file_blobs)]
+                    # Blobs are checksummed in order as soon as they arrived
+                    # while the ones after them are still being fetched.
+                    for offset, blob, future in zip(offsets, file_blobs, futures):
+                        future.result()
+                        new_checksum.update(mem[offset:offset + blob.size])
+                if mem is not None:
+                    mem.flush()
+                    mem.close()
+            except BaseException:
+                tf.close()
+                raise
+        else:
+            tf = None
+            for contents in _iter_blob_contents(file_blobs):
+                new_checksum.update(contents)
+
+        self.size = size
+        self.checksum = new_checksum.hexdigest()
+
+        if checksum != self.checksum:
+            if tf is not None:
+                tf.close()
+            raise AssembleChecksumMismatch('Checksum mismatch')
+
+        FileBlobIndex.objects.bulk_create([FileBlobIndex(
+            file=self,
+            blob=blob,
+            offset=offset,
+        ) for offset, blob in zip(offsets, file_blobs)])
+
+        metrics.timing('filestore.file-size', size)
         if commit:
             self.save()
-        tf.flush()
-        tf.seek(0)
+        if tf is not None:
+            tf.seek(0)
         return tf
 
 
+def _allocate_mmap(f, size):
+    """Grows the given file to `size` and maps it into memory.  Returns
+    `None` for empty files as those cannot be mapped.
+    """
+    if size == 0:
+        return None
+
+    # Zero out the file
+    f.seek(size - 1)
+    f.write('\x00')
+    f.flush()
+
+    return mmap.mmap(f.fileno(), size)
+
+
+def _fetch_blob_into(mem, offset, getfile):
+    with getfile() as sf:
+        while 1:
+            chunk = sf.read(65535)
+            if not chunk:
+                break
+            mem[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+
+def _read_blob(blob):
+    with blob.getfile() as f:
+        return f.read()
+
+
+def _iter_blob_contents(file_blobs, max_workers=4):
+    """Yields the contents of the given blobs in order.  The blobs are
+    fetched concurrently but only a few of them are held in memory.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as exe:
+        pending = deque()
+        for blob in file_blobs:
+            pending.append(exe.submit(_read_blob, blob))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _save_to_storage(path, contents):
+    storage = get_storage()
+    storage.save(path, ContentFile(contents))
+
+
+class FileBlobUploader(object):
+    """Stores the contents of many blobs concurrently.
+
+    Blobs that do not exist yet are written to the storage by a bounded
+    thread pool, while all database access and locking happens on the
+    calling thread.  Blobs that are being uploaded by someone else at the
+    same time are only waited for in `finish` once all of our own uploads
+    completed and their locks were released.
+    """
+
+    def __init__(self, max_workers=MAX_UPLOAD_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_pending = max_workers * 2
+        self.pending = deque()
+        self.contended = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def upload(self, contents_by_checksum):
+        """Starts uploading the given contents.  Returns a dictionary of
+        the blobs by checksum, blobs that are still uploading do not have
+        an id until `finish` was called.
+        """
+        rv = {}
+        if not contents_by_checksum:
+            return rv
+
+        for blob in FileBlob.objects.filter(checksum__in=list(contents_by_checksum)):
+            rv[blob.checksum] = blob
+
+        acquired = {}
+        for checksum in sorted(contents_by_checksum):
+            if checksum in rv:
+                continue
+            lock = FileBlob.get_upload_lock(checksum)
+            try:
+                lock.acquire()
+            except UnableToAcquireLock:
+                self.contended[checksum] = contents_by_checksum[checksum]
+            else:
+                acquired[checksum] = lock
+
+        if not acquired:
+            return rv
+
+        # The blobs might have been stored before we got the lock.
+        for blob in FileBlob.objects.filter(checksum__in=list(acquired)):
+            rv[blob.checksum] = blob
+            acquired.pop(blob.checksum).release()
+
+        for checksum, lock in six.iteritems(acquired):
+            contents = contents_by_checksum[checksum]
+            blob = FileBlob(size=len(contents), checksum=checksum)
+            blob.path = FileBlob.generate_unique_path(blob.timestamp)
+            future = self.executor.submit(_save_to_storage, blob.path, contents)
+            self.pending.append((blob, lock, future))
+            rv[checksum] = blob
+
+        while len(self.pending) > self.max_pending:
+            self._finish_one()
+
+        return rv
+
+    def _finish_one(self):
+        blob, lock, future = self.pending.popleft()
+        try:
+            future.result()
+            blob.save()
+        finally:
+            lock.release()
+        metrics.timing('filestore.blob-size', blob.size)
+
+    def finish(self):
+        """Waits for all uploads to complete.  Returns a dictionary of the
+        blobs by checksum that were uploaded concurrently by someone else.
+        """
+        while self.pending:
+            self._finish_one()
+
+        rv = {}
+        for checksum, contents in six.iteritems(self.contended):
+            rv[checksum] = FileBlob.from_file(ContentFile(contents))
+        self.contended.clear()
+        return rv
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while self.pending:
+            self.pending.popleft()[1].release()
+
+
 class FileBlobIndex(Model):
     __core__ = False
 
@@ -380,29 +584,14 @@ class ChunkedFileBlobIndexWrapper(object):
         f = tempfile.NamedTemporaryFile(prefix='._prefetch-',
                                         dir=prefetch_to,
                                         delete=delete)
-        if size == 0:
+        mem = _allocate_mmap(f, size)
+        if mem is None:
             self._curfile = f
             return
 
-        # Zero out the file
-        f.seek(size - 1)
-        f.write('\x00')
-        f.flush()
-
-        mem = mmap.mmap(f.fileno(), size)
-
-        def fetch_file(offset, getfile):
-            with getfile() as sf:
-                while 1:
-                    chunk = sf.read(65535)
-                    if not chunk:
-                        break
-                    mem[offset:offset + len(chunk)] = chunk
-                    offset += len(chunk)
-
         with ThreadPoolExecutor(max_workers=4) as exe:
             for idx in self._indexes:
-                exe.submit(fetch_file, idx.offset, idx.blob.getfile)
+                exe.submit(_fetch_blob_into, mem, idx.offset, idx.blob.getfile)
 
         mem.flush()
         self._curfile = f
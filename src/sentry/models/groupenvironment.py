@@ -24,6 +24,11 @@ class GroupEnvironment(Model):
 
     __repr__ = sane_repr('group_id', 'environment_id')
 
+    # combines colliding rows when groups are merged
+    merge_aggregates = {
+        'first_release_id': 'coalesce',
+    }
+
     @classmethod
     def _get_cache_key(self, group_id, environment_id):
         return 'groupenv:1:{}:{}'.format(group_id, environment_id)
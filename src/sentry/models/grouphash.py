@@ -7,6 +7,8 @@ sentry.models.grouphash
 """
 from __future__ import absolute_import
 
+from uuid import uuid4
+
 from django.conf import settings
 from django.db import models
 from django.db.models.signals import post_delete
@@ -14,6 +16,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from sentry.db.models import BoundedPositiveIntegerField, FlexibleForeignKey, Model
 from sentry.utils import redis
+from sentry.utils.cache import cache
 
 
 class GroupHash(Model):
@@ -39,6 +42,80 @@ class GroupHash(Model):
         db_table = 'sentry_grouphash'
         unique_together = (('project', 'hash'), )
 
+    # The amount of time (in seconds) that the hash resolution for a project
+    # is cached for. Cached hashes are invalidated (for the entire project)
+    # whenever they are reassigned by merging, unmerging, deleting or
+    # discarding groups, so this is just an upper bound on how long the cache
+    # may serve stale data when an invalidation is missed.
+    cache_ttl = 60 * 60
+
+    @classmethod
+    def get_cache_key(cls, project_id, hash):
+        return 'gh:r:{}:{}'.format(project_id, hash)
+
+    @classmethod
+    def get_cache_version_key(cls, project_id):
+        return 'gh:v:{}'.format(project_id)
+
+    @classmethod
+    def fetch_cached(cls, project_id, hashes):
+        """
+        Fetch cached instances for the provided hashes.
+
+        Returns a tuple of the mapping of hash to instance (for the hashes that
+        were found in the cache) and the cache version that should be provided
+        to ``cache_many`` when caching instances for this project.
+        """
+        version_key = cls.get_cache_version_key(project_id)
+        cache_key_to_hash = {cls.get_cache_key(project_id, hash): hash for hash in hashes}
+        values = cache.get_many([version_key] + list(cache_key_to_hash.keys()))
+
+        version = values.pop(version_key, None)
+        if version is None:
+            # Any values that are present were cached with a version that has
+            # since been invalidated, so they can't be used.
+            version = uuid4().hex
+            if not cache.add(version_key, version, cls.cache_ttl):
+                version = cache.get(version_key) or version
+            return {}, version
+
+        results = {}
+        for cache_key, value in values.items():
+            if value[0] != version:
+                continue
+            hash = cache_key_to_hash[cache_key]
+            results[hash] = cls(
+                id=value[1],
+                project_id=project_id,
+                hash=hash,
+                group_id=value[2],
+                group_tombstone_id=value[3],
+                state=value[4],
+            )
+        return results, version
+
+    @classmethod
+    def cache_many(cls, instances, version):
+        """
+        Cache the resolution of the provided instances. Only instances that
+        have been associated with a group (or discarded) are cached, since
+        unassigned hashes may be claimed by a new group at any time.
+        """
+        cache.set_many({
+            cls.get_cache_key(instance.project_id, instance.hash): (
+                version,
+                instance.id,
+                instance.group_id,
+                instance.group_tombstone_id,
+                instance.state,
+            ) for instance in instances
+            if instance.group_id is not None or instance.group_tombstone_id is not None
+        }, cls.cache_ttl)
+
+    @classmethod
+    def invalidate_cache(cls, project_ids):
+        cache.delete_many([cls.get_cache_version_key(project_id) for project_id in project_ids])
+
     @classmethod
     def __get_last_processed_event_id_cluster(cls):
         cluster_name = getattr(settings, 'GROUP_HASH_LAST_PROCESSED_EVENT_CLUSTER_NAME', 'default')
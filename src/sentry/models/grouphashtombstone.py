@@ -85,3 +85,4 @@ class GroupHashTombstone(Model):
             )
 
         GroupHash.objects.filter(id__in=[gh.id for gh in group_hashes]).delete()
+        GroupHash.invalidate_cache([project_id])
@@ -26,6 +26,12 @@ class GroupRelease(Model):
 
     __repr__ = sane_repr('group_id', 'release_id')
 
+    # combines colliding rows when groups are merged
+    merge_aggregates = {
+        'first_seen': 'min',
+        'last_seen': 'max',
+    }
+
     @classmethod
     def get_cache_key(cls, group_id, release_id, environment):
         return 'grouprelease:1:{}:{}'.format(
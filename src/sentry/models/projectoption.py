@@ -14,13 +14,13 @@ from django.db import models
 from sentry.db.models import Model, FlexibleForeignKey, sane_repr
 from sentry.db.models.fields import EncryptedPickledObjectField
 from sentry.db.models.manager import BaseManager
-from sentry.utils.cache import cache
+from sentry.utils.optioncache import OptionCache
 
 
 class ProjectOptionManager(BaseManager):
     def __init__(self, *args, **kwargs):
         super(ProjectOptionManager, self).__init__(*args, **kwargs)
-        self.__cache = {}
+        self.__cache = OptionCache()
 
     def __getstate__(self):
         d = self.__dict__.copy()
@@ -30,7 +30,7 @@ class ProjectOptionManager(BaseManager):
 
     def __setstate__(self, state):
         self.__dict__.update(state)
-        self.__cache = {}
+        self.__cache = OptionCache()
 
     def _make_key(self, instance_id):
         assert instance_id
@@ -72,23 +72,21 @@ class ProjectOptionManager(BaseManager):
         else:
             project_id = project
 
-        if project_id not in self.__cache:
-            cache_key = self._make_key(project_id)
-            result = cache.get(cache_key)
-            if result is None:
-                result = self.reload_cache(project_id)
-            else:
-                self.__cache[project_id] = result
-        return self.__cache.get(project_id, {})
+        result = self.__cache.get(self._make_key(project_id))
+        if result is None:
+            result = self.reload_cache(project_id)
+        return result
 
     def clear_local_cache(self, **kwargs):
-        self.__cache = {}
+        self.__cache.clear()
+
+    def expire_local_cache(self, **kwargs):
+        self.__cache.expire()
 
     def reload_cache(self, project_id):
         cache_key = self._make_key(project_id)
         result = dict((i.key, i.value) for i in self.filter(project=project_id))
-        cache.set(cache_key, result)
-        self.__cache[project_id] = result
+        self.__cache.set(cache_key, result)
         return result
 
     def post_save(self, instance, **kwargs):
@@ -99,8 +97,8 @@ class ProjectOptionManager(BaseManager):
 
     def contribute_to_class(self, model, name):
         super(ProjectOptionManager, self).contribute_to_class(model, name)
-        task_postrun.connect(self.clear_local_cache)
-        request_finished.connect(self.clear_local_cache)
+        task_postrun.connect(self.expire_local_cache)
+        request_finished.connect(self.expire_local_cache)
 
 
 class ProjectOption(Model):
@@ -58,6 +58,33 @@ register('redis.options', type=Dict, flags=FLAG_NOSTORE)
 
 # symbolizer specifics
 register('dsym.cache-path', type=String, default='/tmp/sentry-dsym-cache')
+# maximum total size (in bytes) of the symcaches kept open by each process
+register('dsym.symcache-lru-size', default=512 * 1024 * 1024)
+# number of debug files converted into symcaches concurrently by each process
+register('dsym.symcache-conversion-workers', default=4)
+# seconds event processing waits for symcache conversions before retrying
+register('dsym.symcache-conversion-wait', default=20)
+
+# Sourcemaps
+# maximum total size (in bytes) of the parsed sources and sourcemaps kept
+# around by each process
+register('sourcemaps.parsed-cache-size', default=256 * 1024 * 1024)
+
+# Event processing
+# events whose JSON payload is at most this many bytes are passed to the
+# processing tasks directly instead of through the cache (0 disables this)
+register('store.inline-event-max-size', default=0)
+
+# Partitioning
+# number of partitions created ahead of time for partitioned tables
+register('partitions.create-ahead', default=3)
+
+# Cleanup
+# maximum number of rows bulk deletions remove per second (0 is unlimited)
+register('cleanup.max-rows-per-second', default=0)
+# bulk deletions pause while replicas lag behind by more than this many
+# seconds (0 disables the check)
+register('cleanup.max-replication-lag', default=0)
 
 # Mail
 register('mail.backend', default='smtp', flags=FLAG_NOSTORE)
@@ -117,6 +144,13 @@ register('cloudflare.secret-key', default='')
 # Tagstore
 register('tagstore.multi-sampling', default=0.0)
 
+# Digests
+register('digests.delivery-batch-size', default=50)
+
+# Similarity
+register('similarity.buffered-indexing', default=False)
+register('similarity.buffer-batch-size', default=500)
+
 # Slack Integration
 register('slack.client-id', flags=FLAG_PRIORITIZE_DISK)
 register('slack.client-secret', flags=FLAG_PRIORITIZE_DISK)
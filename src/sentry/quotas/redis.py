@@ -8,15 +8,20 @@ sentry.quotas.redis
 from __future__ import absolute_import
 
 import functools
+import math
 import six
+import threading
 
+from collections import defaultdict
 from time import time
 
 from sentry.exceptions import InvalidConfiguration
 from sentry.quotas.base import NotRateLimited, Quota, RateLimited
+from sentry.utils import metrics
 from sentry.utils.redis import get_cluster_from_options, load_script
 
 is_rate_limited = load_script('quotas/is_rate_limited.lua')
+lease_quota = load_script('quotas/lease.lua')
 
 
 class BasicRedisQuota(object):
@@ -34,16 +39,53 @@ class BasicRedisQuota(object):
         self.enforce = enforce
 
 
+class QuotaLease(object):
+    __slots__ = ['organization_id', 'refunds', 'size', 'tokens', 'acquired', 'expires', 'result']
+
+    def __init__(self, organization_id, refunds, size, acquired, expires, result=None):
+        self.organization_id = organization_id
+        # (refund key, expiry) of every quota the items were leased from
+        self.refunds = refunds
+        # the number of leased items
+        self.size = size
+        # the number of leased items that are left
+        self.tokens = size
+        self.acquired = acquired
+        # the lease is only used until this timestamp, which is never after
+        # the end of the current window of any of its quotas
+        self.expires = expires
+        # a cached response for when no items could be leased
+        self.result = result
+
+
 class RedisQuota(Quota):
     #: The ``grace`` period allows accomodating for clock drift in TTL
     #: calculation since the clock on the Redis instance used to store quota
     #: metrics may not be in sync with the computer running this code.
     grace = 60
 
+    #: With ``lease`` enabled, every process reserves blocks of items from
+    #: the quotas and accepts events from them without a trip to Redis.
+    #: Leases are used for at most ``lease_duration`` seconds, after which
+    #: their unused items are returned through the refund counters.  The
+    #: size of a lease follows the rate at which the previous lease was used
+    #: up, but is limited to ``lease_max_size`` items and to the
+    #: ``lease_share`` of what is left of the quotas.
+    lease = False
+    lease_duration = 5
+    lease_max_size = 100
+    lease_share = 0.1
+
     def __init__(self, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_QUOTA_OPTIONS', options)
+        for name in ('lease', 'lease_duration', 'lease_max_size', 'lease_share'):
+            if name in options:
+                setattr(self, name, options.pop(name))
         super(RedisQuota, self).__init__(**options)
         self.namespace = 'quota'
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+        self._next_sweep = 0
 
     def validate(self):
         try:
@@ -165,16 +207,7 @@ class RedisQuota(Quota):
         """Return the timestamp when the next rate limit period begins for an interval."""
         return (((timestamp - shift) // interval) + 1) * interval + shift
 
-    def is_rate_limited(self, project, key=None, timestamp=None):
-        if timestamp is None:
-            timestamp = time()
-
-        quotas = self.get_quotas_with_limits(project, key=key)
-
-        # If there are no quotas to actually check, skip the trip to the database.
-        if not quotas:
-            return NotRateLimited()
-
+    def get_keys_and_args(self, project, quotas, timestamp):
         keys = []
         args = []
         for quota in quotas:
@@ -184,9 +217,9 @@ class RedisQuota(Quota):
             keys.extend((key, return_key))
             expiry = self.get_next_period_start(quota.window, shift, timestamp) + self.grace
             args.extend((quota.limit, int(expiry)))
+        return keys, args
 
-        client = self.cluster.get_local_client_for_key(six.text_type(project.organization_id))
-        rejections = is_rate_limited(client, keys, args)
+    def get_rate_limit(self, project, quotas, rejections, timestamp):
         if any(rejections):
             enforce = False
             worst_case = (0, None)
@@ -205,3 +238,136 @@ class RedisQuota(Quota):
                     reason_code=worst_case[1],
                 )
         return NotRateLimited()
+
+    def is_rate_limited(self, project, key=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time()
+
+        if self.lease:
+            return self.is_rate_limited_with_lease(project, key, timestamp)
+
+        quotas = self.get_quotas_with_limits(project, key=key)
+
+        # If there are no quotas to actually check, skip the trip to the database.
+        if not quotas:
+            return NotRateLimited()
+
+        keys, args = self.get_keys_and_args(project, quotas, timestamp)
+
+        client = self.cluster.get_local_client_for_key(six.text_type(project.organization_id))
+        rejections = is_rate_limited(client, keys, args)
+        return self.get_rate_limit(project, quotas, rejections, timestamp)
+
+    def is_rate_limited_with_lease(self, project, key, timestamp):
+        self.sweep_leases(timestamp)
+
+        lease_key = (project.id, key.id if key else None)
+        with self._leases_lock:
+            lease = self._leases.get(lease_key)
+            if lease is not None and lease.expires > timestamp:
+                if lease.result is not None:
+                    return lease.result
+                if lease.tokens > 0:
+                    lease.tokens -= 1
+                    return NotRateLimited()
+
+        lease, result = self.acquire_lease(
+            project, key, self.get_lease_size(lease, timestamp), timestamp)
+
+        with self._leases_lock:
+            previous = self._leases.get(lease_key)
+            self._leases[lease_key] = lease
+
+        if previous is not None:
+            self.release_leases([previous])
+
+        return result
+
+    def get_lease_size(self, lease, timestamp):
+        """
+        Returns the number of items to lease for the rate at which `lease`
+        (the previous lease of the same quotas) was used up.
+        """
+        if lease is None or not lease.size:
+            return 1
+
+        used = lease.size - lease.tokens
+        elapsed = max(min(timestamp, lease.expires) - lease.acquired, 0.001)
+        size = int(math.ceil(used / float(elapsed) * self.lease_duration))
+        return max(1, min(size, self.lease_max_size))
+
+    def acquire_lease(self, project, key, size, timestamp):
+        """
+        Leases up to `size` items from the quotas of `project` and `key`,
+        and takes one of them for the current event.  Returns the lease and
+        the response for the current event.
+        """
+        quotas = self.get_quotas_with_limits(project, key=key)
+
+        expires = timestamp + self.lease_duration
+        for quota in quotas:
+            shift = project.organization_id % quota.window
+            expires = min(expires, self.get_next_period_start(quota.window, shift, timestamp))
+
+        if not quotas:
+            result = NotRateLimited()
+            return QuotaLease(project.organization_id, [], 0, timestamp, expires, result), result
+
+        keys, args = self.get_keys_and_args(project, quotas, timestamp)
+
+        client = self.cluster.get_local_client_for_key(six.text_type(project.organization_id))
+        response = lease_quota(client, keys, args + [size, self.lease_share])
+        granted, rejections = int(response[0]), response[1:]
+
+        metrics.incr('quotas.lease.acquired', skip_internal=True)
+        metrics.timing('quotas.lease.size', granted)
+
+        refunds = list(zip(keys[1::2], args[1::2]))
+        lease = QuotaLease(project.organization_id, refunds, granted, timestamp, expires)
+
+        if granted:
+            lease.tokens -= 1
+            return lease, NotRateLimited()
+
+        result = self.get_rate_limit(project, quotas, rejections, timestamp)
+        if result.is_limited:
+            # Reject further events locally until the lease expires.
+            lease.result = result
+        return lease, result
+
+    def release_leases(self, leases):
+        """
+        Returns the unused items of `leases` through the refund counters.
+        """
+        refunds = defaultdict(list)
+        with self._leases_lock:
+            for lease in leases:
+                if lease.tokens > 0:
+                    refunds[lease.organization_id].append((lease.refunds, lease.tokens))
+                lease.tokens = 0
+
+        for organization_id, items in six.iteritems(refunds):
+            client = self.cluster.get_local_client_for_key(six.text_type(organization_id))
+            pipe = client.pipeline()
+            for lease_refunds, tokens in items:
+                for return_key, expiry in lease_refunds:
+                    pipe.incrby(return_key, tokens)
+                    pipe.expireat(return_key, expiry)
+            pipe.execute()
+
+    def sweep_leases(self, timestamp):
+        """
+        Releases all expired leases, at most once per `lease_duration`.
+        """
+        with self._leases_lock:
+            if timestamp < self._next_sweep:
+                return
+            self._next_sweep = timestamp + self.lease_duration
+
+            expired = [
+                lease_key for lease_key, lease in six.iteritems(self._leases)
+                if lease.expires <= timestamp
+            ]
+            leases = [self._leases.pop(lease_key) for lease_key in expired]
+
+        self.release_leases(leases)
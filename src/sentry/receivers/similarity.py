@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 
-from sentry import features as feature_flags
+from sentry import features as feature_flags, options
 from sentry.signals import event_processed
 from sentry.similarity import features as similarity_features
 
@@ -10,4 +10,8 @@ def record(project, group, event, **kwargs):
     if not feature_flags.has('projects:similarity-indexing', project):
         return
 
-    similarity_features.record([event])
+    if options.get('similarity.buffered-indexing'):
+        from sentry.tasks.similarity import buffer_event
+        buffer_event(event)
+    else:
+        similarity_features.record([event])
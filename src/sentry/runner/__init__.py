@@ -61,8 +61,10 @@ list(
             'sentry.runner.commands.devserver.devserver', 'sentry.runner.commands.django.django',
             'sentry.runner.commands.exec.exec_', 'sentry.runner.commands.files.files',
             'sentry.runner.commands.help.help', 'sentry.runner.commands.init.init',
+            'sentry.runner.commands.partitions.partitions',
             'sentry.runner.commands.plugins.plugins', 'sentry.runner.commands.queues.queues',
             'sentry.runner.commands.repair.repair', 'sentry.runner.commands.run.run',
+            'sentry.runner.commands.similarity.similarity',
             'sentry.runner.commands.start.start', 'sentry.runner.commands.tsdb.tsdb',
             'sentry.runner.commands.upgrade.upgrade',
             'sentry.runner.commands.permissions.permissions',
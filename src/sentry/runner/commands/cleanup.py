@@ -85,6 +85,7 @@ def create_deletion_task(days, project_id, model, dtfield, order_by):
     from sentry import models
     from sentry import deletions
     from sentry import similarity
+    from sentry import tsdb
 
     query = {
         '{}__lte'.format(dtfield): (timezone.now() - timedelta(days=days)),
@@ -105,6 +106,7 @@ def create_deletion_task(days, project_id, model, dtfield, order_by):
         models.GroupRuleStatus,
         # Handled by TTL
         similarity.features,
+        tsdb,
     ] + [b[0] for b in EXTRA_BULK_QUERY_DELETES]
 
     task = deletions.get(
@@ -275,7 +277,7 @@ def cleanup(days, project, concurrency, max_procs, silent, model, router, timed)
                 days=days,
                 project_id=project_id,
                 order_by=order_by,
-            ).execute(chunk_size=chunk_size)
+            ).execute(chunk_size=chunk_size, concurrency=concurrency)
 
     for model, dtfield, order_by in DELETES:
         if not silent:
@@ -290,6 +292,14 @@ def cleanup(days, project, concurrency, max_procs, silent, model, router, timed)
         if is_filtered(model):
             if not silent:
                 click.echo('>> Skipping %s' % model.__name__)
+        elif BulkDeleteQuery(
+            model=model,
+            dtfield=dtfield,
+            days=days,
+            project_id=project_id,
+        ).execute_partitioned():
+            if not silent:
+                click.echo('>> Dropped expired partitions of %s' % model.__name__)
         else:
             if concurrency > 1:
                 shard_ids = range(concurrency)
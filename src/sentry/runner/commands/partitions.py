@@ -0,0 +1,84 @@
+"""
+sentry.runner.commands.partitions
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import click
+from sentry.runner.decorators import configuration
+
+TABLES = ('sentry_message', 'sentry_eventtag', 'nodestore_node')
+
+
+@click.group()
+def partitions():
+    "Manage time partitioned tables."
+
+
+@partitions.command()
+@click.option('--using', default='default', show_default=True, help='Database alias.')
+@configuration
+def list(using):
+    "List partitioned tables and their partitions."
+
+    from sentry.db.postgres.partitioning import PARTITIONABLE_TABLES, PartitionManager
+
+    manager = PartitionManager(using=using)
+    for table in sorted(PARTITIONABLE_TABLES):
+        partitioning = manager.get_partitioning(table)
+        if partitioning is None:
+            click.echo('%s (not partitioned)' % table)
+            continue
+        click.echo('%s (by %s, %s)' % (table, partitioning.column, partitioning.interval))
+        for partition in manager.get_partitions(table):
+            click.echo('  %s %s - %s' % (
+                partition.name,
+                partition.lower.isoformat() if partition.lower else '*',
+                partition.upper.isoformat() if partition.upper else '*',
+            ))
+
+
+@partitions.command()
+@click.option('--interval', type=click.Choice(['day', 'week']), default='day', show_default=True)
+@click.option('--using', default='default', show_default=True, help='Database alias.')
+@click.option('-f', '--force', default=False, is_flag=True, help='Do not prompt for confirmation.')
+@click.argument('table', type=click.Choice(TABLES))
+@configuration
+def enable(interval, using, force, table):
+    """Partition a table by time.
+
+    The existing rows stay in a single legacy partition that is dropped
+    once all of them expired.  The table is locked while the conversion
+    runs.
+    """
+
+    from sentry import options
+    from sentry.db.postgres.partitioning import PartitionManager
+
+    manager = PartitionManager(using=using)
+    if manager.get_partitioning(table) is not None:
+        raise click.ClickException('%s is already partitioned' % table)
+
+    if not force:
+        click.confirm('Convert %s into a partitioned table?' % table, abort=True)
+
+    manager.enable(table, interval=interval, ahead=options.get('partitions.create-ahead'))
+    click.echo('%s is now partitioned by %s' % (table, interval))
+
+
+@partitions.command()
+@click.option('--using', default='default', show_default=True, help='Database alias.')
+@configuration
+def create(using):
+    "Create upcoming partitions."
+
+    from sentry import options
+    from sentry.db.postgres.partitioning import PARTITIONABLE_TABLES, PartitionManager
+
+    manager = PartitionManager(using=using)
+    for table in sorted(PARTITIONABLE_TABLES):
+        for name in manager.create_partitions(table, ahead=options.get('partitions.create-ahead')):
+            click.echo('Created %s' % name)
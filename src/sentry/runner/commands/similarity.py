@@ -0,0 +1,256 @@
+"""
+sentry.runner.commands.similarity
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import time
+from datetime import timedelta
+
+import click
+from six.moves import map
+
+from sentry.runner.decorators import configuration, log_options
+
+
+def get_project(value):
+    from sentry.models import Project
+
+    try:
+        if value.isdigit():
+            return Project.objects.get(id=int(value))
+        if '/' not in value:
+            return None
+        org, proj = value.split('/', 1)
+        return Project.objects.get(
+            organization__slug=org,
+            slug=proj,
+        )
+    except Project.DoesNotExist:
+        return None
+
+
+def load_checkpoints(path):
+    from sentry.utils import json
+
+    try:
+        with open(path) as f:
+            return {int(key): value for key, value in json.load(f).items()}
+    except IOError:
+        return {}
+
+
+def save_checkpoints(path, checkpoints):
+    import os
+    from sentry.utils import json
+
+    # Write to a temporary file first so that an interrupted write doesn't
+    # corrupt an existing checkpoint file.
+    temporary = '{}.tmp'.format(path)
+    with open(temporary, 'w') as f:
+        json.dump(checkpoints, f)
+    os.rename(temporary, path)
+
+
+def throttle(iterator, rate):
+    """
+    Limit the rate that items are consumed from an iterator to ``rate`` items
+    per second.
+    """
+    if not rate:
+        for item in iterator:
+            yield item
+        return
+
+    interval = 1.0 / rate
+    deadline = time.time()
+    for item in iterator:
+        delay = deadline - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        deadline = max(deadline, time.time()) + interval
+        yield item
+
+
+def _close_connections():
+    from django.db import connections
+
+    # Database connections can't be shared across processes, so they need to
+    # be closed before forking -- they'll be reopened on demand.
+    for connection in connections.all():
+        connection.close()
+
+
+def get_group_batches(project, cutoff, start, batch_size):
+    """
+    Yield batches of group IDs for a project in ascending order, starting
+    after the group ID ``start``.
+    """
+    from sentry.models import Group
+
+    while True:
+        batch = list(
+            Group.objects.filter(
+                project_id=project.id,
+                id__gt=start,
+                last_seen__gte=cutoff,
+            ).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+
+        if not batch:
+            return
+
+        yield batch
+
+        start = batch[-1]
+
+
+def record_groups(arguments):
+    """
+    Record the most recent events for a batch of groups in the similarity
+    index, returning the last group ID in the batch along with the number of
+    groups and events that were recorded.
+    """
+    group_ids, events_per_group, cutoff = arguments
+
+    from sentry.models import Event
+    from sentry.tasks.similarity import record_events
+
+    events = []
+    for group_id in group_ids:
+        events.extend(
+            Event.objects.filter(
+                group_id=group_id,
+                datetime__gte=cutoff,
+            ).order_by('-datetime')[:events_per_group]
+        )
+
+    return group_ids[-1], len(group_ids), record_events(events)
+
+
+@click.group()
+def similarity():
+    "Manage the similarity index."
+
+
+@similarity.command()
+@click.argument('projects', nargs=-1, required=True)
+@click.option(
+    '--days',
+    default=30,
+    show_default=True,
+    help='Only record events (and groups) seen within this many days.'
+)
+@click.option(
+    '--events-per-group',
+    default=10,
+    show_default=True,
+    help='The number of recent events to record for each group.'
+)
+@click.option(
+    '--batch-size',
+    default=50,
+    show_default=True,
+    help='The number of groups that are recorded in a single batch.'
+)
+@click.option(
+    '--concurrency',
+    type=int,
+    default=1,
+    show_default=True,
+    help='The number of processes used to extract and record features.'
+)
+@click.option(
+    '--rate',
+    type=float,
+    default=None,
+    help='The maximum number of batches to record per second.'
+)
+@click.option(
+    '--checkpoint',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='A file used to record progress, so an interrupted rebuild can be resumed.'
+)
+@click.option(
+    '--flush/--no-flush',
+    default=True,
+    show_default=True,
+    help='Remove existing data from the index before recording (ignored when resuming.)'
+)
+@log_options()
+@configuration
+def rebuild(projects, days, events_per_group, batch_size, concurrency, rate, checkpoint, flush):
+    """Rebuild the similarity index for projects.
+
+    Projects can be provided as project IDs or as strings with the form
+    `org/project`, where both are slugs. Groups are recorded in ascending ID
+    order, and progress is saved to the `--checkpoint` file (if provided)
+    after each batch, so that the rebuild can resume where it left off.
+    """
+    if concurrency < 1:
+        raise click.ClickException('Minimum concurrency is 1')
+
+    from django.utils import timezone
+    from sentry.similarity import features
+
+    instances = []
+    for value in projects:
+        project = get_project(value)
+        if project is None:
+            raise click.ClickException('Project not found: {}'.format(value))
+        instances.append(project)
+
+    checkpoints = load_checkpoints(checkpoint) if checkpoint else {}
+    cutoff = timezone.now() - timedelta(days=days)
+
+    pool = None
+    if concurrency > 1:
+        import multiprocessing
+        _close_connections()
+        pool = multiprocessing.Pool(concurrency)
+        imap = pool.imap
+    else:
+        imap = map
+
+    try:
+        for project in instances:
+            start = checkpoints.get(project.id)
+            if start is None:
+                if flush:
+                    click.echo('Flushing existing index data for {}...'.format(project))
+                    features.flush(project)
+                start = 0
+            else:
+                click.echo('Resuming {} after group {}...'.format(project, start))
+
+            batches = (
+                (batch, events_per_group, cutoff)
+                for batch in get_group_batches(project, cutoff, start, batch_size)
+            )
+
+            started = time.time()
+            group_count = event_count = 0
+            for last_group_id, groups, events in imap(record_groups, throttle(batches, rate)):
+                group_count += groups
+                event_count += events
+
+                if checkpoint:
+                    checkpoints[project.id] = last_group_id
+                    save_checkpoints(checkpoint, checkpoints)
+
+                click.echo(
+                    '{}: recorded {} groups ({} events, {:.1f} groups/sec)'.format(
+                        project,
+                        group_count,
+                        event_count,
+                        group_count / max(time.time() - started, 0.001),
+                    )
+                )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,48 @@
+-- Lease a block of items from a collection of quota counters, so that the
+-- items can be accepted locally without checking the quotas for each of them.
+-- Values provided as ``KEYS`` are the same as for ``is_rate_limited.lua``.
+-- Values provided as ``ARGV`` specify the maximum value (quota limit) and
+-- expiration time for each key, followed by the number of items requested
+-- and the share of the remaining quota that a single lease may take.
+--
+-- For example, to lease up to 5 items (but no more than a tenth of what is
+-- left) from a quota ``foo`` with a limit of 10 items and a quota ``bar``
+-- with a limit of 20 items that both expire at the Unix timestamp ``100``:
+--
+--   KEYS = {"foo", "subtract_from_foo", "bar", "subtract_from_bar"}
+--   ARGV = {10, 100, 20, 100, 5, 0.1}
+--
+-- At least one item is leased as long as every quota has an item left. The
+-- counters for all quotas are incremented by the number of leased items,
+-- unused items are returned through the refund/negative counters. The result
+-- is a Lua table/array (Redis multi bulk reply) of the number of leased items,
+-- followed by whether or not each quota *rejected* the lease.
+assert(#KEYS == #ARGV - 2, "incorrect number of keys and arguments provided")
+assert(#KEYS % 2 == 0, "there must be an even number of keys")
+
+local granted = tonumber(ARGV[#ARGV - 1])
+local share = tonumber(ARGV[#ARGV])
+
+local results = {}
+for i=1, #KEYS, 2 do
+    local limit = tonumber(ARGV[i])
+    local remaining = limit - ((redis.call('GET', KEYS[i]) or 0) - (redis.call('GET', KEYS[i + 1]) or 0))
+    local rejected = remaining < 1
+    if rejected then
+        granted = 0
+    else
+        granted = math.min(granted, math.max(1, math.floor(remaining * share)))
+    end
+    results[(i + 3) / 2] = rejected
+end
+
+results[1] = granted
+
+if granted > 0 then
+    for i=1, #KEYS, 2 do
+        redis.call('INCRBY', KEYS[i], granted)
+        redis.call('EXPIREAT', KEYS[i], ARGV[i + 1])
+    end
+end
+
+return results
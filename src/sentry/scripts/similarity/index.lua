@@ -606,27 +606,55 @@ end
 
 -- Command Parsing
 
+local function record(configuration, key, signatures)
+    return table.imap(
+        signatures,
+        function (signature)
+            set_frequencies(configuration, signature.index, key, signature.frequencies)
+            for band, buckets in ipairs(signature.frequencies) do
+                for bucket in pairs(buckets) do
+                    get_bucket_membership_set(configuration, signature.index, band, bucket):add(key)
+                end
+            end
+        end
+    )
+end
+
+local function signature_argument_parser(configuration)
+    return object_argument_parser({
+        {"index", argument_parser(validate_value)},
+        {"frequencies", frequencies_argument_parser(configuration)},
+    })
+end
+
 local commands = {
     RECORD = function (configuration, cursor, arguments)
         local cursor, key, signatures = multiple_argument_parser(
             argument_parser(validate_value),
             variadic_argument_parser(
-                object_argument_parser({
-                    {"index", argument_parser(validate_value)},
-                    {"frequencies", frequencies_argument_parser(configuration)},
-                })
+                signature_argument_parser(configuration)
             )
         )(cursor, arguments)
 
+        return record(configuration, key, signatures)
+    end,
+    RECORD_MULTI = function (configuration, cursor, arguments)
+        --[[
+        Records signatures for multiple keys in a single call. Each entry
+        consists of the key, the number of signatures that follow, and the
+        signatures themselves (in the same format as the ``RECORD`` command.)
+        ]]--
+        local cursor, entries = variadic_argument_parser(
+            object_argument_parser({
+                {"key", argument_parser(validate_value)},
+                {"signatures", repeated_argument_parser(signature_argument_parser(configuration))},
+            })
+        )(cursor, arguments)
+
         return table.imap(
-            signatures,
-            function (signature)
-                set_frequencies(configuration, signature.index, key, signature.frequencies)
-                for band, buckets in ipairs(signature.frequencies) do
-                    for bucket in pairs(buckets) do
-                        get_bucket_membership_set(configuration, signature.index, band, bucket):add(key)
-                    end
-                end
+            entries,
+            function (entry)
+                return record(configuration, entry.key, entry.signatures)
             end
         )
     end,
@@ -16,7 +16,9 @@ from django.db.models import Q
 from django.utils import timezone
 
 from sentry import quotas, tagstore
-from sentry.api.paginator import DateTimePaginator, Paginator, SequencePaginator
+from sentry.api.paginator import (
+    DateTimeKeysetPaginator, KeysetPaginator, Paginator, SequencePaginator
+)
 from sentry.search.base import ANY, SearchBackend
 from sentry.search.django.constants import (
     MSSQL_ENGINES, MSSQL_SORT_CLAUSES, MYSQL_SORT_CLAUSES, ORACLE_SORT_CLAUSES, SORT_CLAUSES,
@@ -107,10 +109,10 @@ sort_strategies = {
     #   Paginator,
     #   String: QuerySet order_by parameter
     # ]
-    'priority': (Paginator, '-score'),
-    'date': (DateTimePaginator, '-last_seen'),
-    'new': (DateTimePaginator, '-first_seen'),
-    'freq': (Paginator, '-times_seen'),
+    'priority': (KeysetPaginator, '-score'),
+    'date': (DateTimeKeysetPaginator, '-last_seen'),
+    'new': (DateTimeKeysetPaginator, '-first_seen'),
+    'freq': (KeysetPaginator, '-times_seen'),
 }
 
 
@@ -17,7 +17,7 @@ from sentry.similarity.features import (
     MessageFeature,
     get_application_chunks,
 )
-from sentry.similarity.signatures import MinHashSignatureBuilder
+from sentry.similarity.signatures import signature_builders
 from sentry.utils import redis
 from sentry.utils.datastructures import BidirectionalMapping
 from sentry.utils.iterators import shingle
@@ -77,11 +77,15 @@ def _make_index_backend(cluster=None):
             logger.info('No redis cluster provided for similarity, using {!r}.'.format(index))
             return index
 
+    # Each signature scheme is stored in its own namespace, since signatures
+    # built with different schemes cannot be compared with each other.
+    version = getattr(settings, 'SENTRY_SIMILARITY_SIGNATURE_VERSION', 1)
+
     return MetricsWrapper(
         RedisScriptMinHashIndexBackend(
             cluster,
-            'sim:1',
-            MinHashSignatureBuilder(16, 0xFFFF),
+            'sim:{}'.format(version),
+            signature_builders[version](16, 0xFFFF),
             8,
             60 * 60 * 24 * 30,
             3,
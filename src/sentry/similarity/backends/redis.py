@@ -151,6 +151,32 @@ class RedisScriptMinHashIndexBackend(AbstractIndexBackend):
 
         return self.__index(scope, arguments)
 
+    def record_multi(self, scope, items, timestamp=None):
+        if not items:
+            return  # nothing to do
+
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        arguments = [
+            'RECORD_MULTI',
+            timestamp,
+            self.namespace,
+            self.bands,
+            self.interval,
+            self.retention,
+            self.candidate_set_limit,
+            scope,
+        ]
+
+        for key, signatures in items:
+            arguments.extend([key, len(signatures)])
+            for idx, features in signatures:
+                arguments.append(idx)
+                arguments.extend(self._build_signature_arguments(features))
+
+        return self.__index(scope, arguments)
+
     def merge(self, scope, destination, items, timestamp=None):
         if timestamp is None:
             timestamp = int(time.time())
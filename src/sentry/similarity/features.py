@@ -93,6 +93,27 @@ class FeatureSet(object):
                 )
         return results
 
+    def __get_items(self, event):
+        items = []
+        for label, features in self.extract(event).items():
+            try:
+                features = map(self.encoder.dumps, features)
+            except Exception as error:
+                log = (
+                    logger.debug if isinstance(error, self.expected_encoding_errors) else
+                    functools.partial(logger.warning, exc_info=True)
+                )
+                log(
+                    'Could not encode features from %r for %r due to error: %r',
+                    event,
+                    label,
+                    error,
+                )
+            else:
+                if features:
+                    items.append((self.aliases[label], features, ))
+        return items
+
     def record(self, events):
         if not events:
             return []
@@ -102,37 +123,25 @@ class FeatureSet(object):
 
         items = []
         for event in events:
-            for label, features in self.extract(event).items():
-                if scope is None:
-                    scope = self.__get_scope(event.project)
-                else:
-                    assert self.__get_scope(
-                        event.project
-                    ) == scope, 'all events must be associated with the same project'
+            event_items = self.__get_items(event)
+            if not event_items:
+                continue
 
-                if key is None:
-                    key = self.__get_key(event.group)
-                else:
-                    assert self.__get_key(
-                        event.group
-                    ) == key, 'all events must be associated with the same group'
+            if scope is None:
+                scope = self.__get_scope(event.project)
+            else:
+                assert self.__get_scope(
+                    event.project
+                ) == scope, 'all events must be associated with the same project'
 
-                try:
-                    features = map(self.encoder.dumps, features)
-                except Exception as error:
-                    log = (
-                        logger.debug if isinstance(error, self.expected_encoding_errors) else
-                        functools.partial(logger.warning, exc_info=True)
-                    )
-                    log(
-                        'Could not encode features from %r for %r due to error: %r',
-                        event,
-                        label,
-                        error,
-                    )
-                else:
-                    if features:
-                        items.append((self.aliases[label], features, ))
+            if key is None:
+                key = self.__get_key(event.group)
+            else:
+                assert self.__get_key(
+                    event.group
+                ) == key, 'all events must be associated with the same group'
+
+            items.extend(event_items)
 
         return self.index.record(
             scope,
@@ -141,6 +150,38 @@ class FeatureSet(object):
             timestamp=int(to_timestamp(event.datetime)),
         )
 
+    def bulk_record(self, events):
+        """
+        Record events that may belong to many different projects and groups.
+        Events are grouped by scope, and all of the events within a scope are
+        recorded with a single index operation, using the timestamp of the
+        most recent event in that scope.
+        """
+        scopes = {}
+        timestamps = {}
+        for event in events:
+            items = self.__get_items(event)
+            if not items:
+                continue
+
+            scope = self.__get_scope(event.project)
+            scopes.setdefault(scope, {}).setdefault(
+                self.__get_key(event.group),
+                [],
+            ).extend(items)
+            timestamps[scope] = max(
+                timestamps.get(scope, 0),
+                int(to_timestamp(event.datetime)),
+            )
+
+        return {
+            scope: self.index.record_multi(
+                scope,
+                keys.items(),
+                timestamp=timestamps[scope],
+            ) for scope, keys in scopes.items()
+        }
+
     def classify(self, events, limit=None, thresholds=None):
         if not events:
             return []
@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 
+import math
+import struct
+
 import mmh3
 
 
@@ -21,3 +24,57 @@ class MinHashSignatureBuilder(object):
             ),
             range(self.columns),
         )
+
+
+class PackedMinHashSignatureBuilder(object):
+    """\
+    Builds MinHash signatures by hashing each feature as few times as
+    possible.
+
+    Rather than computing a separate seeded 32-bit hash for every (feature,
+    column) pair, each 128-bit hash of a feature is split into several
+    fixed-width integers (the narrowest of 16, 32 or 64 bits that can
+    represent ``rows`` values), each of which is used as the hash value for a
+    single column. The minimum of each column is computed across all features
+    at once and then reduced to the range ``[0, rows)``.
+
+    The signatures produced by this builder are *not* compatible with those
+    produced by ``MinHashSignatureBuilder``, so the two should not be used
+    with the same index namespace.
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+        for width, code in ((16, 'H'), (32, 'I'), (64, 'Q')):
+            if rows <= 1 << width:
+                break
+        else:
+            raise ValueError('Cannot build signatures with more than 2^64 rows.')
+
+        self.__seeds = range(int(math.ceil(columns / (128.0 / width))))
+        self.__format = '<{}{}'.format(columns, code)
+
+    def __hash(self, feature):
+        return struct.unpack_from(
+            self.__format,
+            b''.join(mmh3.hash_bytes(feature, seed) for seed in self.__seeds),
+        )
+
+    def __call__(self, features):
+        values = [self.__hash(feature) for feature in features]
+        if not values:
+            raise ValueError('Cannot build a signature without any features.')
+
+        rows = self.rows
+        return [value % rows for value in map(min, zip(*values))]
+
+
+# Signature builders for each supported signature scheme version. The version
+# number is included in the index namespace, since signatures built with
+# different schemes cannot be compared.
+signature_builders = {
+    1: MinHashSignatureBuilder,
+    2: PackedMinHashSignatureBuilder,
+}
@@ -93,7 +93,7 @@ class LegacyTagStorage(TagStorage):
         deletion_manager.add_bulk_dependencies(Event, [
             lambda instance_list: ModelRelation(models.EventTag,
                                                 {'event_id__in': [i.id for i in instance_list]},
-                                                ModelDeletionTask),
+                                                BulkModelDeletionTask),
         ])
 
         deletion_manager.register(models.TagValue, BulkModelDeletionTask)
@@ -101,21 +101,21 @@ class LegacyTagStorage(TagStorage):
         deletion_manager.register(models.GroupTagValue, BulkModelDeletionTask)
         deletion_manager.register(models.EventTag, BulkModelDeletionTask)
 
-        deletion_manager.add_dependencies(Group, [
-            lambda instance: ModelRelation(
+        deletion_manager.add_bulk_dependencies(Group, [
+            lambda instance_list: ModelRelation(
                 models.EventTag,
                 query={
-                    'group_id': instance.id,
+                    'group_id__in': [i.id for i in instance_list],
                 }),
-            lambda instance: ModelRelation(
+            lambda instance_list: ModelRelation(
                 models.GroupTagKey,
                 query={
-                    'group_id': instance.id,
+                    'group_id__in': [i.id for i in instance_list],
                 }),
-            lambda instance: ModelRelation(
+            lambda instance_list: ModelRelation(
                 models.GroupTagValue,
                 query={
-                    'group_id': instance.id,
+                    'group_id__in': [i.id for i in instance_list],
                 }),
         ])
 
@@ -42,6 +42,13 @@ class GroupTagValue(Model):
 
     __repr__ = sane_repr('project_id', 'group_id', 'key', 'value')
 
+    # combines the counts of colliding rows when groups are merged
+    merge_aggregates = {
+        'times_seen': 'sum',
+        'first_seen': 'min',
+        'last_seen': 'max',
+    }
+
     def save(self, *args, **kwargs):
         if not self.first_seen:
             self.first_seen = self.last_seen
@@ -96,7 +96,7 @@ class V2TagStorage(TagStorage):
             lambda instance_list: ModelRelation(models.EventTag,
                                                 {'event_id__in': [i.id for i in instance_list],
                                                  'project_id': instance_list[0].project_id},
-                                                ModelDeletionTask),
+                                                BulkModelDeletionTask),
         ])
 
         deletion_manager.register(models.TagValue, BulkModelDeletionTask)
@@ -45,6 +45,13 @@ class GroupTagValue(Model):
 
     __repr__ = sane_repr('project_id', 'group_id', '_key_id', '_value_id')
 
+    # combines the counts of colliding rows when groups are merged
+    merge_aggregates = {
+        'times_seen': 'sum',
+        'first_seen': 'min',
+        'last_seen': 'max',
+    }
+
     def delete(self):
         using = router.db_for_read(GroupTagValue)
         cursor = connections[using].cursor()
@@ -75,39 +75,41 @@ def assemble_dif(project_id, name, checksum, chunks, **kwargs):
             file.delete()
 
 
-def assemble_file(project, name, checksum, chunks, file_type):
-    '''This assembles multiple chunks into on File.'''
+def assemble_file(project, name, checksum, chunks, file_type, materialize=True):
+    '''This assembles multiple chunks into on File.  Unless `materialize` is
+    disabled a temp file with the contents is returned along with it.'''
     from sentry.models import File, ChunkFileState, AssembleChecksumMismatch, \
         FileBlob, set_assemble_status
 
     # Load all FileBlobs from db since we can be sure here we already own all
     # chunks need to build the file
-    file_blobs = FileBlob.objects.filter(
-        checksum__in=chunks
-    ).values_list('id', 'checksum')
-
-    # We need to make sure the blobs are in the order in which
-    # we received them from the request.
-    # Otherwise it could happen that we assemble the file in the wrong order
-    # and get an garbage file.
-    file_blob_ids = [x[0] for x in sorted(
-        file_blobs, key=lambda blob: chunks.index(blob[1])
-    )]
+    blob_ids_by_checksum = dict(
+        (blob_checksum, blob_id) for blob_id, blob_checksum in FileBlob.objects.filter(
+            checksum__in=chunks
+        ).values_list('id', 'checksum')
+    )
 
     # Sanity check.  In case not all blobs exist at this point we have a
     # race condition.
-    if set(x[1] for x in file_blobs) != set(chunks):
+    if set(blob_ids_by_checksum) != set(chunks):
         set_assemble_status(project, checksum, ChunkFileState.ERROR,
                             detail='Not all chunks available for assembling')
         return
 
+    # We need to make sure the blobs are in the order in which
+    # we received them from the request.
+    # Otherwise it could happen that we assemble the file in the wrong order
+    # and get an garbage file.
+    file_blob_ids = [blob_ids_by_checksum[x] for x in chunks]
+
     file = File.objects.create(
         name=name,
         checksum=checksum,
         type=file_type,
     )
     try:
-        temp_file = file.assemble_from_file_blob_ids(file_blob_ids, checksum)
+        temp_file = file.assemble_from_file_blob_ids(file_blob_ids, checksum,
+                                                     materialize=materialize)
     except AssembleChecksumMismatch:
         file.delete()
         set_assemble_status(project, checksum, ChunkFileState.ERROR,
@@ -3,17 +3,24 @@ from __future__ import absolute_import
 import logging
 import time
 
+from collections import defaultdict
+
+from sentry import options
 from sentry.digests import get_option_key
 from sentry.digests.backends.base import InvalidState
 from sentry.digests.notifications import (
     build_digest,
+    build_digests,
     split_key,
+    split_keys,
 )
 from sentry.models import (
     Project,
     ProjectOption,
 )
 from sentry.tasks.base import instrumented_task
+from sentry.utils import metrics
+from sentry.utils.iterators import chunked
 
 logger = logging.getLogger(__name__)
 
@@ -35,8 +42,9 @@ def schedule_digests():
     timeout = 300
     digests.maintenance(deadline - timeout)
 
-    for entry in digests.schedule(deadline):
-        deliver_digest.delay(entry.key, entry.timestamp)
+    batch_size = options.get('digests.delivery-batch-size')
+    for entries in chunked(digests.schedule(deadline), batch_size):
+        deliver_digests.delay([entry.key for entry in entries])
 
 
 @instrumented_task(name='sentry.tasks.digests.deliver_digest', queue='digests.delivery')
@@ -63,3 +71,54 @@ def deliver_digest(key, schedule_timestamp=None):
 
     if digest:
         plugin.notify_digest(project, digest)
+
+
+@instrumented_task(name='sentry.tasks.digests.deliver_digests', queue='digests.delivery')
+def deliver_digests(keys):
+    """
+    Deliver the digests for several timelines at once.
+
+    All of the timelines are opened together, and the state for all of their
+    digests is fetched with shared queries. Once the timelines have been
+    closed, the digests are delivered grouped by project.
+    """
+    from sentry import digests
+
+    keys = list(keys)
+    metrics.timing('digests.delivery.batch_size', len(keys))
+
+    timelines = split_keys(keys)
+    for key in set(keys) - set(timelines):
+        logger.info('Cannot deliver digest %r due to error: project does not exist', key)
+        digests.delete(key)
+
+    if not timelines:
+        return
+
+    minimum_delays = {
+        key: ProjectOption.objects.get_value(
+            project, get_option_key(plugin.get_conf_key(), 'minimum_delay')
+        )
+        for key, (plugin, project) in timelines.items()
+    }
+
+    with digests.digest_many(timelines.keys(), minimum_delays=minimum_delays) as records:
+        # Only timelines that were successfully opened are contained within
+        # the records mapping.
+        opened = [key for key in timelines if key in records]
+        results = build_digests([(timelines[key][1], records[key]) for key in opened])
+
+    deliveries = defaultdict(list)
+    for key, digest in zip(opened, results):
+        if digest:
+            plugin, project = timelines[key]
+            deliveries[project].append((plugin, digest))
+
+    for project, items in deliveries.items():
+        for plugin, digest in items:
+            try:
+                plugin.notify_digest(project, digest)
+            except Exception:
+                logger.exception(
+                    'Failed to deliver digest for %r to %r', project, plugin.slug,
+                )
@@ -9,14 +9,17 @@ sentry.tasks.merge
 from __future__ import absolute_import
 
 import logging
+import time
 
-from django.db import DataError, IntegrityError, router, transaction
+from django.db import DataError, IntegrityError, connections, router, transaction
 from django.db.models import F
 
 from sentry.app import tsdb
+from sentry.db.models import BoundedPositiveIntegerField
 from sentry.similarity import features
 from sentry.tasks.base import instrumented_task, retry
 from sentry.tasks.deletion import delete_group
+from sentry.utils import db, metrics
 
 logger = logging.getLogger('sentry.merge')
 delete_logger = logging.getLogger('sentry.deletions.async')
@@ -41,6 +44,7 @@ def merge_group(
         GroupAssignee,
         GroupEnvironment,
         GroupHash,
+        GroupRelease,
         GroupRuleStatus,
         GroupSubscription,
         Environment,
@@ -99,8 +103,8 @@ def merge_group(
         )
 
     model_list = tuple(EXTRA_MERGE_MODELS) + (
-        Activity, GroupAssignee, GroupEnvironment, GroupHash, GroupRuleStatus,
-        GroupSubscription, EventMapping, Event, UserReport, GroupRedirect,
+        Activity, GroupAssignee, GroupEnvironment, GroupHash, GroupRelease,
+        GroupRuleStatus, GroupSubscription, EventMapping, Event, UserReport, GroupRedirect,
         GroupMeta,
     )
 
@@ -112,6 +116,10 @@ def merge_group(
         transaction_id=transaction_id,
     )
 
+    # The hashes of the source group may have been moved to the destination
+    # group, so any cached hash resolution for the project is no longer valid.
+    GroupHash.invalidate_cache([group.project_id])
+
     if has_more:
         merge_group.delay(
             from_object_id=from_object_id,
@@ -207,6 +215,7 @@ def rehash_group_events(group_id, transaction_id=None, **kwargs):
     # This can cause the new groups to be created before we get to them, but
     # its a tradeoff we're willing to take
     GroupHash.objects.filter(group=group).delete()
+    GroupHash.invalidate_cache([group.project_id])
     has_more = _rehash_group_events(group)
 
     if has_more:
@@ -299,56 +308,264 @@ def _rehash_group_events(group, limit=100):
     return bool(event_list)
 
 
+# statements that combine the value of a colliding row (`src`) into the row
+# of the destination group (`dst`), see `merge_aggregates` on models
+MERGE_AGGREGATES = {
+    'sum': 'least({dst} + {src}, %d)' % (BoundedPositiveIntegerField.MAX_VALUE, ),
+    'min': 'least({dst}, {src})',
+    'max': 'greatest({dst}, {src})',
+    'coalesce': 'coalesce({dst}, {src})',
+}
+
+# seconds a single merge task moves rows before it re-enqueues itself
+MERGE_TIME_BUDGET = 60
+
+
+class SetBasedMerge(object):
+    """
+    Moves all rows of a model from one group to another with a few set based
+    statements instead of one update per row.
+
+    Rows that would violate a unique constraint of the destination group are
+    merged into the colliding row (as described by the `merge_aggregates`
+    of the model, or by calling `merge_counts` for each of them) and
+    deleted before the remaining rows are moved in batches of `limit`.
+    """
+
+    def __init__(self, model, group, new_group, limit=1000):
+        self.model = model
+        self.group = group
+        self.new_group = new_group
+        self.limit = limit
+        self.using = router.db_for_write(model)
+
+        opts = model._meta
+        all_fields = opts.get_all_field_names()
+        self.table = opts.db_table
+        self.group_column = opts.get_field('group' if 'group' in all_fields else 'group_id').column
+        self.has_project = 'project_id' in all_fields or 'project' in all_fields
+        self.unique_columns = self.get_unique_columns()
+
+    def get_unique_columns(self):
+        """
+        Returns the columns of every unique constraint that includes the
+        group, without the group column itself.
+        """
+        opts = self.model._meta
+        rv = []
+        for field in opts.fields:
+            if field.unique and field.column == self.group_column:
+                rv.append(())
+        for names in opts.unique_together:
+            columns = [opts.get_field(name).column for name in names]
+            if self.group_column in columns:
+                rv.append(tuple(c for c in columns if c != self.group_column))
+        return rv
+
+    def quote_name(self, name):
+        return connections[self.using].ops.quote_name(name)
+
+    def get_source_condition(self, alias):
+        qn = self.quote_name
+        sql = '%s.%s = %%s' % (alias, qn(self.group_column))
+        params = [self.group.id]
+        if self.has_project:
+            sql += ' AND %s.%s = %%s' % (alias, qn('project_id'))
+            params.append(self.group.project_id)
+        return sql, params
+
+    def get_collision_condition(self, columns):
+        qn = self.quote_name
+        conditions = ['dst.%s = %%s' % (qn(self.group_column), )]
+        conditions.extend('dst.%s = src.%s' % (qn(c), qn(c)) for c in columns)
+        return ' AND '.join(conditions), [self.new_group.id]
+
+    def execute(self, sql, params):
+        cursor = connections[self.using].cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def resolve_collisions(self):
+        """
+        Merges rows of the source group that collide with rows of the
+        destination group into them and deletes them.  Returns the number of
+        deleted rows.
+        """
+        qn = self.quote_name
+        aggregates = getattr(self.model, 'merge_aggregates', None)
+        source_sql, source_params = self.get_source_condition('src')
+        deleted = 0
+
+        for columns in self.unique_columns:
+            collision_sql, collision_params = self.get_collision_condition(columns)
+
+            with transaction.atomic(using=self.using):
+                if aggregates:
+                    self.execute(
+                        'UPDATE %s AS dst SET %s FROM %s AS src WHERE %s AND %s' % (
+                            qn(self.table),
+                            ', '.join('%s = %s' % (
+                                qn(column),
+                                MERGE_AGGREGATES[func].format(
+                                    dst='dst.%s' % qn(column),
+                                    src='src.%s' % qn(column),
+                                ),
+                            ) for column, func in sorted(aggregates.items())),
+                            qn(self.table),
+                            source_sql,
+                            collision_sql,
+                        ), source_params + collision_params
+                    )
+                elif hasattr(self.model, 'merge_counts'):
+                    cursor = self.execute(
+                        'SELECT src.id FROM %s AS src WHERE %s AND EXISTS '
+                        '(SELECT 1 FROM %s AS dst WHERE %s)' % (
+                            qn(self.table), source_sql, qn(self.table), collision_sql,
+                        ), source_params + collision_params
+                    )
+                    ids = [row[0] for row in cursor.fetchall()]
+                    for obj in self.model.objects.filter(id__in=ids):
+                        obj.merge_counts(self.new_group)
+
+                cursor = self.execute(
+                    'DELETE FROM %s AS src WHERE %s AND EXISTS '
+                    '(SELECT 1 FROM %s AS dst WHERE %s)' % (
+                        qn(self.table), source_sql, qn(self.table), collision_sql,
+                    ), source_params + collision_params
+                )
+                deleted += cursor.rowcount
+
+        return deleted
+
+    def move_batch(self):
+        """
+        Moves up to `limit` rows that do not collide with rows of the
+        destination group.  Returns the number of moved rows.
+        """
+        qn = self.quote_name
+        source_sql, params = self.get_source_condition('src')
+        conditions = [source_sql]
+        for columns in self.unique_columns:
+            collision_sql, collision_params = self.get_collision_condition(columns)
+            conditions.append(
+                'NOT EXISTS (SELECT 1 FROM %s AS dst WHERE %s)' % (qn(self.table), collision_sql)
+            )
+            params.extend(collision_params)
+
+        with transaction.atomic(using=self.using):
+            cursor = self.execute(
+                'UPDATE %s SET %s = %%s WHERE id IN '
+                '(SELECT src.id FROM %s AS src WHERE %s LIMIT %%s)' % (
+                    qn(self.table), qn(self.group_column), qn(self.table),
+                    ' AND '.join(conditions),
+                ), [self.new_group.id] + params + [self.limit]
+            )
+        return cursor.rowcount
+
+    def run(self, deadline):
+        """
+        Merges the rows of the model, returns `True` if rows are left
+        because `deadline` has passed.
+        """
+        tags = {'model': self.model.__name__}
+        with metrics.timer('merge.model.duration', tags=tags):
+            deleted = self.resolve_collisions()
+            metrics.incr('merge.model.rows', amount=deleted,
+                         tags=dict(tags, action='merged'))
+
+            while True:
+                try:
+                    moved = self.move_batch()
+                except IntegrityError:
+                    # A colliding row was created while moving, it is
+                    # resolved when the task runs again.
+                    return True
+
+                metrics.incr('merge.model.rows', amount=moved,
+                             tags=dict(tags, action='moved'))
+                if moved < self.limit:
+                    return False
+                if time.time() > deadline:
+                    return True
+
+
 def merge_objects(models, group, new_group, limit=1000, logger=None, transaction_id=None):
-    has_more = False
+    """
+    Moves the rows of all `models` from `group` to `new_group`.  Returns
+    `True` if the merge has to be continued by another call.
+    """
+    deadline = time.time() + MERGE_TIME_BUDGET
     for model in models:
-        all_fields = model._meta.get_all_field_names()
+        if not db.is_postgres(router.db_for_write(model)):
+            if _merge_objects_per_row(model, group, new_group, limit, logger, transaction_id):
+                return True
+            continue
+
+        merge = SetBasedMerge(model, group, new_group, limit=limit)
+        has_more = merge.run(deadline)
+        if logger is not None:
+            logger.info(
+                'merge.model.progress',
+                extra={
+                    'transaction_id': transaction_id,
+                    'model': model.__name__,
+                    'old_group_id': group.id,
+                    'new_group_id': new_group.id,
+                    'has_more': has_more,
+                }
+            )
+        if has_more:
+            return True
+    return False
 
-        # not all models have a 'project' or 'project_id' field, but we make a best effort
-        # to filter on one if it is available
-        has_project = 'project_id' in all_fields or 'project' in all_fields
-        if has_project:
-            project_qs = model.objects.filter(project_id=group.project_id)
-        else:
-            project_qs = model.objects.all()
 
-        has_group = 'group' in all_fields
-        if has_group:
-            queryset = project_qs.filter(group=group)
+def _merge_objects_per_row(model, group, new_group, limit=1000, logger=None, transaction_id=None):
+    has_more = False
+    all_fields = model._meta.get_all_field_names()
+
+    # not all models have a 'project' or 'project_id' field, but we make a best effort
+    # to filter on one if it is available
+    has_project = 'project_id' in all_fields or 'project' in all_fields
+    if has_project:
+        project_qs = model.objects.filter(project_id=group.project_id)
+    else:
+        project_qs = model.objects.all()
+
+    has_group = 'group' in all_fields
+    if has_group:
+        queryset = project_qs.filter(group=group)
+    else:
+        queryset = project_qs.filter(group_id=group.id)
+
+    for obj in queryset[:limit]:
+        try:
+            with transaction.atomic(using=router.db_for_write(model)):
+                if has_group:
+                    project_qs.filter(id=obj.id).update(group=new_group)
+                else:
+                    project_qs.filter(id=obj.id).update(group_id=new_group.id)
+        except IntegrityError:
+            delete = True
         else:
-            queryset = project_qs.filter(group_id=group.id)
-
-        for obj in queryset[:limit]:
-            try:
-                with transaction.atomic(using=router.db_for_write(model)):
-                    if has_group:
-                        project_qs.filter(id=obj.id).update(group=new_group)
-                    else:
-                        project_qs.filter(id=obj.id).update(group_id=new_group.id)
-            except IntegrityError:
-                delete = True
-            else:
-                delete = False
-
-            if delete:
-                # Before deleting, we want to merge in counts
-                if hasattr(model, 'merge_counts'):
-                    obj.merge_counts(new_group)
-
-                obj_id = obj.id
-                obj.delete()
-
-                if logger is not None:
-                    delete_logger.debug(
-                        'object.delete.executed',
-                        extra={
-                            'object_id': obj_id,
-                            'transaction_id': transaction_id,
-                            'model': model.__name__,
-                        }
-                    )
-            has_more = True
+            delete = False
+
+        if delete:
+            # Before deleting, we want to merge in counts
+            if hasattr(model, 'merge_counts'):
+                obj.merge_counts(new_group)
+
+            obj_id = obj.id
+            obj.delete()
+
+            if logger is not None:
+                delete_logger.debug(
+                    'object.delete.executed',
+                    extra={
+                        'object_id': obj_id,
+                        'transaction_id': transaction_id,
+                        'model': model.__name__,
+                    }
+                )
+        has_more = True
 
-        if has_more:
-            return True
     return has_more
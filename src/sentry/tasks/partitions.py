@@ -0,0 +1,53 @@
+"""
+sentry.tasks.partitions
+~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+from django.db import connections
+
+from sentry import options
+from sentry.tasks.base import instrumented_task
+from sentry.utils import db
+from sentry.utils.locking import UnableToAcquireLock
+
+logger = logging.getLogger(__name__)
+
+
+@instrumented_task(
+    name='sentry.tasks.partitions.create_partitions',
+    time_limit=305,
+    soft_time_limit=300,
+)
+def create_partitions():
+    """
+    Creates the upcoming partitions of all partitioned tables.
+    """
+    from sentry.app import locks
+    from sentry.db.postgres.partitioning import PARTITIONABLE_TABLES, PartitionManager
+
+    lock = locks.get('partitions:create', duration=300)
+
+    try:
+        with lock.acquire():
+            for using in connections:
+                if not db.is_postgres(using):
+                    continue
+                manager = PartitionManager(using=using)
+                for table in sorted(PARTITIONABLE_TABLES):
+                    created = manager.create_partitions(
+                        table, ahead=options.get('partitions.create-ahead'))
+                    for name in created:
+                        logger.info('partitions.created', extra={
+                            'table': table,
+                            'partition': name,
+                            'using': using,
+                        })
+    except UnableToAcquireLock as error:
+        logger.warning('create_partitions.fail', extra={'error': error})
@@ -16,12 +16,13 @@ from django.utils import dateformat, timezone
 
 from sentry.app import tsdb
 from sentry.models import (
-    Activity, GroupStatus, Organization, OrganizationStatus, Project, Team, User, UserOption
+    Activity, Group, GroupStatus, Organization, OrganizationStatus, Project, Team, User, UserOption
 )
-from sentry.tasks.base import instrumented_task
-from sentry.utils import json, redis
+from sentry.tasks.base import instrumented_task, retry
+from sentry.utils import json, metrics, redis
 from sentry.utils.dates import floor_to_utc_day, to_datetime, to_timestamp
 from sentry.utils.email import MessageBuilder
+from sentry.utils.iterators import chunked
 from sentry.utils.math import mean
 from six.moves import reduce
 
@@ -32,6 +33,10 @@ date_format = functools.partial(
 
 logger = logging.getLogger(__name__)
 
+# The number of organization members that have their reports delivered by a
+# single task.
+DELIVERY_BATCH_SIZE = 100
+
 
 def _get_organization_queryset():
     return Organization.objects.filter(
@@ -154,47 +159,67 @@ def merge_series(target, other, function=operator.add):
     return results
 
 
-def prepare_project_series(start__stop, project, rollup=60 * 60 * 24):
+def prepare_organization_series(start__stop, projects, rollup=60 * 60 * 24):
     start, stop = start__stop
     resolution, series = tsdb.get_optimal_rollup_series(start, stop, rollup)
     assert resolution == rollup, 'resolution does not match requested value'
     clean = functools.partial(clean_series, start, stop, rollup)
-    return merge_series(
-        reduce(
-            merge_series,
-            map(
-                clean,
-                tsdb.get_range(
-                    tsdb.models.group,
-                    project.group_set.filter(
-                        status=GroupStatus.RESOLVED,
-                        resolved_at__gte=start,
-                        resolved_at__lt=stop,
-                    ).values_list('id', flat=True),
-                    start,
-                    stop,
-                    rollup=rollup,
-                ).values(),
-            ),
-            clean([(timestamp, 0) for timestamp in series]),
-        ),
-        clean(
-            tsdb.get_range(
-                tsdb.models.project,
-                [project.id],
-                start,
-                stop,
-                rollup=rollup,
-            )[project.id],
-        ),
-        lambda resolved, total: (
-            resolved,
-            total - resolved,  # unresolved
-        ),
+    timestamps = [timestamp for timestamp, value in clean([(timestamp, 0) for timestamp in series])]
+    project_ids = [project.id for project in projects]
+
+    # Rather than merging a series pair for every resolved group, accumulate
+    # the resolved counts for each project into a single column that is
+    # indexed by position in the (cleaned) series.
+    resolved = {project_id: [0] * len(timestamps) for project_id in project_ids}
+
+    group_projects = dict(
+        Group.objects.filter(
+            project_id__in=project_ids,
+            status=GroupStatus.RESOLVED,
+            resolved_at__gte=start,
+            resolved_at__lt=stop,
+        ).values_list('id', 'project_id')
+    )
+
+    if group_projects:
+        for group_id, points in tsdb.get_range(
+            tsdb.models.group,
+            list(group_projects),
+            start,
+            stop,
+            rollup=rollup,
+        ).items():
+            points = clean(points)
+            assert len(points) == len(timestamps), 'series must be same length'
+            column = resolved[group_projects[group_id]]
+            for i, (timestamp, value) in enumerate(points):
+                column[i] += value
+
+    totals = tsdb.get_range(
+        tsdb.models.project,
+        project_ids,
+        start,
+        stop,
+        rollup=rollup,
     )
 
+    results = {}
+    for project_id in project_ids:
+        points = clean(totals[project_id])
+        assert len(points) == len(timestamps), 'series must be same length'
+        results[project_id] = [
+            (
+                timestamp, (
+                    resolved_count,
+                    total - resolved_count,  # unresolved
+                ),
+            ) for (timestamp, total), resolved_count in zip(points, resolved[project_id])
+        ]
+
+    return results
+
 
-def prepare_project_aggregates(ignore__stop, project):
+def prepare_organization_aggregates(ignore__stop, projects):
     # TODO: This needs to return ``None`` for periods that don't have any data
     # (because the project is not old enough) and possibly extrapolate for
     # periods that only have partial periods.
@@ -202,35 +227,45 @@ def prepare_project_aggregates(ignore__stop, project):
     segments = 4
     period = timedelta(days=7)
     start = stop - (period * segments)
+    project_ids = [project.id for project in projects]
 
-    def get_aggregate_value(start, stop):
+    def get_aggregate_values(start, stop):
         return tsdb.get_sums(
             tsdb.models.project,
-            (project.id, ),
+            project_ids,
             start,
             stop,
             rollup=60 * 60 * 24,
-        )[project.id]
+        )
 
-    return [
-        get_aggregate_value(
+    aggregates = [
+        get_aggregate_values(
             start + (period * i),
             start + (period * (i + 1) - timedelta(seconds=1)),
         ) for i in range(segments)
     ]
 
+    return {
+        project_id: [values[project_id] for values in aggregates] for project_id in project_ids
+    }
 
-def prepare_project_issue_summaries(interval, project):
+
+def prepare_organization_issue_summaries(interval, projects):
     start, stop = interval
+    project_ids = [project.id for project in projects]
 
-    queryset = project.group_set.exclude(status=GroupStatus.IGNORED)
+    queryset = Group.objects.filter(
+        project_id__in=project_ids,
+    ).exclude(
+        status=GroupStatus.IGNORED,
+    )
 
     # Fetch all new issues.
-    new_issue_ids = set(
+    new_issues = dict(
         queryset.filter(
             first_seen__gte=start,
             first_seen__lt=stop,
-        ).values_list('id', flat=True)
+        ).values_list('id', 'project_id')
     )
 
     # Fetch all regressions. This is a little weird, since there's no way to
@@ -240,7 +275,7 @@ def prepare_project_issue_summaries(interval, project):
     # past week. (In theory, the activity table *could* be used to answer this
     # query without the subselect, but there's no suitable indexes to make it's
     # performance predictable.)
-    reopened_issue_ids = set(
+    reopened_issues = dict(
         Activity.objects.filter(
             group__in=queryset.filter(
                 last_seen__gte=start,
@@ -250,56 +285,85 @@ def prepare_project_issue_summaries(interval, project):
             type__in=(Activity.SET_REGRESSION, Activity.SET_UNRESOLVED, ),
             datetime__gte=start,
             datetime__lt=stop,
-        ).distinct().values_list('group_id', flat=True)
+        ).distinct().values_list('group_id', 'project_id')
     )
 
     rollup = 60 * 60 * 24
 
     event_counts = tsdb.get_sums(
         tsdb.models.group,
-        new_issue_ids | reopened_issue_ids,
+        set(new_issues) | set(reopened_issues),
         start,
         stop,
         rollup=rollup,
     )
 
-    new_issue_count = sum(event_counts[id] for id in new_issue_ids)
-    reopened_issue_count = sum(event_counts[id] for id in reopened_issue_ids)
-    existing_issue_count = max(
-        tsdb.get_sums(
-            tsdb.models.project,
-            [project.id],
-            start,
-            stop,
-            rollup=rollup,
-        )[project.id] - new_issue_count - reopened_issue_count,
-        0,
+    new_issue_counts = dict.fromkeys(project_ids, 0)
+    for group_id, project_id in new_issues.items():
+        new_issue_counts[project_id] += event_counts[group_id]
+
+    reopened_issue_counts = dict.fromkeys(project_ids, 0)
+    for group_id, project_id in reopened_issues.items():
+        reopened_issue_counts[project_id] += event_counts[group_id]
+
+    totals = tsdb.get_sums(
+        tsdb.models.project,
+        project_ids,
+        start,
+        stop,
+        rollup=rollup,
     )
 
-    return [
-        new_issue_count,
-        reopened_issue_count,
-        existing_issue_count,
-    ]
+    return {
+        project_id: [
+            new_issue_counts[project_id],
+            reopened_issue_counts[project_id],
+            max(
+                totals[project_id] - new_issue_counts[project_id] -
+                reopened_issue_counts[project_id],
+                0,
+            ),
+        ] for project_id in project_ids
+    }
 
 
-def prepare_project_usage_summary(start__stop, project):
+def prepare_organization_usage_summary(start__stop, projects):
     start, stop = start__stop
-    return (
+    project_ids = [project.id for project in projects]
+
+    blacklisted, rejected = [
         tsdb.get_sums(
-            tsdb.models.project_total_blacklisted,
-            [project.id],
+            model,
+            project_ids,
             start,
             stop,
             rollup=60 * 60 * 24,
-        )[project.id], tsdb.get_sums(
+        ) for model in (
+            tsdb.models.project_total_blacklisted,
             tsdb.models.project_total_rejected,
-            [project.id],
-            start,
-            stop,
-            rollup=60 * 60 * 24,
-        )[project.id],
-    )
+        )
+    ]
+
+    return {
+        project_id: (blacklisted[project_id], rejected[project_id], )
+        for project_id in project_ids
+    }
+
+
+def prepare_project_series(start__stop, project, rollup=60 * 60 * 24):
+    return prepare_organization_series(start__stop, [project], rollup)[project.id]
+
+
+def prepare_project_aggregates(ignore__stop, project):
+    return prepare_organization_aggregates(ignore__stop, [project])[project.id]
+
+
+def prepare_project_issue_summaries(interval, project):
+    return prepare_organization_issue_summaries(interval, [project])[project.id]
+
+
+def prepare_project_usage_summary(start__stop, project):
+    return prepare_organization_usage_summary(start__stop, [project])[project.id]
 
 
 def get_calendar_range(ignore__stop_time, months):
@@ -349,34 +413,45 @@ def clean_calendar_data(project, series, start, stop, rollup, timestamp=None):
     )
 
 
-def prepare_project_calendar_series(interval, project):
+def prepare_organization_calendar_series(interval, projects):
     start, stop = get_calendar_query_range(interval, 3)
 
     rollup = 60 * 60 * 24
     series = tsdb.get_range(
         tsdb.models.project,
-        [project.id],
+        [project.id for project in projects],
         start,
         stop,
         rollup=rollup,
-    )[project.id]
-
-    return clean_calendar_data(
-        project,
-        series,
-        start,
-        stop,
-        rollup,
     )
 
+    return {
+        project.id: clean_calendar_data(
+            project,
+            series[project.id],
+            start,
+            stop,
+            rollup,
+        ) for project in projects
+    }
+
+
+def prepare_project_calendar_series(interval, project):
+    return prepare_organization_calendar_series(interval, [project])[project.id]
+
 
 def build(name, fields):
     names, prepare_fields, merge_fields = zip(*fields)
 
     cls = namedtuple(name, names)
 
-    def prepare(*args):
-        return cls(* [f(*args) for f in prepare_fields])
+    def prepare(interval, projects):
+        """
+        Build reports for a batch of projects, returning a mapping of project
+        to report. Each field is prepared for all of the projects at once.
+        """
+        values = [f(interval, projects) for f in prepare_fields]
+        return {project: cls(* [value[project.id] for value in values]) for project in projects}
 
     def merge(target, other):
         return cls(* [f(target[i], other[i]) for i, f in enumerate(merge_fields)])
@@ -384,25 +459,25 @@ def build(name, fields):
     return cls, prepare, merge
 
 
-Report, prepare_project_report, merge_reports = build(
+Report, prepare_organization_reports, merge_reports = build(
     'Report',
     [
         (
-            'series', prepare_project_series, functools.partial(
+            'series', prepare_organization_series, functools.partial(
                 merge_series,
                 function=merge_sequences,
             ),
         ),
         (
-            'aggregates', prepare_project_aggregates, functools.partial(
+            'aggregates', prepare_organization_aggregates, functools.partial(
                 merge_sequences,
                 function=safe_add,
             ),
         ),
-        ('issue_summaries', prepare_project_issue_summaries, merge_sequences, ),
-        ('usage_summary', prepare_project_usage_summary, merge_sequences, ),
+        ('issue_summaries', prepare_organization_issue_summaries, merge_sequences, ),
+        ('usage_summary', prepare_organization_usage_summary, merge_sequences, ),
         (
-            'calendar_series', prepare_project_calendar_series, functools.partial(
+            'calendar_series', prepare_organization_calendar_series, functools.partial(
                 merge_series,
                 function=safe_add,
             ),
@@ -411,13 +486,32 @@ Report, prepare_project_report, merge_reports = build(
 )
 
 
+def prepare_project_report(interval, project):
+    return prepare_organization_reports(interval, [project])[project]
+
+
 class ReportBackend(object):
+    # The number of projects that have their reports prepared together.
+    batch_size = 100
+
     def build(self, timestamp, duration, project):
         return prepare_project_report(
             _to_interval(timestamp, duration),
             project,
         )
 
+    def build_many(self, timestamp, duration, projects):
+        """
+        Build reports for a set of projects, returning a mapping of project to
+        report. Projects are processed in batches of ``batch_size``, with each
+        batch sharing the same set of TSDB and database queries.
+        """
+        interval = _to_interval(timestamp, duration)
+        reports = {}
+        for batch in chunked(projects, self.batch_size):
+            reports.update(prepare_organization_reports(interval, batch))
+        return reports
+
     def prepare(self, timestamp, duration, organization):
         """
         Build and store reports for all projects in the organization.
@@ -431,6 +525,35 @@ class ReportBackend(object):
         """
         raise NotImplementedError
 
+    def prepare_personal_statistics(self, timestamp, duration, organization, user_ids):
+        """
+        Build and store personal statistics for a set of users in the
+        organization.
+        """
+        raise NotImplementedError
+
+    def fetch_personal_statistics(self, timestamp, duration, organization, user_ids):
+        """
+        Fetch personal statistics for a set of users in the organization,
+        returning a mapping of user ID to statistics. Users that do not have
+        stored statistics are mapped to ``None``.
+        """
+        raise NotImplementedError
+
+    def mark_delivered(self, timestamp, duration, organization, user_ids):
+        """
+        Record that the reports for a set of users have been processed, so
+        that they are not delivered again if delivery is restarted.
+        """
+        raise NotImplementedError
+
+    def fetch_delivered(self, timestamp, duration, organization):
+        """
+        Fetch the set of user IDs that have already had their reports
+        processed.
+        """
+        raise NotImplementedError
+
 
 class DummyReportBackend(ReportBackend):
     def prepare(self, timestamp, duration, organization):
@@ -438,15 +561,25 @@ class DummyReportBackend(ReportBackend):
 
     def fetch(self, timestamp, duration, organization, projects):
         assert all(project.organization_id == organization.id for project in projects)
-        return map(
-            functools.partial(
-                self.build,
-                timestamp,
-                duration,
-            ),
-            projects,
+        reports = self.build_many(timestamp, duration, projects)
+        return [reports[project] for project in projects]
+
+    def prepare_personal_statistics(self, timestamp, duration, organization, user_ids):
+        pass
+
+    def fetch_personal_statistics(self, timestamp, duration, organization, user_ids):
+        return fetch_organization_personal_statistics(
+            _to_interval(timestamp, duration),
+            organization,
+            user_ids,
         )
 
+    def mark_delivered(self, timestamp, duration, organization, user_ids):
+        pass
+
+    def fetch_delivered(self, timestamp, duration, organization):
+        return set()
+
 
 class RedisReportBackend(ReportBackend):
     version = 1
@@ -456,14 +589,17 @@ class RedisReportBackend(ReportBackend):
         self.ttl = ttl
         self.namespace = namespace
 
-    def __make_key(self, timestamp, duration, organization):
-        return '{}:{}:{}:{}:{}'.format(
+    def __make_key(self, timestamp, duration, organization, suffix=None):
+        key = '{}:{}:{}:{}:{}'.format(
             self.namespace,
             self.version,
             organization.id,
             int(timestamp),
             int(duration),
         )
+        if suffix is not None:
+            key = '{}:{}'.format(key, suffix)
+        return key
 
     def __encode(self, report):
         return zlib.compress(json.dumps(list(report)))
@@ -476,10 +612,12 @@ class RedisReportBackend(ReportBackend):
 
     def prepare(self, timestamp, duration, organization):
         reports = {}
-        for project in organization.project_set.all():
-            reports[project.id] = self.__encode(
-                self.build(timestamp, duration, project),
-            )
+        for project, report in self.build_many(
+            timestamp,
+            duration,
+            organization.project_set.all(),
+        ).items():
+            reports[project.id] = self.__encode(report)
 
         if not reports:
             # XXX: HMSET requires at least one key/value pair, so we need to
@@ -501,6 +639,57 @@ class RedisReportBackend(ReportBackend):
 
         return list(map(self.__decode, result.value))
 
+    def prepare_personal_statistics(self, timestamp, duration, organization, user_ids):
+        statistics = fetch_organization_personal_statistics(
+            _to_interval(timestamp, duration),
+            organization,
+            user_ids,
+        )
+
+        if not statistics:
+            return
+
+        with self.cluster.map() as client:
+            key = self.__make_key(timestamp, duration, organization, 'p')
+            client.hmset(
+                key,
+                {user_id: json.dumps(value) for user_id, value in statistics.items()},
+            )
+            client.expire(key, self.ttl)
+
+    def fetch_personal_statistics(self, timestamp, duration, organization, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+
+        with self.cluster.map() as client:
+            result = client.hmget(
+                self.__make_key(timestamp, duration, organization, 'p'),
+                user_ids,
+            )
+
+        return {
+            user_id: json.loads(value) if value is not None else None
+            for user_id, value in zip(user_ids, result.value)
+        }
+
+    def mark_delivered(self, timestamp, duration, organization, user_ids):
+        if not user_ids:
+            return
+
+        with self.cluster.map() as client:
+            key = self.__make_key(timestamp, duration, organization, 'd')
+            client.sadd(key, *user_ids)
+            client.expire(key, self.ttl)
+
+    def fetch_delivered(self, timestamp, duration, organization):
+        with self.cluster.map() as client:
+            result = client.smembers(
+                self.__make_key(timestamp, duration, organization, 'd'),
+            )
+
+        return set(map(int, result.value))
+
 
 backend = RedisReportBackend(
     redis.clusters.get('default'),
@@ -542,42 +731,68 @@ def prepare_organization_report(timestamp, duration, organization_id, dry_run=Fa
         user__is_active=True,
     )
 
-    for user_id in member_set.values_list('user_id', flat=True):
-        deliver_organization_user_report.delay(
+    # Users that have already been processed (e.g. by a previous run of this
+    # task that was interrupted) don't need their statistics prepared or
+    # their reports delivered again.
+    delivered = backend.fetch_delivered(timestamp, duration, organization)
+    user_ids = [
+        user_id for user_id in member_set.values_list('user_id', flat=True)
+        if user_id not in delivered
+    ]
+
+    for batch in chunked(user_ids, DELIVERY_BATCH_SIZE):
+        backend.prepare_personal_statistics(timestamp, duration, organization, batch)
+        deliver_organization_user_reports.delay(
             timestamp,
             duration,
             organization_id,
-            user_id,
+            batch,
             dry_run=dry_run,
         )
 
 
-def fetch_personal_statistics(start__stop, organization, user):
+def fetch_organization_personal_statistics(start__stop, organization, user_ids):
+    """
+    Calculate personal statistics for a set of users in the organization,
+    returning a mapping of user ID to statistics.
+    """
     start, stop = start__stop
-    resolved_issue_ids = set(
-        Activity.objects.filter(
-            project__organization_id=organization.id,
-            user_id=user.id,
-            type__in=(Activity.SET_RESOLVED, Activity.SET_RESOLVED_IN_RELEASE, ),
-            datetime__gte=start,
-            datetime__lt=stop,
-            group__status=GroupStatus.RESOLVED,  # only count if the issue is still resolved
-        ).distinct().values_list(
-            'group_id', flat=True
-        )
-    )
+    resolved_issue_ids = {user_id: set() for user_id in user_ids}
+    if not resolved_issue_ids:
+        return {}
+
+    for user_id, group_id in Activity.objects.filter(
+        project__organization_id=organization.id,
+        user_id__in=list(resolved_issue_ids),
+        type__in=(Activity.SET_RESOLVED, Activity.SET_RESOLVED_IN_RELEASE, ),
+        datetime__gte=start,
+        datetime__lt=stop,
+        group__status=GroupStatus.RESOLVED,  # only count if the issue is still resolved
+    ).distinct().values_list('user_id', 'group_id'):
+        resolved_issue_ids[user_id].add(group_id)
+
     return {
-        'resolved': len(resolved_issue_ids),
-        'users': tsdb.get_distinct_counts_union(
-            tsdb.models.users_affected_by_group,
-            resolved_issue_ids,
-            start,
-            stop,
-            60 * 60 * 24,
-        ),
+        user_id: {
+            'resolved': len(group_ids),
+            'users': tsdb.get_distinct_counts_union(
+                tsdb.models.users_affected_by_group,
+                group_ids,
+                start,
+                stop,
+                60 * 60 * 24,
+            ),
+        } for user_id, group_ids in resolved_issue_ids.items()
     }
 
 
+def fetch_personal_statistics(start__stop, organization, user):
+    return fetch_organization_personal_statistics(
+        start__stop,
+        organization,
+        [user.id],
+    )[user.id]
+
+
 Duration = namedtuple(
     'Duration',
     (
@@ -596,9 +811,16 @@ durations = {
 }
 
 
-def build_message(timestamp, duration, organization, user, reports):
+def build_message(timestamp, duration, organization, user, reports, personal=None):
     start, stop = interval = _to_interval(timestamp, duration)
 
+    if personal is None:
+        personal = fetch_personal_statistics(
+            interval,
+            organization,
+            user,
+        )
+
     duration_spec = durations[duration]
     message = MessageBuilder(
         subject=u'{} Report for {}: {} - {}'.format(
@@ -617,11 +839,7 @@ def build_message(timestamp, duration, organization, user, reports):
                 'stop': date_format(stop),
             },
             'organization': organization,
-            'personal': fetch_personal_statistics(
-                interval,
-                organization,
-                user,
-            ),
+            'personal': personal,
             'report': to_context(organization, interval, reports),
             'user': user,
         },
@@ -648,6 +866,12 @@ class Skipped(object):
     NoProjects = object()
     NoReports = object()
 
+    names = {
+        NotSubscribed: 'not_subscribed',
+        NoProjects: 'no_projects',
+        NoReports: 'no_reports',
+    }
+
 
 def has_valid_aggregates(interval, project__report):
     project, report = project__report
@@ -673,6 +897,92 @@ def deliver_organization_user_report(timestamp, duration, organization_id, user_
 
     user = User.objects.get(id=user_id)
 
+    return _deliver_organization_user_report(
+        timestamp,
+        duration,
+        organization,
+        user,
+        dry_run=dry_run,
+    )
+
+
+@instrumented_task(
+    name='sentry.tasks.reports.deliver_organization_user_reports',
+    queue='reports.deliver',
+    default_retry_delay=60 * 5,
+    max_retries=5,
+)
+@retry
+def deliver_organization_user_reports(timestamp, duration, organization_id, user_ids,
+                                      dry_run=False):
+    try:
+        organization = _get_organization_queryset().get(id=organization_id)
+    except Organization.DoesNotExist:
+        logger.warning(
+            'reports.organization.missing',
+            extra={
+                'timestamp': timestamp,
+                'duration': duration,
+                'organization_id': organization_id,
+            }
+        )
+        return
+
+    # If this batch is being retried, skip over any users that were already
+    # processed during the previous attempt.
+    delivered = backend.fetch_delivered(timestamp, duration, organization)
+    users = User.objects.in_bulk([user_id for user_id in user_ids if user_id not in delivered])
+    if not users:
+        return
+
+    statistics = backend.fetch_personal_statistics(
+        timestamp,
+        duration,
+        organization,
+        list(users),
+    )
+
+    # Fetch the reports for every project in the organization up front, since
+    # most members share the same projects.
+    projects = list(organization.project_set.all())
+    reports = dict(
+        zip(
+            [project.id for project in projects],
+            backend.fetch(timestamp, duration, organization, projects),
+        )
+    )
+
+    with metrics.timer('reports.deliver.batch'):
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is None:
+                continue
+
+            result = _deliver_organization_user_report(
+                timestamp,
+                duration,
+                organization,
+                user,
+                dry_run=dry_run,
+                reports=reports,
+                personal=statistics.get(user_id),
+            )
+
+            metrics.incr(
+                'reports.deliver.user',
+                tags={'result': Skipped.names.get(result, 'sent')},
+            )
+
+            # Checkpoint after every user so that an interrupted batch can
+            # resume where it left off.
+            if not dry_run:
+                backend.mark_delivered(timestamp, duration, organization, [user_id])
+
+    metrics.timing('reports.deliver.batch_size', len(users))
+
+
+def _deliver_organization_user_report(timestamp, duration, organization, user, dry_run=False,
+                                      reports=None, personal=None):
     if not user_subscribed_to_organization_reports(user, organization):
         logger.debug(
             'Skipping report for %r to %r, user is not subscribed to reports.',
@@ -696,6 +1006,16 @@ def deliver_organization_user_report(timestamp, duration, organization_id, user_
     interval = _to_interval(timestamp, duration)
     projects = list(projects)
 
+    if reports is None:
+        project_reports = backend.fetch(
+            timestamp,
+            duration,
+            organization,
+            projects,
+        )
+    else:
+        project_reports = [reports.get(project.id) for project in projects]
+
     inclusion_predicates = [
         lambda interval, project__report: project__report[1] is not None,
         has_valid_aggregates,
@@ -704,15 +1024,7 @@ def deliver_organization_user_report(timestamp, duration, organization_id, user_
     reports = dict(
         filter(
             lambda item: all(predicate(interval, item) for predicate in inclusion_predicates),
-            zip(
-                projects,
-                backend.fetch(
-                    timestamp,
-                    duration,
-                    organization,
-                    projects,
-                ),
-            )
+            zip(projects, project_reports),
         )
     )
 
@@ -730,6 +1042,7 @@ def deliver_organization_user_report(timestamp, duration, organization_id, user_
         organization,
         user,
         reports,
+        personal=personal,
     )
 
     if not dry_run:
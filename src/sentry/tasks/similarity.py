@@ -0,0 +1,96 @@
+"""
+sentry.tasks.similarity
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Deferred indexing of events in the similarity index. When buffered indexing
+is enabled, processed events are appended to a Redis list and periodically
+recorded in batches, rather than making one index call per event.
+"""
+from __future__ import absolute_import
+
+import logging
+
+from sentry import options
+from sentry.models import Event, Group, Project
+from sentry.tasks.base import instrumented_task
+from sentry.utils import metrics, redis
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'sim:buffer'
+
+
+def _get_client():
+    return redis.clusters.get('default').get_local_client_for_key(BUFFER_KEY)
+
+
+def buffer_event(event):
+    """
+    Add an event to the buffer of events waiting to be recorded in the
+    similarity index.
+    """
+    _get_client().rpush(BUFFER_KEY, event.id)
+
+
+@instrumented_task(
+    name='sentry.tasks.similarity.flush_buffer',
+    queue='similarity',
+    time_limit=65,
+    soft_time_limit=60,
+)
+def flush_buffer(batch_size=None, max_batches=10):
+    """
+    Record the events that have been buffered for indexing, in batches of up
+    to ``batch_size`` events.
+    """
+    if batch_size is None:
+        batch_size = options.get('similarity.buffer-batch-size')
+
+    client = _get_client()
+    for _ in range(max_batches):
+        with client.pipeline() as pipeline:
+            pipeline.lrange(BUFFER_KEY, 0, batch_size - 1)
+            pipeline.ltrim(BUFFER_KEY, batch_size, -1)
+            event_ids, _ = pipeline.execute()
+
+        if not event_ids:
+            break
+
+        record_events(list(Event.objects.filter(id__in=map(int, event_ids))))
+
+        if len(event_ids) < batch_size:
+            break
+
+
+def record_events(events):
+    """
+    Record a batch of events (which may belong to different projects and
+    groups) in the similarity index, loading their data from nodestore and
+    their projects and groups in bulk.
+    """
+    from sentry.similarity import features
+
+    if not events:
+        return 0
+
+    Event.objects.bind_nodes(events, 'data')
+
+    groups = Group.objects.in_bulk(set(event.group_id for event in events))
+    projects = Project.objects.in_bulk(set(event.project_id for event in events))
+
+    indexable = []
+    for event in events:
+        group = groups.get(event.group_id)
+        project = projects.get(event.project_id)
+        if group is None or project is None:
+            continue  # the group or project was deleted in the meantime
+
+        event.group = group
+        event.project = project
+        indexable.append(event)
+
+    features.bulk_record(indexable)
+
+    metrics.timing('similarity.record_events.batch_size', len(indexable))
+
+    return len(indexable)
@@ -23,7 +23,8 @@ from sentry.utils.safe import safe_execute
 from sentry.stacktraces import process_stacktraces, \
     should_process_for_stacktraces
 from sentry.utils.dates import to_datetime
-from sentry.models import ProjectOption, Activity, Project
+from sentry.models import ProjectOption, Activity, Project, SymCacheConversionPending, \
+    pending_symcaches_as_errors
 
 error_logger = logging.getLogger('sentry.errors.events')
 info_logger = logging.getLogger('sentry.store')
@@ -31,11 +32,20 @@ info_logger = logging.getLogger('sentry.store')
 # Is reprocessing on or off by default?
 REPROCESSING_DEFAULT = False
 
+# How often processing of an event is attempted again while the symcaches it
+# needs are being converted.  Afterwards the event is processed without
+# them, well before its payload expires from the cache.
+SYMCACHE_MAX_ATTEMPTS = 10
+
 
 class RetryProcessing(Exception):
     pass
 
 
+def get_event_cache_key(project_id, event_id):
+    return 'e:{1}:{0}'.format(project_id, event_id)
+
+
 def should_process(data):
     """Quick check if processing is needed at all."""
     from sentry.plugins import plugins
@@ -68,6 +78,11 @@ def _do_preprocess_event(cache_key, data, start_time, event_id, process_event):
     })
 
     if should_process(data):
+        # Events that were passed in directly need to go through the cache
+        # from here on as processing reads and writes them there.
+        if not cache_key:
+            cache_key = get_event_cache_key(project, event_id)
+            default_cache.set(cache_key, data, 3600)
         process_event.delay(cache_key=cache_key, start_time=start_time, event_id=event_id)
         return
 
@@ -105,7 +120,7 @@ def preprocess_event_from_reprocessing(
     )
 
 
-def _do_process_event(cache_key, start_time, event_id, process_task):
+def _do_process_event(cache_key, start_time, event_id, process_task, symcache_attempts=0):
     from sentry.plugins import plugins
 
     data = default_cache.get(cache_key)
@@ -125,7 +140,23 @@ def _do_process_event(cache_key, start_time, event_id, process_task):
     reprocessing_rev = reprocessing.get_reprocessing_revision(project)
 
     # Stacktrace based event processors.  These run before anything else.
-    new_data = process_stacktraces(data)
+    try:
+        if symcache_attempts >= SYMCACHE_MAX_ATTEMPTS:
+            # Stop waiting for the conversions, the debug files that are
+            # still pending are reported as errors on the event instead.
+            with pending_symcaches_as_errors():
+                new_data = process_stacktraces(data)
+        else:
+            new_data = process_stacktraces(data)
+    except SymCacheConversionPending as e:
+        # The debug files this event needs are still being converted.
+        # Rather than blocking this worker we try again a bit later.
+        metrics.incr('events.process.symcache_pending')
+        process_task.apply_async(kwargs=dict(
+            cache_key=cache_key, start_time=start_time, event_id=event_id,
+            symcache_attempts=symcache_attempts + 1,
+        ), countdown=e.retry_after)
+        return
     if new_data is not None:
         has_changed = True
         data = new_data
@@ -175,8 +206,9 @@ def _do_process_event(cache_key, start_time, event_id, process_task):
     time_limit=65,
     soft_time_limit=60,
 )
-def process_event(cache_key, start_time=None, event_id=None, **kwargs):
-    return _do_process_event(cache_key, start_time, event_id, process_event)
+def process_event(cache_key, start_time=None, event_id=None, symcache_attempts=0, **kwargs):
+    return _do_process_event(cache_key, start_time, event_id, process_event,
+                             symcache_attempts)
 
 
 @instrumented_task(
@@ -185,9 +217,10 @@ def process_event(cache_key, start_time=None, event_id=None, **kwargs):
     time_limit=65,
     soft_time_limit=60,
 )
-def process_event_from_reprocessing(cache_key, start_time=None, event_id=None, **kwargs):
+def process_event_from_reprocessing(cache_key, start_time=None, event_id=None,
+                                    symcache_attempts=0, **kwargs):
     return _do_process_event(cache_key, start_time, event_id,
-                             process_event_from_reprocessing)
+                             process_event_from_reprocessing, symcache_attempts)
 
 
 def delete_raw_event(project_id, event_id, allow_hint_clear=False):
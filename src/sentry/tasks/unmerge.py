@@ -1,9 +1,12 @@
 from __future__ import absolute_import
 
 import logging
-from collections import defaultdict
+import threading
+import time
+from collections import defaultdict, deque
 
-from django.db import transaction
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.db import IntegrityError, connections, router, transaction
 
 from sentry import tagstore
 from sentry.app import tsdb
@@ -17,8 +20,27 @@ from sentry.models import (
 )
 from sentry.similarity import features
 from sentry.tasks.base import instrumented_task
+from sentry.utils.dates import to_datetime
 from six.moves import reduce
 
+# the number of batches of events that are fetched concurrently
+UNMERGE_WORKERS = 4
+
+# seconds a single unmerge task processes events before it writes the
+# denormalizations and continues in a new task
+UNMERGE_TIME_BUDGET = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=UNMERGE_WORKERS)
+        return _executor
+
 
 def cache(function):
     results = {}
@@ -182,6 +204,7 @@ def migrate_events(caches, project, source_id, destination_id, fingerprints, eve
             project_id=project.id,
             hash__in=fingerprints,
         ).update(group=destination_id)
+        GroupHash.invalidate_cache([project.id])
 
         # Create activity records for the source and destination group.
         Activity.objects.create(
@@ -280,68 +303,152 @@ def truncate_denormalizations(group):
     features.delete(group)
 
 
-def collect_group_environment_data(events):
+def get_environment_name(event):
+    return Environment.get_name_or_default(event.get_tag('environment'))
+
+
+def get_event_user_from_interface(value):
+    return EventUser(
+        ident=value.get('id'),
+        email=value.get('email'),
+        username=value.get('valuename'),
+        ip_address=value.get('ip_address'),
+    )
+
+
+def update_range(ranges, key, datetime):
+    value = ranges.get(key)
+    if value is None:
+        ranges[key] = [1, datetime, datetime]
+    else:
+        value[0] += 1
+        value[1] = min(value[1], datetime)
+        value[2] = max(value[2], datetime)
+
+
+class Denormalizations(object):
     """\
-    Find the first release for a each group and environment pair from a
-    date-descending sorted list of events.
+    Accumulates the denormalized data (environments, tags, releases and time
+    series) of the events an unmerge task has processed, so that it can be
+    written once per task instead of once per batch of events.
+
+    Time series are accumulated in buckets of the smallest rollup, which
+    keeps every rollup intact while writing each bucket with one call.
     """
-    results = {}
-    for event in events:
-        results[(event.group_id, get_environment_name(event))] = event.get_tag('sentry:release')
-    return results
 
+    def __init__(self, caches, project):
+        self.caches = caches
+        self.project = project
+        self.rollup = min(tsdb.get_rollups())
 
-def repair_group_environment_data(caches, project, events):
-    for (group_id, env_name), first_release in collect_group_environment_data(events).items():
-        fields = {
-            'first_release_id': caches['Release'](project.organization_id, first_release).id,
-        }
+        # (group_id, environment) -> (datetime, release_id) of the first event
+        self.environments = {}
+
+        # (group_id, environment) -> (key, value) -> [times_seen, first_seen, last_seen]
+        self.tags = defaultdict(dict)
 
-        GroupEnvironment.objects.create_or_update(
-            environment_id=caches['Environment'](project.organization_id, env_name).id,
-            group_id=group_id,
-            defaults=fields,
-            values=fields,
+        # (group_id, environment, release_id) -> [times_seen, first_seen, last_seen]
+        self.releases = {}
+
+        # (timestamp, environment_id) -> group_id -> count
+        self.counters = defaultdict(lambda: defaultdict(int))
+
+        # (timestamp, environment_id) -> group_id -> set of users
+        self.sets = defaultdict(lambda: defaultdict(set))
+
+        # timestamp -> model -> group_id -> item -> count
+        self.frequencies = defaultdict(
+            lambda: defaultdict(
+                lambda: defaultdict(
+                    lambda: defaultdict(int),
+                ),
+            ),
         )
 
+    def add(self, events):
+        organization_id = self.project.organization_id
 
-def collect_tag_data(events):
-    results = {}
+        for event in events:
+            environment_name = get_environment_name(event)
+            environment = self.caches['Environment'](organization_id, environment_name)
+            release = event.get_tag('sentry:release')
+            release_id = self.caches['Release'](organization_id, release).id if release else None
+            key = (event.group_id, environment_name)
 
-    for event in events:
-        environment = get_environment_name(event)
-        tags = results.setdefault((event.group_id, environment), {})
+            first = self.environments.get(key)
+            if first is None or event.datetime <= first[0]:
+                self.environments[key] = (event.datetime, release_id)
 
-        for key, value in event.get_tags():
-            values = tags.setdefault(key, {})
+            # XXX: `{first,last}_seen` columns don't totally replicate the
+            # ingestion logic (but actually represent a more accurate value.)
+            # See GH-5289 for more details.
+            tags = self.tags[key]
+            for tag in event.get_tags():
+                update_range(tags, tag, event.datetime)
+
+            if release_id is not None:
+                update_range(
+                    self.releases,
+                    (event.group_id, environment_name, release_id),
+                    event.datetime,
+                )
 
-            if value in values:
-                times_seen, first_seen, last_seen = values[value]
-                values[value] = (times_seen + 1, event.datetime, last_seen)
-            else:
-                values[value] = (1, event.datetime, event.datetime)
+            timestamp = to_datetime(tsdb.normalize_to_epoch(event.datetime, self.rollup))
 
-    return results
+            self.counters[(timestamp, environment.id)][event.group_id] += 1
 
+            user = event.data.get('sentry.interfaces.User')
+            if user:
+                self.sets[(timestamp, environment.id)][event.group_id].add(
+                    get_event_user_from_interface(user).tag_value,
+                )
 
-def repair_tag_data(caches, project, events):
-    for (group_id, env_name), keys in collect_tag_data(events).items():
-        environment = caches['Environment'](
-            project.organization_id,
-            env_name,
-        )
-        for key, values in keys.items():
-            tagstore.get_or_create_group_tag_key(
-                project_id=project.id,
+            frequencies = self.frequencies[timestamp]
+            frequencies[tsdb.models.frequent_environments_by_group][event.group_id][
+                environment.id] += 1
+
+            if release_id is not None:
+                # Resolved to the ``GroupRelease`` once it has been written.
+                frequencies[tsdb.models.frequent_releases_by_group][event.group_id][
+                    (environment_name, release_id)] += 1
+
+    def apply(self):
+        self.apply_environments()
+        self.apply_tags()
+        group_release_ids = self.apply_releases()
+        self.apply_tsdb(group_release_ids)
+
+    def apply_environments(self):
+        organization_id = self.project.organization_id
+        for (group_id, environment_name), (_, release_id) in self.environments.items():
+            fields = {
+                'first_release_id': release_id,
+            }
+
+            GroupEnvironment.objects.create_or_update(
+                environment_id=self.caches['Environment'](organization_id, environment_name).id,
                 group_id=group_id,
-                environment_id=environment.id,
-                key=key,
+                defaults=fields,
+                values=fields,
             )
 
-            # XXX: `{first,last}_seen` columns don't totally replicate the
-            # ingestion logic (but actually represent a more accurate value.)
-            # See GH-5289 for more details.
-            for value, (times_seen, first_seen, last_seen) in values.items():
+    def apply_tags(self):
+        project = self.project
+        for (group_id, environment_name), values in self.tags.items():
+            environment = self.caches['Environment'](
+                project.organization_id,
+                environment_name,
+            )
+
+            for key in set(key for key, _ in values):
+                tagstore.get_or_create_group_tag_key(
+                    project_id=project.id,
+                    group_id=group_id,
+                    environment_id=environment.id,
+                    key=key,
+                )
+
+            for (key, value), (times_seen, first_seen, last_seen) in values.items():
                 _, created = tagstore.get_or_create_group_tag_value(
                     project_id=project.id,
                     group_id=group_id,
@@ -366,146 +473,175 @@ def repair_tag_data(caches, project, events):
                         extra={'first_seen': first_seen}
                     )
 
-
-def get_environment_name(event):
-    return Environment.get_name_or_default(event.get_tag('environment'))
-
-
-def collect_release_data(caches, project, events):
-    results = {}
-
-    for event in events:
-        release = event.get_tag('sentry:release')
-
-        if not release:
-            continue
-
-        key = (
-            event.group_id, get_environment_name(event), caches['Release'](
-                project.organization_id,
-                release,
-            ).id,
+    def get_group_releases(self):
+        return GroupRelease.objects.filter(
+            group_id__in=set(group_id for group_id, _, _ in self.releases),
+            release_id__in=set(release_id for _, _, release_id in self.releases),
         )
 
-        if key in results:
-            first_seen, last_seen = results[key]
-            results[key] = (event.datetime, last_seen)
-        else:
-            results[key] = (event.datetime, event.datetime)
-
-    return results
+    def apply_releases(self):
+        """\
+        Writes the ``GroupRelease`` rows with one bulk insert, returns their
+        ids by (group_id, environment, release_id).
+        """
+        if not self.releases:
+            return {}
+
+        existing = {
+            (instance.group_id, instance.environment, instance.release_id): instance
+            for instance in self.get_group_releases()
+        }
 
+        missing = []
+        for key, (_, first_seen, last_seen) in self.releases.items():
+            instance = existing.get(key)
+            if instance is None:
+                group_id, environment, release_id = key
+                missing.append(GroupRelease(
+                    project_id=self.project.id,
+                    group_id=group_id,
+                    environment=environment,
+                    release_id=release_id,
+                    first_seen=first_seen,
+                    last_seen=last_seen,
+                ))
+            elif first_seen < instance.first_seen:
+                instance.update(first_seen=first_seen)
+
+        if missing:
+            try:
+                with transaction.atomic(using=router.db_for_write(GroupRelease)):
+                    GroupRelease.objects.bulk_create(missing)
+            except IntegrityError:
+                # Some of the rows were created by events ingested meanwhile.
+                for instance in missing:
+                    existing, created = GroupRelease.objects.get_or_create(
+                        group_id=instance.group_id,
+                        environment=instance.environment,
+                        release_id=instance.release_id,
+                        defaults={
+                            'project_id': instance.project_id,
+                            'first_seen': instance.first_seen,
+                            'last_seen': instance.last_seen,
+                        },
+                    )
+                    if not created and instance.first_seen < existing.first_seen:
+                        existing.update(first_seen=instance.first_seen)
 
-def repair_group_release_data(caches, project, events):
-    attributes = collect_release_data(caches, project, events).items()
-    for (group_id, environment, release_id), (first_seen, last_seen) in attributes:
-        instance, created = GroupRelease.objects.get_or_create(
-            project_id=project.id,
-            group_id=group_id,
-            environment=environment,
-            release_id=release_id,
-            defaults={
-                'first_seen': first_seen,
-                'last_seen': last_seen,
-            },
-        )
+        return {
+            (instance.group_id, instance.environment, instance.release_id): instance.id
+            for instance in self.get_group_releases()
+        }
 
-        if not created:
-            instance.update(first_seen=first_seen)
+    def apply_tsdb(self, group_release_ids):
+        for (timestamp, environment_id), counts in self.counters.items():
+            items_by_count = defaultdict(list)
+            for group_id, count in counts.items():
+                items_by_count[count].append((tsdb.models.group, group_id))
+
+            for count, items in items_by_count.items():
+                tsdb.incr_multi(items, timestamp, count, environment_id=environment_id)
+
+        for (timestamp, environment_id), values in self.sets.items():
+            tsdb.record_multi(
+                [(tsdb.models.users_affected_by_group, group_id, users)
+                 for group_id, users in values.items()],
+                timestamp,
+                environment_id=environment_id,
+            )
 
+        releases_model = tsdb.models.frequent_releases_by_group
+        for timestamp, data in self.frequencies.items():
+            if releases_model in data:
+                data[releases_model] = {
+                    group_id: {
+                        group_release_ids[(group_id, environment, release_id)]: count
+                        for (environment, release_id), count in items.items()
+                    } for group_id, items in data[releases_model].items()
+                }
 
-def get_event_user_from_interface(value):
-    return EventUser(
-        ident=value.get('id'),
-        email=value.get('email'),
-        username=value.get('valuename'),
-        ip_address=value.get('ip_address'),
-    )
+            tsdb.record_frequency_multi(data.items(), timestamp)
 
 
-def collect_tsdb_data(caches, project, events):
-    counters = defaultdict(
-        lambda: defaultdict(
-            lambda: defaultdict(int),
-        ),
-    )
+def fetch_events(project_id, event_ids, fingerprints):
+    """\
+    Fetches the events with their data and splits them by whether they are
+    migrated to the destination group.
+    """
+    events = list(Event.objects.filter(
+        project_id=project_id,
+        id__in=event_ids,
+    ).order_by('-id'))
 
-    sets = defaultdict(
-        lambda: defaultdict(
-            lambda: defaultdict(set),
-        ),
-    )
+    Event.objects.bind_nodes(events, 'data')
 
-    frequencies = defaultdict(
-        lambda: defaultdict(
-            lambda: defaultdict(
-                lambda: defaultdict(int),
-            ),
-        ),
-    )
+    source_events = []
+    destination_events = []
 
     for event in events:
-        environment = caches['Environment'](
-            project.organization_id,
-            get_environment_name(event),
-        )
-
-        counters[event.datetime][tsdb.models.group][(event.group_id, environment.id)] += 1
-
-        user = event.data.get('sentry.interfaces.User')
-        if user:
-            sets[event.datetime][tsdb.models.users_affected_by_group][(event.group_id, environment.id)].add(
-                get_event_user_from_interface(user).tag_value,
-            )
+        (destination_events
+         if get_fingerprint(event) in fingerprints else source_events).append(event)
 
-        frequencies[event.datetime][tsdb.models.frequent_environments_by_group
-                                    ][event.group_id][environment.id] += 1
-
-        release = event.get_tag('sentry:release')
-        if release:
-            # TODO: I'm also not sure if "environment" here is correct, see
-            # similar comment above during creation.
-            grouprelease = caches['GroupRelease'](
-                event.group_id,
-                get_environment_name(event),
-                caches['Release'](
-                    project.organization_id,
-                    release,
-                ).id,
-            )
+    return source_events, destination_events
 
-            frequencies[event.datetime][tsdb.models.frequent_releases_by_group
-                                        ][event.group_id][grouprelease.id] += 1
 
-    return counters, sets, frequencies
+def fetch_events_in_thread(project_id, event_ids, fingerprints):
+    try:
+        return fetch_events(project_id, event_ids, fingerprints)
+    finally:
+        # Database connections are per thread, close the ones opened by the
+        # worker so that the executor does not keep them open indefinitely.
+        for connection in connections.all():
+            connection.close()
 
 
-def repair_tsdb_data(caches, project, events):
-    counters, sets, frequencies = collect_tsdb_data(caches, project, events)
+def stream_events(project_id, source_id, fingerprints, cursor, batch_size):
+    """\
+    Yields the events of the source group in batches of `batch_size` as
+    ``(cursor, source_events, destination_events)``, in descending order by
+    their primary key to get the best approximation of the most recently
+    received events.
+
+    Batches are selected by id range, the following batches are fetched
+    from the node store by worker threads while the current one is
+    processed.  Inside a transaction the batches are fetched on the calling
+    thread instead, as other threads would not see its changes.
+    """
+    workers = UNMERGE_WORKERS if not transaction.get_connection().in_atomic_block else 0
+    pending = deque()
+    exhausted = False
 
-    for timestamp, data in counters.items():
-        for model, keys in data.items():
-            for (key, environment_id), value in keys.items():
-                tsdb.incr(model, key, timestamp, value, environment_id=environment_id)
+    while True:
+        while not exhausted and len(pending) <= workers:
+            queryset = Event.objects.filter(
+                project_id=project_id,
+                group_id=source_id,
+            ).order_by('-id')
 
-    for timestamp, data in sets.items():
-        for model, keys in data.items():
-            for (key, environment_id), values in keys.items():
-                # TODO: This should use `record_multi` rather than `record`.
-                tsdb.record(model, key, values, timestamp, environment_id=environment_id)
+            if cursor is not None:
+                queryset = queryset.filter(id__lt=cursor)
 
-    for timestamp, data in frequencies.items():
-        tsdb.record_frequency_multi(data.items(), timestamp)
+            event_ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if len(event_ids) < batch_size:
+                exhausted = True
+            if not event_ids:
+                break
 
+            cursor = event_ids[-1]
+            if workers:
+                future = get_executor().submit(
+                    fetch_events_in_thread, project_id, event_ids, fingerprints)
+            else:
+                future = Future()
+                future.set_result(fetch_events(project_id, event_ids, fingerprints))
+            pending.append((cursor, future))
 
-def repair_denormalizations(caches, project, events):
-    repair_group_environment_data(caches, project, events)
-    repair_tag_data(caches, project, events)
-    repair_group_release_data(caches, project, events)
-    repair_tsdb_data(caches, project, events)
+        if not pending:
+            return
 
-    for event in events:
-        features.record([event])
+        cursor, future = pending.popleft()
+        source_events, destination_events = future.result()
+        yield cursor, source_events, destination_events
 
 
 def lock_hashes(project_id, source_id, fingerprints):
@@ -524,6 +660,8 @@ def lock_hashes(project_id, source_id, fingerprints):
             id__in=[h.id for h in eligible_hashes],
         ).update(state=GroupHash.State.LOCKED_IN_MIGRATION)
 
+    GroupHash.invalidate_cache([project_id])
+
     return [h.hash for h in eligible_hashes]
 
 
@@ -534,6 +672,8 @@ def unlock_hashes(project_id, fingerprints):
         state=GroupHash.State.LOCKED_IN_MIGRATION,
     ).update(state=GroupHash.State.UNLOCKED)
 
+    GroupHash.invalidate_cache([project_id])
+
 
 @instrumented_task(name='sentry.tasks.unmerge', queue='unmerge')
 def unmerge(
@@ -546,11 +686,6 @@ def unmerge(
     batch_size=500,
     source_fields_reset=False
 ):
-    # XXX: The queryset chunking logic below is awfully similar to
-    # ``RangeQuerySetWrapper``. Ideally that could be refactored to be able to
-    # be run without iteration by passing around a state object and we could
-    # just use that here instead.
-
     source = Group.objects.get(
         project_id=project_id,
         id=source_id,
@@ -567,70 +702,61 @@ def unmerge(
 
     project = caches['Project'](project_id)
 
-    # We fetch the events in descending order by their primary key to get the
-    # best approximation of the most recently received events.
-    queryset = Event.objects.filter(
-        project_id=project_id,
-        group_id=source_id,
-    ).order_by('-id')
+    denormalizations = Denormalizations(caches, project)
+    deadline = time.time() + UNMERGE_TIME_BUDGET
+    finished = True
+
+    for cursor, source_events, destination_events in stream_events(
+            project_id, source_id, fingerprints, cursor, batch_size):
+        if source_events:
+            if not source_fields_reset:
+                source.update(**get_group_creation_attributes(
+                    caches,
+                    source_events,
+                ))
+                source_fields_reset = True
+            else:
+                source.update(**get_group_backfill_attributes(
+                    caches,
+                    source,
+                    source_events,
+                ))
+
+        destination_id = migrate_events(
+            caches,
+            project,
+            source_id,
+            destination_id,
+            fingerprints,
+            destination_events,
+            actor_id,
+        )
+
+        denormalizations.add(source_events)
+        denormalizations.add(destination_events)
 
-    if cursor is not None:
-        queryset = queryset.filter(id__lt=cursor)
+        features.record(source_events)
+        features.record(destination_events)
 
-    events = list(queryset[:batch_size])
+        if time.time() > deadline:
+            finished = False
+            break
+
+    denormalizations.apply()
 
     # If there are no more events to process, we're done with the migration.
-    if not events:
+    if finished:
         tagstore.update_group_tag_key_values_seen(project_id, [source_id, destination_id])
         unlock_hashes(project_id, fingerprints)
         return destination_id
 
-    Event.objects.bind_nodes(events, 'data')
-
-    source_events = []
-    destination_events = []
-
-    for event in events:
-        (destination_events
-         if get_fingerprint(event) in fingerprints else source_events).append(event)
-
-    if source_events:
-        if not source_fields_reset:
-            source.update(**get_group_creation_attributes(
-                caches,
-                source_events,
-            ))
-            source_fields_reset = True
-        else:
-            source.update(**get_group_backfill_attributes(
-                caches,
-                source,
-                source_events,
-            ))
-
-    destination_id = migrate_events(
-        caches,
-        project,
-        source_id,
-        destination_id,
-        fingerprints,
-        destination_events,
-        actor_id,
-    )
-
-    repair_denormalizations(
-        caches,
-        project,
-        events,
-    )
-
     unmerge.delay(
         project_id,
         source_id,
         destination_id,
         fingerprints,
         actor_id,
-        cursor=events[-1].id,
+        cursor=cursor,
         batch_size=batch_size,
         source_fields_reset=source_fields_reset,
     )
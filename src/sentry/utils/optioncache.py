@@ -0,0 +1,148 @@
+"""
+sentry.utils.optioncache
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import logging
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+
+from sentry.utils import metrics
+from sentry.utils.cache import cache
+from sentry.utils.pubsub import RedisPublisher, RedisSubscriber
+
+logger = logging.getLogger('sentry.errors')
+
+CHANNEL = 'sentry-option-cache'
+
+# every option cache of the process, to invalidate them on changes
+_caches = weakref.WeakSet()
+_publisher = None
+_subscriber = None
+
+
+def _get_connection():
+    return getattr(settings, 'SENTRY_OPTION_CACHE_PUBSUB', None)
+
+
+def _invalidate(cache_key):
+    for option_cache in _caches:
+        option_cache.invalidate(cache_key)
+
+
+def _clear():
+    for option_cache in _caches:
+        option_cache.clear()
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = RedisPublisher(_get_connection())
+    return _publisher
+
+
+def _get_subscriber():
+    global _subscriber
+    if _subscriber is None:
+        _subscriber = RedisSubscriber(_get_connection(), CHANNEL, _invalidate, on_connect=_clear)
+    return _subscriber
+
+
+class OptionCache(object):
+    """
+    A process local cache for the option blobs that option managers keep in
+    the shared cache.
+
+    Every blob is stored together with a version.  Local entries are used
+    for `SENTRY_OPTION_CACHE_TTL` seconds, after which the version in the
+    shared cache is checked and the entry is only fetched again if it has
+    changed.
+
+    If `SENTRY_OPTION_CACHE_PUBSUB` is set, changes are published over
+    redis and entries are dropped as soon as a change is received.
+    Otherwise entries only live until the current request or task finishes,
+    see `expire`.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        _caches.add(self)
+
+    @property
+    def push_invalidated(self):
+        return _get_connection() is not None
+
+    def _make_version_key(self, cache_key):
+        return '%s:version' % (cache_key, )
+
+    def get(self, cache_key):
+        """
+        Returns the values stored at `cache_key`, or `None` if the shared
+        cache does not have them.
+        """
+        if self.push_invalidated:
+            _get_subscriber().start()
+
+        now = time.time()
+        entry = self.entries.get(cache_key)
+        if entry is not None:
+            values, version, expires = entry
+            if expires > now:
+                return values
+
+            if version is not None and \
+                    cache.get(self._make_version_key(cache_key)) == version:
+                metrics.incr('optioncache.revalidated', skip_internal=True)
+                self.entries[cache_key] = (values, version, now + settings.SENTRY_OPTION_CACHE_TTL)
+                return values
+
+        metrics.incr('optioncache.miss', skip_internal=True)
+        version_key = self._make_version_key(cache_key)
+        result = cache.get_many([cache_key, version_key])
+        values = result.get(cache_key)
+        if values is not None:
+            self.entries[cache_key] = (
+                values, result.get(version_key), now + settings.SENTRY_OPTION_CACHE_TTL,
+            )
+        return values
+
+    def set(self, cache_key, values):
+        """
+        Stores `values` in the shared cache under a new version and tells
+        other processes to drop their copy.
+        """
+        version = uuid.uuid4().hex
+        cache.set_many({
+            cache_key: values,
+            self._make_version_key(cache_key): version,
+        })
+        self.entries[cache_key] = (values, version, time.time() + settings.SENTRY_OPTION_CACHE_TTL)
+
+        if self.push_invalidated:
+            try:
+                _get_publisher().publish(CHANNEL, cache_key)
+            except Exception:
+                # Other processes pick the change up when their entries expire.
+                logger.warning('optioncache.publish-failed', exc_info=True)
+
+    def invalidate(self, cache_key):
+        self.entries.pop(cache_key, None)
+
+    def clear(self):
+        self.entries = {}
+
+    def expire(self, **kwargs):
+        """
+        Drops all entries unless changes are pushed to this process.  This is
+        connected to the end of requests and tasks.
+        """
+        if not self.push_invalidated:
+            self.clear()
@@ -1,11 +1,13 @@
 from __future__ import absolute_import
 
+import os
 import redis
 import logging
 import random
+import time
 
 from django.conf import settings
-from threading import Thread
+from threading import Lock, Thread
 from six.moves.queue import Queue, Full
 
 
@@ -66,3 +68,52 @@ class RedisPublisher(object):
     def publish(self, channel, value, key=None):
         if self.rds is not None:
             self.rds.publish(channel, value)
+
+
+class RedisSubscriber(object):
+    """
+    Listens to a channel of a redis server on a background thread and
+    passes every message to `callback`.
+
+    The thread is started lazily and restarted in forked processes.  As
+    messages published while the connection was down are lost,
+    `on_connect` is called every time the subscription is (re)established.
+    """
+
+    retry_delay = 5
+
+    def __init__(self, connection, channel, callback, on_connect=None):
+        self.connection = connection
+        self.channel = channel
+        self.callback = callback
+        self.on_connect = on_connect
+        self._pid = None
+        self._lock = Lock()
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            t = Thread(target=self._worker)
+            t.setDaemon(True)
+            t.start()
+            self._pid = os.getpid()
+
+    def _worker(self):
+        logger = logging.getLogger('sentry.errors')
+        rds = redis.StrictRedis(**self.connection)
+        while True:
+            try:
+                pubsub = rds.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if self.on_connect is not None:
+                    self.on_connect()
+                for message in pubsub.listen():
+                    self.callback(message['data'])
+            except Exception:
+                logger.debug('lost subscription to pubsub channel', exc_info=True)
+            time.sleep(self.retry_delay)
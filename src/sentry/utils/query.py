@@ -16,7 +16,7 @@ from django.db.models import ForeignKey
 from django.db.models.deletion import Collector
 from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 
-from sentry.utils import db
+from sentry.utils import db, metrics
 
 _leaf_re = re.compile(r'^(Event|Group)(.+)')
 
@@ -306,8 +306,19 @@ def bulk_delete_objects(model, limit=10000, transaction_id=None,
             params.append(value)
 
     for column, value in filters.items():
-        query.append('%s = %%s' % (quote_name(column), ))
-        params.append(value)
+        if column.endswith('__in'):
+            column = column[:-len('__in')]
+            if not value:
+                return False
+            if db.is_postgres():
+                query.append('%s = any(%%s)' % (quote_name(column), ))
+                params.append(list(value))
+            else:
+                query.append('%s in (%s)' % (quote_name(column), ', '.join(['%s'] * len(value))))
+                params.extend(value)
+        else:
+            query.append('%s = %%s' % (quote_name(column), ))
+            params.append(value)
 
     if db.is_postgres():
         query = """
@@ -345,7 +356,10 @@ def bulk_delete_objects(model, limit=10000, transaction_id=None,
         return has_more
 
     cursor = connection.cursor()
-    cursor.execute(query, params)
+    with metrics.timer('deletions.bulk.duration', tags={'model': model.__name__}):
+        cursor.execute(query, params)
+    metrics.incr('deletions.bulk.rows', amount=max(cursor.rowcount, 0),
+                 tags={'model': model.__name__})
 
     has_more = cursor.rowcount > 0
 
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from mock import Mock, patch
+
+from sentry.api.serializers.loader import LoaderBatch
+from sentry.models import Organization
+from sentry.testutils import TestCase, TransactionTestCase
+
+
+class LoaderBatchTest(TestCase):
+    def test_results(self):
+        batch = LoaderBatch()
+        batch.add('foo', lambda: 1)
+        batch.add('bar', lambda: 2)
+        assert batch.get_results() == {'foo': 1, 'bar': 2}
+
+    def test_errors(self):
+        def fail():
+            raise ValueError('failed')
+
+        batch = LoaderBatch()
+        batch.add('foo', fail)
+        with self.assertRaises(ValueError):
+            batch.get_results()
+
+    @patch('sentry.api.serializers.loader.env')
+    def test_request_deduplication(self, env):
+        env.request = Mock(spec=[])
+        func = Mock(return_value=1)
+
+        batch = LoaderBatch()
+        batch.add('foo', func, key=('foo', 1))
+        batch.add('bar', func)
+        assert batch.get_results() == {'foo': 1, 'bar': 1}
+
+        batch = LoaderBatch()
+        batch.add('foo', func, key=('foo', 1))
+        batch.add('baz', func, key=('foo', 2))
+        assert batch.get_results() == {'foo': 1, 'baz': 1}
+
+        assert func.call_count == 3
+
+    def test_no_request_deduplication_outside_request(self):
+        func = Mock(return_value=1)
+        for _ in range(2):
+            batch = LoaderBatch()
+            batch.add('foo', func, key=('foo', 1))
+            assert batch.get_results() == {'foo': 1}
+        assert func.call_count == 2
+
+
+class ConcurrentLoaderBatchTest(TransactionTestCase):
+    def test_loaders_run_on_other_threads(self):
+        organization = self.create_organization()
+        used = []
+
+        def load():
+            used.append(connections[DEFAULT_DB_ALIAS])
+            return (threading.current_thread(),
+                    Organization.objects.get(id=organization.id).slug)
+
+        batch = LoaderBatch()
+        assert batch.concurrent
+        batch.add('foo', load)
+        thread, slug = batch.get_results()['foo']
+
+        assert thread is not threading.current_thread()
+        assert slug == organization.slug
+
+        # The connection of the worker thread is closed again
+        assert used[0] is not connections[DEFAULT_DB_ALIAS]
+        assert used[0].connection is None
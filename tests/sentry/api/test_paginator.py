@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
+import mock
 import pytest
+import six
 from datetime import timedelta
 from django.utils import timezone
 from unittest import TestCase as SimpleTestCase
@@ -8,10 +10,12 @@ from unittest import TestCase as SimpleTestCase
 from sentry.api.paginator import (
     Paginator,
     DateTimePaginator,
+    DateTimeKeysetPaginator,
+    KeysetPaginator,
     OffsetPaginator,
     SequencePaginator,
     reverse_bisect_left)
-from sentry.models import User
+from sentry.models import Group, User
 from sentry.testutils import TestCase
 from sentry.utils.cursors import Cursor
 from sentry.utils.db import is_mysql
@@ -74,6 +78,28 @@ class PaginatorTest(TestCase):
         result3 = paginator.get_result(limit=1, cursor=result2.prev)
         assert len(result3) == 0, (result3, list(result3))
 
+    def test_approximate_hits(self):
+        self.create_user('foo@example.com')
+        self.create_user('bar@example.com')
+
+        queryset = User.objects.all()
+        paginator = self.cls(queryset, 'id', approximate_hits=True)
+
+        with mock.patch.object(self.cls, '_estimate_hits', return_value=None):
+            assert paginator.count_hits(1000) == 2
+
+        # the count is cached
+        self.create_user('baz@example.com')
+        assert paginator.count_hits(1000) == 2
+
+        queryset = User.objects.filter(email__endswith='@example.com')
+        paginator = self.cls(queryset, 'id', approximate_hits=True)
+
+        with mock.patch.object(self.cls, '_estimate_hits', return_value=5000), \
+                mock.patch.object(self.cls, '_count_hits') as count_hits:
+            assert paginator.count_hits(1000) == 1000
+            assert not count_hits.called
+
 
 class OffsetPaginatorTest(TestCase):
     # offset paginator does not support dynamic limits on is_prev
@@ -249,6 +275,79 @@ class DateTimePaginatorTest(TestCase):
         assert len(result5) == 0, list(result5)
 
 
+class KeysetPaginatorTest(TestCase):
+    def test_descending_with_ties(self):
+        group1 = self.create_group(times_seen=10)
+        group2 = self.create_group(times_seen=5)
+        group3 = self.create_group(times_seen=5)
+        group4 = self.create_group(times_seen=5)
+        group5 = self.create_group(times_seen=1)
+
+        queryset = Group.objects.all()
+        paginator = KeysetPaginator(queryset, '-times_seen')
+
+        result1 = paginator.get_result(limit=2, cursor=None)
+        assert list(result1) == [group1, group4]
+        assert result1.next
+        assert not result1.prev
+
+        result2 = paginator.get_result(limit=2, cursor=result1.next)
+        assert list(result2) == [group3, group2]
+        assert result2.next
+        assert result2.prev
+
+        result3 = paginator.get_result(limit=2, cursor=result2.next)
+        assert list(result3) == [group5]
+        assert not result3.next
+        assert result3.prev
+
+        result4 = paginator.get_result(limit=2, cursor=result3.prev)
+        assert list(result4) == [group3, group2]
+        assert result4.next
+        assert result4.prev
+
+        result5 = paginator.get_result(limit=2, cursor=result4.prev)
+        assert list(result5) == [group1, group4]
+        assert result5.next
+        assert not result5.prev
+
+    def test_cursor_roundtrip(self):
+        for times_seen in (3, 2, 2, 1):
+            self.create_group(times_seen=times_seen)
+
+        paginator = KeysetPaginator(Group.objects.all(), '-times_seen')
+
+        result1 = paginator.get_result(limit=2, cursor=None)
+        cursor = Cursor.from_string(six.text_type(result1.next))
+        result2 = paginator.get_result(limit=2, cursor=cursor)
+        assert not set(result1) & set(result2)
+        assert len(result2) == 2
+
+
+class DateTimeKeysetPaginatorTest(TestCase):
+    @pytest.mark.skipif(is_mysql(), reason='MySQL does not support above second accuracy')
+    def test_microsecond_accuracy(self):
+        joined = timezone.now()
+
+        res1 = self.create_user('foo@example.com', date_joined=joined)
+        res2 = self.create_user('bar@example.com', date_joined=joined + timedelta(microseconds=1))
+        res3 = self.create_user('baz@example.com', date_joined=joined + timedelta(microseconds=1))
+        res4 = self.create_user('qux@example.com', date_joined=joined + timedelta(microseconds=2))
+
+        paginator = DateTimeKeysetPaginator(User.objects.all(), 'date_joined')
+
+        result1 = paginator.get_result(limit=2, cursor=None)
+        assert list(result1) == [res1, res2]
+
+        result2 = paginator.get_result(limit=2, cursor=result1.next)
+        assert list(result2) == [res3, res4]
+        assert not result2.next
+
+        result3 = paginator.get_result(limit=2, cursor=result2.prev)
+        assert list(result3) == [res1, res2]
+        assert not result3.prev
+
+
 def test_reverse_bisect_left():
     assert reverse_bisect_left([], 0) == 0
 
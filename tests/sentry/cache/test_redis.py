@@ -23,3 +23,16 @@ class RedisCacheTest(TestCase):
 
         with self.assertRaises(ValueTooLarge):
             self.backend.set('foo', 'x' * (RedisCache.max_size + 1), 0)
+
+    def test_compression(self):
+        value = {'foo': 'bar' * 1000}
+        self.backend.set('foo', value, 50)
+
+        stored = self.backend.client.get(self.backend.make_key('foo'))
+        assert stored.startswith(self.backend.codec.prefix)
+        assert len(stored) < 1000
+        assert self.backend.get('foo') == value
+
+        # values written before compression was added are still read
+        self.backend.client.set(self.backend.make_key('foo'), '{"foo": "bar"}')
+        assert self.backend.get('foo') == {'foo': 'bar'}
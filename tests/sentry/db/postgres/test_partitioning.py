@@ -0,0 +1,123 @@
+from __future__ import absolute_import
+
+import pytest
+
+from datetime import datetime, timedelta
+from django.db import connections
+from django.utils import timezone
+from unittest import TestCase
+
+from sentry.db.postgres.partitioning import (
+    PartitionManager, floor_period, get_default_partition_name, get_partition_name, parse_bound
+)
+from sentry.testutils import TestCase as SentryTestCase
+from sentry.utils.db import is_postgres
+
+
+class PartitioningTest(TestCase):
+    def test_floor_period(self):
+        value = datetime(2018, 10, 18, 13, 37, 1, tzinfo=timezone.utc)
+        assert floor_period(value, 'day') == datetime(2018, 10, 18, tzinfo=timezone.utc)
+        assert floor_period(value, 'week') == datetime(2018, 10, 15, tzinfo=timezone.utc)
+
+    def test_parse_bound(self):
+        assert parse_bound('MINVALUE') is None
+        assert parse_bound(" '2018-10-18 00:00:00+00'") == \
+            datetime(2018, 10, 18, tzinfo=timezone.utc)
+
+    def test_get_partition_name(self):
+        lower = datetime(2018, 10, 18, tzinfo=timezone.utc)
+        assert get_partition_name('sentry_message', lower) == 'sentry_message_p20181018'
+
+
+class PartitionManagerTest(SentryTestCase):
+    table = 'sentry_eventtag'
+
+    def setUp(self):
+        super(PartitionManagerTest, self).setUp()
+        if not is_postgres():
+            pytest.skip('partitioning requires postgres')
+        cursor = connections['default'].cursor()
+        cursor.execute('show server_version_num')
+        if int(cursor.fetchone()[0]) < 110000:
+            pytest.skip('partitioning requires PostgreSQL 11')
+        self.manager = PartitionManager()
+        self.today = floor_period(timezone.now(), 'day')
+
+    def insert(self, event_id, date_added):
+        cursor = connections['default'].cursor()
+        cursor.execute(
+            """
+            insert into sentry_eventtag
+                (project_id, group_id, event_id, key_id, value_id, date_added)
+            values (1, 1, %s, 1, 1, %s)
+        """, [event_id, date_added]
+        )
+
+    def count(self, table):
+        cursor = connections['default'].cursor()
+        cursor.execute('select count(*) from %s' % (table, ))
+        return cursor.fetchone()[0]
+
+    def test_enable(self):
+        self.insert(1, self.today - timedelta(days=10))
+        self.manager.enable(self.table, interval='day', ahead=1)
+
+        assert self.manager.get_partitioning(self.table) == ('date_added', 'day')
+        assert [p.name for p in self.manager.get_partitions(self.table)] == [
+            'sentry_eventtag_legacy',
+            get_partition_name(self.table, self.today + timedelta(days=1)),
+        ]
+        assert self.manager.has_default_partition(self.table)
+        assert self.count('sentry_eventtag_legacy') == 1
+
+        self.insert(2, self.today + timedelta(days=1, hours=1))
+        assert self.count(get_partition_name(self.table, self.today + timedelta(days=1))) == 1
+
+    def test_create_partitions_moves_rows_from_default(self):
+        self.manager.enable(self.table, interval='day', ahead=1)
+
+        future = self.today + timedelta(days=5)
+        self.insert(1, future)
+        assert self.count(get_default_partition_name(self.table)) == 1
+
+        created = self.manager.create_partitions(self.table, ahead=5)
+        assert created == [
+            get_partition_name(self.table, self.today + timedelta(days=n))
+            for n in range(2, 6)
+        ]
+        assert self.count(get_default_partition_name(self.table)) == 0
+        assert self.count(get_partition_name(self.table, future)) == 1
+
+    def test_drop_partitions(self):
+        self.insert(1, self.today - timedelta(days=10))
+        self.manager.enable(self.table, interval='day', ahead=1)
+
+        dropped = self.manager.drop_partitions(self.table, self.today + timedelta(days=1))
+        assert dropped == ['sentry_eventtag_legacy']
+        assert self.count(self.table) == 0
+
+        # Rows older than the oldest partition end up in the default
+        # partition and are deleted from there.
+        self.insert(2, self.today - timedelta(days=5))
+        assert self.count(get_default_partition_name(self.table)) == 1
+
+        assert self.manager.drop_partitions(self.table, self.today - timedelta(days=1)) == []
+        assert self.count(get_default_partition_name(self.table)) == 0
+
+    def test_create_partitions_after_migration(self):
+        self.manager.enable(self.table, interval='day', ahead=1)
+
+        # Migrations only alter the partitioned table and its partitions
+        cursor = connections['default'].cursor()
+        cursor.execute('alter table sentry_eventtag add column extra integer not null default 0')
+        cursor.execute('alter table sentry_eventtag alter column group_id set not null')
+
+        created = self.manager.create_partitions(self.table, ahead=2)
+        assert created == [get_partition_name(self.table, self.today + timedelta(days=2))]
+
+        columns = self.manager.get_columns(self.table)
+        assert columns['extra'] == ('integer', True)
+        assert columns['group_id'] == ('bigint', True)
+        assert self.manager.get_columns('sentry_eventtag_template') == columns
+        assert self.manager.get_columns(created[0]) == columns
@@ -2,10 +2,13 @@ from __future__ import absolute_import
 
 from datetime import timedelta
 from django.utils import timezone
+from mock import patch
 
-from sentry.db.deletion import BulkDeleteQuery
+from sentry.db.deletion import BulkDeleteQuery, WindowProgress
 from sentry.models import Group, Project
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
+from sentry.utils.cache import cache
 
 
 class BulkDeleteQueryTest(TestCase):
@@ -41,3 +44,105 @@ class BulkDeleteQueryTest(TestCase):
         assert not Group.objects.filter(id=group1_1.id).exists()
         assert not Group.objects.filter(id=group1_2.id).exists()
         assert Group.objects.filter(id=group1_3.id).exists()
+
+    def test_unpartitioned_table(self):
+        query = BulkDeleteQuery(
+            model=Group,
+            dtfield='last_seen',
+            days=1,
+        )
+        assert not query.execute_partitioned()
+
+    def test_windows(self):
+        project = self.create_project()
+        old = timezone.now() - timedelta(days=2)
+        expired = [self.create_group(project, last_seen=old) for _ in range(5)]
+        kept = self.create_group(project)
+
+        BulkDeleteQuery(
+            model=Group,
+            dtfield='last_seen',
+            days=1,
+        ).execute(chunk_size=2)
+
+        assert not Group.objects.filter(id__in=[g.id for g in expired]).exists()
+        assert Group.objects.filter(id=kept.id).exists()
+
+    def test_windows_only_cover_matching_rows(self):
+        project = self.create_project()
+        old = timezone.now() - timedelta(days=2)
+        self.create_group(project)
+        expired = [self.create_group(project, last_seen=old) for _ in range(2)]
+        self.create_group(project)
+
+        query = BulkDeleteQuery(
+            model=Group,
+            dtfield='last_seen',
+            days=1,
+        )
+        with patch.object(query, '_delete_window', return_value=0) as delete_window:
+            query.execute(chunk_size=100)
+
+        assert delete_window.call_count == 1
+        assert delete_window.call_args[0][0] == (expired[0].id, expired[0].id + 100)
+
+    @patch('sentry.db.deletion.time.sleep')
+    @patch('sentry.db.deletion.db.is_postgres', return_value=True)
+    def test_replication_lag_unsupported(self, is_postgres, sleep):
+        query = BulkDeleteQuery(model=Group)
+        progress = WindowProgress(0, 0, 1)
+
+        # Servers that do not report the lag skip the check with a warning
+        with override_options({'cleanup.max-replication-lag': 5}), \
+                patch.object(query, '_get_replication_lag', return_value=None), \
+                patch('sentry.db.deletion.logger') as logger:
+            query._throttle(progress)
+            query._throttle(progress)
+
+        assert not sleep.called
+        assert logger.warning.call_count == 1
+
+    @patch('sentry.db.deletion.time.sleep')
+    @patch('sentry.db.deletion.db.is_postgres', return_value=True)
+    def test_replication_lag(self, is_postgres, sleep):
+        query = BulkDeleteQuery(model=Group)
+        progress = WindowProgress(0, 0, 1)
+
+        with override_options({'cleanup.max-replication-lag': 5}), \
+                patch.object(query, '_get_replication_lag', side_effect=[10, 6, 1]):
+            query._throttle(progress)
+
+        assert sleep.call_count == 2
+
+    def test_resume_from_checkpoint(self):
+        project = self.create_project()
+        old = timezone.now() - timedelta(days=2)
+        group1 = self.create_group(project, last_seen=old)
+        group2 = self.create_group(project, last_seen=old)
+
+        query = BulkDeleteQuery(
+            model=Group,
+            dtfield='last_seen',
+            days=1,
+        )
+        cache.set(query._get_checkpoint_key(), group2.id, 60)
+        query.execute(chunk_size=1)
+
+        assert Group.objects.filter(id=group1.id).exists()
+        assert not Group.objects.filter(id=group2.id).exists()
+        assert cache.get(query._get_checkpoint_key()) is None
+
+
+def test_window_progress():
+    progress = WindowProgress(1, 10, 4)
+    first = progress.claim()
+    second = progress.claim()
+    assert first == (1, 5)
+    assert second == (5, 9)
+
+    assert progress.complete(second, 3) == 1
+    assert progress.complete(first, 2) == 9
+    assert progress.rows == 5
+
+    assert progress.claim() == (9, 13)
+    assert progress.claim() is None
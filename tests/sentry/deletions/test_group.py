@@ -1,8 +1,10 @@
 from __future__ import absolute_import
 
+import mock
+
 from uuid import uuid4
 
-from sentry import tagstore
+from sentry import deletions, tagstore, tsdb
 from sentry.tagstore.models import EventTag
 from sentry.models import (
     Event, EventMapping, Group, GroupAssignee, GroupHash, GroupMeta, GroupRedirect,
@@ -81,3 +83,27 @@ class DeleteGroupTest(TestCase):
         assert not GroupRedirect.objects.filter(group_id=group.id).exists()
         assert not GroupHash.objects.filter(group_id=group.id).exists()
         assert not Group.objects.filter(id=group.id).exists()
+
+    def test_bulk(self):
+        project = self.create_project()
+        group1 = self.create_group(project=project)
+        group2 = self.create_group(project=project)
+        other_group = self.create_group(project=project)
+        event1 = self.create_event(group=group1)
+        event2 = self.create_event(group=group2, event_id='b' * 32)
+        GroupHash.objects.create(project=project, group=group1, hash=uuid4().hex)
+        GroupHash.objects.create(project=project, group=group2, hash=uuid4().hex)
+
+        task = deletions.get(
+            model=Group,
+            query={'id__in': [group1.id, group2.id]},
+        )
+        with mock.patch.object(tsdb, 'delete') as tsdb_delete:
+            while task.chunk():
+                pass
+
+        assert sorted(tsdb_delete.call_args[0][1]) == sorted([group1.id, group2.id])
+        assert not Event.objects.filter(id__in=[event1.id, event2.id]).exists()
+        assert not GroupHash.objects.filter(group_id__in=[group1.id, group2.id]).exists()
+        assert not Group.objects.filter(id__in=[group1.id, group2.id]).exists()
+        assert Group.objects.filter(id=other_group.id).exists()
@@ -42,6 +42,32 @@ class RedisBackendTestCase(TestCase):
         # longer exist at this point.
         assert set(backend.schedule(time.time())) == set()
 
+    def test_digest_many(self):
+        backend = RedisBackend()
+
+        records = {}
+        for key in ('timeline:1', 'timeline:2'):
+            records[key] = Record('record:{}'.format(key), 'value', time.time())
+            backend.add(key, records[key])
+
+        # This timeline has been digested already and is in the waiting state,
+        # so it should be omitted from the results.
+        backend.add('timeline:3', Record('record:3', 'value', time.time()))
+        with backend.digest('timeline:3', 0):
+            pass
+
+        with backend.digest_many(['timeline:1', 'timeline:2', 'timeline:3'], {
+            'timeline:1': 0,
+            'timeline:2': 0,
+        }) as timelines:
+            assert timelines == {key: [record] for key, record in records.items()}
+
+        # The timelines should have been closed and rescheduled.
+        assert set(entry.key for entry in backend.schedule(time.time())) == set(records)
+
+        with backend.digest_many(list(records)) as timelines:
+            assert timelines == {key: [] for key in records}
+
     def test_truncation(self):
         backend = RedisBackend(capacity=2, truncation_chance=1.0)
 
@@ -0,0 +1,25 @@
+from __future__ import absolute_import
+
+from unittest import TestCase
+
+from sentry.digests.codecs import CompressedPickleCodec, NotificationReferenceCodec
+from sentry.digests.notifications import NotificationReference
+
+
+class NotificationReferenceCodecTestCase(TestCase):
+    codec = NotificationReferenceCodec()
+
+    def test_reference(self):
+        value = NotificationReference(1, 2, [3, 4])
+        encoded = self.codec.encode(value)
+        assert encoded == b'r1:[1,2,[3,4]]'
+        assert self.codec.decode(encoded) == value
+
+    def test_other_values(self):
+        value = {'key': 'value'}
+        assert self.codec.decode(self.codec.encode(value)) == value
+
+    def test_compressed_pickle_compatibility(self):
+        value = NotificationReference(1, 2, [3, 4])
+        assert self.codec.decode(CompressedPickleCodec().encode(value)) == value
+        assert self.codec.decode(CompressedPickleCodec().encode('value')) == 'value'
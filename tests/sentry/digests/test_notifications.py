@@ -4,13 +4,22 @@ from collections import (
     OrderedDict,
     defaultdict,
 )
+from datetime import timedelta
+
+from django.utils import timezone
 from exam import fixture
+from mock import patch
 from six.moves import reduce
 
+from sentry.app import tsdb
 from sentry.digests import Record
 from sentry.digests.notifications import (
     Notification,
+    NotificationReference,
+    build_digests,
     event_to_record,
+    fetch_states,
+    load_records,
     rewrite_record,
     group_records,
     sort_group_contents,
@@ -18,6 +27,109 @@ from sentry.digests.notifications import (
 )
 from sentry.models import Rule
 from sentry.testutils import TestCase
+from sentry.utils.dates import to_timestamp
+
+
+class LoadRecordsTestCase(TestCase):
+    @fixture
+    def rule(self):
+        return self.event.project.rule_set.all()[0]
+
+    def test_event_to_record(self):
+        assert event_to_record(self.event, (self.rule, )) == Record(
+            self.event.event_id,
+            NotificationReference(self.event.id, self.event.group_id, [self.rule.id]),
+            to_timestamp(self.event.datetime),
+        )
+
+    def test_success(self):
+        records = load_records([event_to_record(self.event, (self.rule, ))])
+        assert len(records) == 1
+
+        notification = records[0].value
+        assert notification.event == self.event
+        assert notification.event.data == self.event.data
+        assert notification.rules == [self.rule.id]
+
+    def test_missing_event(self):
+        record = event_to_record(self.event, (self.rule, ))
+        record = Record(
+            record.key,
+            record.value._replace(event_pk=self.event.id + 1),
+            record.timestamp,
+        )
+        assert load_records([record]) == []
+
+    def test_legacy_record(self):
+        # Records that were stored with the complete event are passed through.
+        record = Record(
+            self.event.event_id,
+            Notification(self.event, [self.rule.id]),
+            to_timestamp(self.event.datetime),
+        )
+        assert load_records([record]) == [record]
+
+
+class BuildDigestsTestCase(TestCase):
+    def test_fetch_states(self):
+        projects = [self.create_project(), self.create_project()]
+        events = [
+            self.create_event(group=self.create_group(project=project)) for project in projects
+        ]
+        rules = [project.rule_set.all()[0] for project in projects]
+        items = [
+            (project, load_records([event_to_record(event, (rule, ))]))
+            for project, event, rule in zip(projects, events, rules)
+        ]
+
+        states = fetch_states(items)
+        assert len(states) == 2
+        for project, event, rule, state in zip(projects, events, rules, states):
+            assert state['project'] == project
+            assert state['groups'] == {event.group_id: event.group}
+            assert state['rules'] == {rule.id: rule}
+            assert set(state['event_counts']) == set([event.group_id])
+            assert set(state['user_counts']) == set([event.group_id])
+
+    def test_fetch_states_time_ranges(self):
+        now = timezone.now().replace(microsecond=0)
+        projects = [self.create_project(), self.create_project(), self.create_project()]
+        items = []
+        for project, delta in zip(projects, (1, 2, 1)):
+            events = [
+                self.create_event(group=self.create_group(project=project),
+                                  datetime=now - timedelta(hours=delta)),
+                self.create_event(group=self.create_group(project=project), datetime=now),
+            ]
+            rule = project.rule_set.all()[0]
+            items.append((project, load_records(
+                [event_to_record(event, (rule, )) for event in reversed(events)])))
+
+        with patch.object(tsdb, 'get_sums', wraps=tsdb.get_sums) as get_sums:
+            states = fetch_states(items)
+
+        # The pairs with the same time range share a read
+        assert sorted((c[0][2], c[0][3]) for c in get_sums.call_args_list) == [
+            (now - timedelta(hours=2), now),
+            (now - timedelta(hours=1), now),
+        ]
+        for (project, records), state in zip(items, states):
+            assert set(state['event_counts']) == \
+                set(record.value.event.group_id for record in records)
+
+    def test_build_digests(self):
+        project = self.create_project()
+        event = self.create_event(group=self.create_group(project=project))
+        rule = project.rule_set.all()[0]
+
+        digests = build_digests([
+            (project, [event_to_record(event, (rule, ))]),
+            (self.create_project(), []),
+        ])
+        assert len(digests) == 2
+        assert list(digests[0].keys()) == [rule]
+        assert list(digests[0][rule].keys()) == [event.group]
+        assert digests[1] is None
 
 
 class RewriteRecordTestCase(TestCase):
@@ -27,7 +139,7 @@ class RewriteRecordTestCase(TestCase):
 
     @fixture
     def record(self):
-        return event_to_record(self.event, (self.rule, ))
+        return load_records([event_to_record(self.event, (self.rule, ))])[0]
 
     def test_success(self):
         assert rewrite_record(
@@ -22,7 +22,7 @@ def sort_records(records):
     Sorts records for fetch_state method
     fetch_state is expecting these records to be ordered from newest to oldest
     """
-    return sorted(records, key=lambda r: r.value.event.datetime, reverse=True)
+    return sorted(records, key=lambda r: r.timestamp, reverse=True)
 
 
 class UtilitiesHelpersTestCase(TestCase):
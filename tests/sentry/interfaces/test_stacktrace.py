@@ -9,7 +9,9 @@ from django.template.loader import render_to_string
 from exam import fixture
 
 from sentry.interfaces.base import InterfaceValidationError
-from sentry.interfaces.stacktrace import (Frame, Stacktrace, get_context, is_url, slim_frame_data)
+from sentry.interfaces.stacktrace import (
+    Frame, Stacktrace, get_context, get_frame_hash, is_url, slim_frame_data
+)
 from sentry.models import Event
 from sentry.testutils import TestCase
 
@@ -215,6 +217,29 @@ class StacktraceTest(TestCase):
         result = interface.get_hash()
         self.assertEquals(result, ['foo.py', 1])
 
+    def test_get_hash_is_cached(self):
+        get_frame_hash.cache_clear()
+        data = {
+            'module': 'foo.bar',
+            'function': 'baz',
+            'filename': 'foo/bar.py',
+            'lineno': 1,
+        }
+
+        result = Frame.to_python(data).get_hash('python')
+        assert result == ['foo.bar', 'baz']
+        assert get_frame_hash.cache_info().misses == 1
+
+        # Mutating the result must not affect the cached value.
+        result.append('qux')
+
+        assert Frame.to_python(data).get_hash('python') == ['foo.bar', 'baz']
+        assert get_frame_hash.cache_info().hits == 1
+
+        # The platform is part of the cache key.
+        assert Frame.to_python(data).get_hash('java') == ['foo.bar', 'baz']
+        assert get_frame_hash.cache_info().misses == 2
+
     def test_get_hash_sanitizes_block_functions(self):
         # This is Ruby specific
         interface = Frame.to_python(
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+import base64
 import pytest
 import re
 import responses
@@ -17,6 +18,9 @@ from sentry.lang.javascript.processor import (
     generate_module,
     trim_line,
     fetch_release_file,
+    prefetch_release_files,
+    get_scrape_options,
+    get_parsed_source_key,
     UnparseableSourcemap,
     get_max_age,
     CACHE_CONTROL_MAX,
@@ -25,6 +29,7 @@ from sentry.lang.javascript.processor import (
 from sentry.lang.javascript.errormapping import (rewrite_exception, REACT_MAPPING_URL)
 from sentry.models import File, Release, ReleaseFile, EventError
 from sentry.testutils import TestCase
+from sentry.utils.cache import cache
 from sentry.utils.strings import truncatechars
 
 base64_sourcemap = 'data:application/json;base64,eyJ2ZXJzaW9uIjozLCJmaWxlIjoiZ2VuZXJhdGVkLmpzIiwic291cmNlcyI6WyIvdGVzdC5qcyJdLCJuYW1lcyI6W10sIm1hcHBpbmdzIjoiO0FBQUEiLCJzb3VyY2VzQ29udGVudCI6WyJjb25zb2xlLmxvZyhcImhlbGxvLCBXb3JsZCFcIikiXX0='
@@ -76,6 +81,13 @@ class FetchReleaseFileTest(TestCase):
 
         assert result == new_result
 
+        # The checksum of the file is known either way
+        assert result.checksum == new_result.checksum == file.checksum
+        with patch('sentry.lang.javascript.processor.sha1') as sha1:
+            assert get_parsed_source_key('source', 'file.min.js', new_result.body, release,
+                                         checksum=new_result.checksum)[-1] == file.checksum
+        assert not sha1.called
+
     def test_distribution(self):
         project = self.project
         release = Release.objects.create(
@@ -168,6 +180,55 @@ class FetchReleaseFileTest(TestCase):
         )
 
 
+class PrefetchReleaseFilesTest(TestCase):
+    def test_simple(self):
+        project = self.project
+        release = Release.objects.create(
+            organization_id=project.organization_id,
+            version='abc',
+        )
+        release.add_project(project)
+
+        for name in ('file1.min.js', 'file2.min.js'):
+            file = File.objects.create(
+                name=name,
+                type='release.file',
+                headers={'Content-Type': 'application/javascript'},
+            )
+            file.putfile(six.BytesIO(name.encode('utf-8')))
+            ReleaseFile.objects.create(
+                name='~/%s' % name,
+                release=release,
+                organization_id=project.organization_id,
+                file=file,
+            )
+
+        filenames = ['http://example.com/file1.min.js', 'http://example.com/file2.min.js',
+                     'http://example.com/file3.min.js']
+        with self.assertNumQueries(2):
+            prefetched = prefetch_release_files(filenames, release)
+
+        assert sorted(prefetched) == filenames
+
+        # The files can be read without hitting the database or the cache
+        with self.assertNumQueries(0), \
+                patch('sentry.lang.javascript.processor.cache.get') as cache_get:
+            for filename in filenames[:2]:
+                result = prefetched[filename]()
+                assert result.body == filename.rsplit('/', 1)[1].encode('utf-8')
+            assert prefetched[filenames[2]]() is None
+        assert not cache_get.called
+
+        # Later lookups are served from the cache
+        with self.assertNumQueries(0):
+            prefetched = prefetch_release_files(filenames, release)
+            for filename in filenames[:2]:
+                result = prefetched[filename]()
+                assert result.body == filename.rsplit('/', 1)[1].encode('utf-8')
+            assert prefetched[filenames[2]]() is None
+            assert fetch_release_file(filenames[0], release).body == b'file1.min.js'
+
+
 class FetchFileTest(TestCase):
     @responses.activate
     def test_simple(self):
@@ -222,6 +283,26 @@ class FetchFileTest(TestCase):
             assert len(responses.calls) == i + 1
             assert responses.calls[i].request.headers[expected_request_header_name] == 'foobar'
 
+    @responses.activate
+    def test_with_scrape_options(self):
+        responses.add(
+            responses.GET, 'http://example.com', body='foo bar', content_type='application/json'
+        )
+
+        self.project.update_option('sentry:token', 'foobar')
+        self.project.update_option('sentry:origins', ['*'])
+        scrape_options = get_scrape_options('http://example.com', self.project)
+        assert scrape_options == ({'X-Sentry-Token': 'foobar'}, False)
+
+        with self.assertNumQueries(0), \
+                patch('sentry.lang.javascript.processor.is_valid_origin') as is_valid_origin:
+            result = fetch_file('http://example.com', project=self.project,
+                                prefetched=lambda: None, scrape_options=scrape_options)
+        assert not is_valid_origin.called
+
+        assert result.body == 'foo bar'
+        assert responses.calls[0].request.headers['X-Sentry-Token'] == 'foobar'
+
     @responses.activate
     def test_connection_failure(self):
         responses.add(responses.GET, 'http://example.com', body=RequestException())
@@ -490,6 +571,30 @@ class FetchSourcemapTest(TestCase):
         with pytest.raises(UnparseableSourcemap):
             fetch_sourcemap('http://example.com')
 
+    @responses.activate
+    def test_parsed_sourcemaps_are_shared(self):
+        body = base64.b64decode(base64_sourcemap[len('data:application/json;base64,'):])
+        responses.add(
+            responses.GET, 'http://example.com/test.map', body=body,
+            content_type='application/json'
+        )
+
+        smap_view = fetch_sourcemap('http://example.com/test.map')
+        with patch('sentry.lang.javascript.processor.SourceMapView.from_json_bytes') as parse:
+            assert fetch_sourcemap('http://example.com/test.map') is smap_view
+        assert not parse.called
+
+        # A different version of the file is parsed again
+        responses.reset()
+        responses.add(
+            responses.GET, 'http://example.com/test.map', body=body.replace(b'hello', b'world'),
+            content_type='application/json'
+        )
+        cache.clear()
+        other_view = fetch_sourcemap('http://example.com/test.map')
+        assert other_view is not smap_view
+        assert other_view.get_sourceview(0).get_source() == u'console.log("world, World!")'
+
 
 class TrimLineTest(TestCase):
     long_line = 'The public is more familiar with bad design than good design. It is, in effect, conditioned to prefer bad design, because that is what it lives with. The new becomes threatening, the old reassuring.'
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import os
+import pytest
 import time
 import zipfile
 from six import BytesIO, text_type
@@ -8,8 +9,16 @@ from six import BytesIO, text_type
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
 
+from mock import patch, sentinel
+
 from sentry.testutils import APITestCase, TestCase
 from sentry.models import File, ProjectDSymFile, ProjectSymCacheFile
+from sentry.models.dsymfile import (
+    SymCacheConversionPending, create_dsym_from_id, pending_symcaches_as_errors,
+    _get_symcache_scheduled_cache_key
+)
+from sentry.tasks.symcache_update import symcache_update
+from sentry.utils.cache import cache
 
 # This is obviously a freely generated UUID and not the checksum UUID.
 # This is permissible if users want to send different UUIDs
@@ -153,3 +162,124 @@ class SymCacheTest(TestCase):
 
         assert symcache.id == debug_id
         assert symcache.is_latest_file_format
+
+    def create_debug_file(self, debug_id):
+        file = File.objects.create(
+            name='crash.dSYM',
+            type='default',
+            headers={'Content-Type': 'application/x-mach-binary'},
+        )
+
+        path = os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym')
+        with open(path) as f:
+            file.putfile(f)
+
+        return ProjectDSymFile.objects.create(
+            file=file,
+            object_name='crash.dSYM',
+            cpu_name='x86',
+            project=self.project,
+            debug_id=debug_id,
+        )
+
+    def test_wait_for_symcache(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        self.create_debug_file(debug_id)
+
+        # The conversion is handed off to the symcache_update task instead
+        # of being performed inline.
+        with self.tasks(), patch('sentry.tasks.symcache_update.symcache_update.delay',
+                                 wraps=symcache_update.delay) as delay:
+            symcaches = ProjectDSymFile.dsymcache.get_symcaches(
+                self.project, [debug_id], wait=5)
+
+        delay.assert_called_once_with(project_id=self.project.id, debug_ids=[debug_id])
+        assert symcaches[debug_id].id == debug_id
+        assert symcaches[debug_id].is_latest_file_format
+
+    def test_wait_for_symcache_pending(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        self.create_debug_file(debug_id)
+
+        # A conversion that is still running elsewhere is not repeated, and
+        # the caller gives up once the wait is exceeded.
+        with patch('sentry.tasks.symcache_update.symcache_update.delay'):
+            with pytest.raises(SymCacheConversionPending) as excinfo:
+                ProjectDSymFile.dsymcache.get_symcaches(self.project, [debug_id], wait=0)
+
+        assert excinfo.value.debug_ids == [debug_id]
+        assert not ProjectSymCacheFile.objects.filter(project=self.project).exists()
+
+    @patch('sentry.models.dsymfile.time.sleep')
+    def test_pending_symcaches_as_errors(self, sleep):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        self.create_debug_file(debug_id)
+
+        # Events that waited too long are processed without the symcache
+        with patch('sentry.tasks.symcache_update.symcache_update.delay'), \
+                pending_symcaches_as_errors():
+            symcaches, conversion_errors = ProjectDSymFile.dsymcache.get_symcaches(
+                self.project, [debug_id], with_conversion_errors=True, wait=5)
+
+        assert symcaches == {}
+        assert list(conversion_errors) == [debug_id]
+        assert not sleep.called
+
+    def test_update_symcaches_keeps_conversions_in_flight(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        debug_file = self.create_debug_file(debug_id)
+        marker = _get_symcache_scheduled_cache_key(self.project.id, debug_id)
+        cache.set(marker, True)
+
+        # The file is converted elsewhere, so waiting events have to keep
+        # waiting for its symcache.
+        lock = ProjectDSymFile.dsymcache._get_conversion_lock(debug_file)
+        with lock.acquire():
+            ProjectDSymFile.dsymcache.update_symcaches(self.project, [debug_id])
+
+        assert cache.get(marker) is not None
+        assert not ProjectSymCacheFile.objects.filter(project=self.project).exists()
+
+        ProjectDSymFile.dsymcache.update_symcaches(self.project, [debug_id])
+
+        assert cache.get(marker) is None
+        assert ProjectSymCacheFile.objects.filter(project=self.project).exists()
+
+    @patch('sentry.models.dsymfile.time.sleep')
+    def test_generate_symcache_waits_for_conversion_in_flight(self, sleep):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        debug_file = self.create_debug_file(debug_id)
+        dsymcache = ProjectDSymFile.dsymcache
+
+        lock = dsymcache._get_conversion_lock(debug_file)
+        with lock.acquire(), \
+                patch.object(dsymcache, '_fetch_current_cachefiles',
+                             side_effect=[[], [(debug_id, sentinel.cache_file)]]), \
+                patch.object(dsymcache, '_update_cachefile') as update_cachefile:
+            assert dsymcache.generate_symcache(self.project, debug_file) == \
+                (sentinel.cache_file, None)
+
+        assert sleep.call_count == 1
+        assert not update_cachefile.called
+
+    def test_symcache_lookups_are_cached(self):
+        debug_id = '67e9247c-814e-392b-a027-dbde6748fcbf'
+        path = os.path.join(os.path.dirname(__file__), 'fixtures', 'crash.dsym')
+
+        # The lookup of a missing debug file is cached, but invalidated once
+        # the debug file is uploaded.
+        assert ProjectDSymFile.dsymcache.get_symcaches(self.project, [debug_id]) == {}
+
+        with open(path) as f:
+            create_dsym_from_id(self.project, 'macho', 'x86', debug_id, 'crash.dSYM', fileobj=f)
+
+        symcaches = ProjectDSymFile.dsymcache.get_symcaches(self.project, [debug_id])
+        assert symcaches[debug_id].id == debug_id
+
+        # Subsequent lookups are served from the cache, and return the symcache
+        # that is already open.
+        with patch.object(ProjectDSymFile.objects, 'filter') as filter:
+            cached = ProjectDSymFile.dsymcache.get_symcaches(self.project, [debug_id])
+
+        assert not filter.called
+        assert cached[debug_id] is symcaches[debug_id]
@@ -1,10 +1,11 @@
 from __future__ import absolute_import
 
 import os
+from hashlib import sha1
 
 from django.core.files.base import ContentFile
 
-from sentry.models import File, FileBlob
+from sentry.models import AssembleChecksumMismatch, File, FileBlob, FileBlobIndex
 from sentry.testutils import TestCase
 
 
@@ -64,6 +65,51 @@ class FileTest(TestCase):
         with self.assertRaises(ValueError):
             fp.read()
 
+    def test_putfile_reuses_blobs(self):
+        existing = FileBlob.from_file(ContentFile(b'bar'))
+
+        file = File.objects.create(
+            name='baz.js',
+            type='default',
+        )
+        results = file.putfile(ContentFile(b'foobarfoofoobar'), 3)
+
+        assert [x.offset for x in results] == [0, 3, 6, 9, 12]
+        assert results[1].blob.id == existing.id
+        assert results[0].blob.id == results[2].blob.id == results[3].blob.id
+        assert FileBlob.objects.count() == 2
+        assert FileBlobIndex.objects.filter(file=file).count() == 5
+        assert file.size == 15
+
+        with file.getfile() as fp:
+            assert fp.read() == b'foobarfoofoobar'
+
+    def test_assemble_from_file_blob_ids(self):
+        blob1 = FileBlob.from_file(ContentFile(b'foo'))
+        blob2 = FileBlob.from_file(ContentFile(b'bar'))
+        blob_ids = [blob2.id, blob1.id, blob2.id]
+        checksum = sha1(b'barfoobar').hexdigest()
+
+        file = File.objects.create(name='test.bin', type='default')
+        with file.assemble_from_file_blob_ids(blob_ids, checksum) as tf:
+            assert tf.read() == b'barfoobar'
+        assert file.size == 9
+        assert file.checksum == checksum
+
+        with file.getfile() as fp:
+            assert fp.read() == b'barfoobar'
+
+        # Only the checksum is computed if the contents are not needed.
+        file = File.objects.create(name='test.bin', type='default')
+        assert file.assemble_from_file_blob_ids(blob_ids, checksum, materialize=False) is None
+        assert file.checksum == checksum
+        assert FileBlobIndex.objects.filter(file=file).count() == 3
+
+        file = File.objects.create(name='test.bin', type='default')
+        with self.assertRaises(AssembleChecksumMismatch):
+            file.assemble_from_file_blob_ids(blob_ids, sha1(b'foo').hexdigest())
+        assert not FileBlobIndex.objects.filter(file=file).exists()
+
     def test_multi_chunk_prefetch(self):
         random_data = os.urandom(1 << 25)
 
@@ -10,6 +10,7 @@ from exam import fixture, patcher
 
 from sentry.quotas.redis import (
     is_rate_limited,
+    lease_quota,
     BasicRedisQuota,
     RedisQuota,
 )
@@ -68,6 +69,40 @@ def test_is_rate_limited_script():
     ))) == [False, ]
 
 
+def test_lease_script():
+    now = int(time.time())
+
+    cluster = clusters.get('default')
+    client = cluster.get_local_client(six.next(iter(cluster.hosts)))
+
+    # The lease is limited by the share of the smallest remaining quota.
+    assert lease_quota(
+        client, ('lfoo', 'r:lfoo', 'lbar', 'r:lbar'), (100, now + 60, 20, now + 60, 5, 0.1)
+    ) == [2, None, None]
+
+    assert client.get('lfoo') == '2'
+    assert client.get('lbar') == '2'
+
+    # At least one item is leased while anything is left.
+    assert lease_quota(
+        client, ('lfoo', 'r:lfoo', 'lbar', 'r:lbar'), (100, now + 60, 3, now + 60, 5, 0.1)
+    ) == [1, None, None]
+
+    # Nothing is leased once a quota is exhausted.
+    assert lease_quota(
+        client, ('lfoo', 'r:lfoo', 'lbar', 'r:lbar'), (100, now + 60, 3, now + 60, 5, 0.1)
+    ) == [0, None, 1]
+
+    assert client.get('lfoo') == '3'
+    assert client.get('lbar') == '3'
+
+    # Refunded items can be leased again.
+    client.set('r:lbar', 1)
+    assert lease_quota(
+        client, ('lfoo', 'r:lfoo', 'lbar', 'r:lbar'), (100, now + 60, 3, now + 60, 5, 0.1)
+    ) == [1, None, None]
+
+
 class RedisQuotaTest(TestCase):
     quota = fixture(RedisQuota)
 
@@ -251,3 +286,54 @@ class RedisQuotaTest(TestCase):
             timestamp=timestamp,
             # the - 1 is because we refunded once
         ) == [n - 1 for _ in quotas] + [None, 0]
+
+    def get_window_start(self):
+        return self.quota.get_next_period_start(
+            60, self.project.organization_id % 60, time.time())
+
+    def test_is_rate_limited_with_lease(self):
+        quota = RedisQuota(lease=True)
+        timestamp = self.get_window_start()
+
+        self.get_project_quota.return_value = (200, 60)
+        self.get_organization_quota.return_value = (300, 60)
+
+        with mock.patch('sentry.quotas.redis.lease_quota', wraps=lease_quota) as mock_lease:
+            # The first lease is a single item, the next one follows the
+            # rate at which it was used up.
+            assert not quota.is_rate_limited(self.project, timestamp=timestamp).is_limited
+            assert not quota.is_rate_limited(self.project, timestamp=timestamp + 0.01).is_limited
+            assert mock_lease.call_count == 2
+
+            quotas = quota.get_quotas(self.project)
+            assert quota.get_usage(
+                self.project.organization_id, quotas, timestamp=timestamp) == [20, 20]
+
+            for _ in xrange(18):
+                assert not quota.is_rate_limited(
+                    self.project, timestamp=timestamp + 0.02).is_limited
+            assert mock_lease.call_count == 2
+
+        # Unused items are returned once the lease has expired.
+        quota.is_rate_limited(self.project, timestamp=timestamp + 0.03)
+        quota.sweep_leases(timestamp + quota.lease_duration + 1)
+        assert quota.get_usage(
+            self.project.organization_id, quotas, timestamp=timestamp) == [21, 21]
+
+    def test_is_rate_limited_with_lease_caches_rejections(self):
+        quota = RedisQuota(lease=True)
+        timestamp = self.get_window_start()
+
+        self.get_project_quota.return_value = (1, 60)
+        self.get_organization_quota.return_value = (300, 60)
+
+        assert not quota.is_rate_limited(self.project, timestamp=timestamp).is_limited
+
+        with mock.patch('sentry.quotas.redis.lease_quota', wraps=lease_quota) as mock_lease:
+            result = quota.is_rate_limited(self.project, timestamp=timestamp + 1)
+            assert result.is_limited
+            assert result.reason_code == 'project_quota'
+            assert result.retry_after == 59
+
+            assert quota.is_rate_limited(self.project, timestamp=timestamp + 2).is_limited
+            assert mock_lease.call_count == 1
@@ -5,6 +5,7 @@ from __future__ import absolute_import
 import pytest
 
 from django.conf import settings
+from mock import patch
 
 from sentry.models import Event, Group
 from sentry.tagstore.models import GroupTagKey, GroupTagValue, TagValue
@@ -42,6 +43,23 @@ class SentryCleanupTest(CliTestCase):
         for model in ALL_MODELS:
             assert model.objects.count() == 0
 
+    @pytest.mark.skipif(
+        settings.SENTRY_TAGSTORE == 'sentry.tagstore.v2.V2TagStorage',
+        reason='Cleanup is temporarily disabled for tagstore v2'
+    )
+    @patch('sentry.tsdb.delete_frequencies')
+    @patch('sentry.tsdb.delete_distinct_counts')
+    @patch('sentry.tsdb.delete')
+    def test_skips_tsdb(self, delete, delete_distinct_counts, delete_frequencies):
+        # The TSDB data of expired groups is removed by its TTL
+        rv = self.invoke('--days=1')
+        assert rv.exit_code == 0, rv.output
+
+        assert Group.objects.count() == 0
+        assert not delete.called
+        assert not delete_distinct_counts.called
+        assert not delete_frequencies.called
+
     @pytest.mark.skipif(
         settings.SENTRY_TAGSTORE == 'sentry.tagstore.v2.V2TagStorage',
         reason='Cleanup is temporarily disabled for tagstore v2'
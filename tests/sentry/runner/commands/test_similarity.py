@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import six
+from django.utils import timezone
+from mock import patch
+
+from sentry.runner.commands.similarity import load_checkpoints, rebuild
+from sentry.testutils import CliTestCase
+
+
+class SimilarityRebuildTest(CliTestCase):
+    command = rebuild
+
+    def setUp(self):
+        super(SimilarityRebuildTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        now = timezone.now()
+        self.groups = [self.create_group(last_seen=now) for _ in range(3)]
+        self.events = [
+            self.create_event(group=group, datetime=now)
+            for group in self.groups for _ in range(2)
+        ]
+
+    @patch('sentry.similarity.features.flush')
+    @patch('sentry.similarity.features.bulk_record')
+    def test_rebuild(self, bulk_record, flush):
+        checkpoint = os.path.join(self.directory, 'checkpoint')
+
+        rv = self.invoke(
+            six.text_type(self.project.id),
+            '--batch-size=2',
+            '--events-per-group=1',
+            '--checkpoint={}'.format(checkpoint),
+        )
+        assert rv.exit_code == 0, rv.output
+
+        assert flush.call_count == 1
+        assert bulk_record.call_count == 2
+        recorded = [event for call in bulk_record.call_args_list for event in call[0][0]]
+        assert sorted(event.group_id for event in recorded) == sorted(
+            group.id for group in self.groups
+        )
+
+        assert load_checkpoints(checkpoint) == {
+            self.project.id: max(group.id for group in self.groups),
+        }
+
+        # Running the command again should resume from the checkpoint, which
+        # has no remaining groups to record.
+        bulk_record.reset_mock()
+        flush.reset_mock()
+        rv = self.invoke(
+            '{}/{}'.format(self.organization.slug, self.project.slug),
+            '--checkpoint={}'.format(checkpoint),
+        )
+        assert rv.exit_code == 0, rv.output
+        assert flush.call_count == 0
+        assert bulk_record.call_count == 0
+
+    def test_missing_project(self):
+        rv = self.invoke('does-not/exist')
+        assert rv.exit_code != 0
+        assert 'Project not found' in rv.output
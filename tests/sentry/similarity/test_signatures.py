@@ -3,14 +3,18 @@ from __future__ import absolute_import
 from collections import Counter
 from unittest import TestCase
 
-from sentry.similarity.signatures import MinHashSignatureBuilder
+from sentry.similarity.signatures import (
+    MinHashSignatureBuilder, PackedMinHashSignatureBuilder
+)
 
 
 class MinHashSignatureBuilderTestCase(TestCase):
+    builder = MinHashSignatureBuilder
+
     def test_signatures(self):
         n = 32
         r = 0xFFFF
-        get_signature = MinHashSignatureBuilder(n, r)
+        get_signature = self.builder(n, r)
         get_signature(set(['foo', 'bar', 'baz'])) == get_signature(set(['foo', 'bar', 'baz']))
 
         assert len(get_signature('hello world')) == n
@@ -38,3 +42,18 @@ class MinHashSignatureBuilderTestCase(TestCase):
             estimation,
             delta=0.1,  # totally made up constant, seems reasonable
         )
+
+
+class PackedMinHashSignatureBuilderTestCase(MinHashSignatureBuilderTestCase):
+    builder = PackedMinHashSignatureBuilder
+
+    def test_signature_widths(self):
+        for n, r in ((5, 0xFFFF), (16, 1 << 20), (3, 1 << 40)):
+            signature = self.builder(n, r)('hello world')
+            assert len(signature) == n
+            for value in signature:
+                assert 0 <= value < r
+
+    def test_empty_features(self):
+        with self.assertRaises(ValueError):
+            self.builder(16, 0xFFFF)([])
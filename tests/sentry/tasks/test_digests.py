@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+
+import time
+
+from mock import patch
+
+from sentry.digests.backends.redis import RedisBackend
+from sentry.digests.notifications import event_to_record
+from sentry.plugins.sentry_mail.models import MailPlugin
+from sentry.tasks.digests import deliver_digests
+from sentry.testutils import TestCase
+
+
+class DeliverDigestsTestCase(TestCase):
+    @patch.object(MailPlugin, 'notify_digest', autospec=True)
+    def test_delivers_batch(self, notify_digest):
+        backend = RedisBackend()
+
+        keys = []
+        projects = [self.create_project() for _ in range(2)]
+        for project in projects:
+            rule = project.rule_set.all()[0]
+            key = 'mail:p:{}'.format(project.id)
+            for _ in range(2):
+                event = self.create_event(group=self.create_group(project=project))
+                backend.add(key, event_to_record(event, (rule, )), timestamp=time.time())
+            keys.append(key)
+
+        missing = 'mail:p:{}'.format(max(project.id for project in projects) + 1)
+
+        with patch('sentry.digests.digest_many', backend.digest_many), \
+                patch('sentry.digests.delete') as delete:
+            deliver_digests(keys + [missing])
+
+        delete.assert_called_once_with(missing)
+        assert sorted(call[0][1].id for call in notify_digest.call_args_list) == \
+            [project.id for project in projects]
+
+        # The timelines should have been closed (and returned to the waiting
+        # state) after the digests were built.
+        with backend.digest_many(keys) as timelines:
+            assert timelines == {}
@@ -1,12 +1,16 @@
 from __future__ import absolute_import
 
 from collections import defaultdict
+from datetime import timedelta
+from django.utils import timezone
 from mock import patch
 
 from sentry import tagstore
 from sentry.tagstore.models import GroupTagValue
-from sentry.tasks.merge import merge_group, rehash_group_events
-from sentry.models import Event, Group, GroupEnvironment, GroupMeta, GroupRedirect, UserReport
+from sentry.tasks.merge import merge_group, merge_objects, rehash_group_events
+from sentry.models import (
+    Event, Group, GroupEnvironment, GroupMeta, GroupRedirect, GroupRelease, UserReport
+)
 from sentry.similarity import _make_index_backend
 from sentry.testutils import TestCase
 from sentry.utils import redis
@@ -47,6 +51,61 @@ class MergeGroupTest(TestCase):
             flat=True,
         )) == [1, 2]
 
+    def test_merge_group_releases(self):
+        now = timezone.now()
+        group1 = self.create_group(self.project)
+        group2 = self.create_group(self.project)
+
+        GroupRelease.objects.create(
+            project_id=self.project.id,
+            group_id=group1.id,
+            release_id=1,
+            first_seen=now - timedelta(days=2),
+            last_seen=now - timedelta(days=1),
+        )
+        GroupRelease.objects.create(
+            project_id=self.project.id,
+            group_id=group1.id,
+            release_id=2,
+            first_seen=now,
+            last_seen=now,
+        )
+        GroupRelease.objects.create(
+            project_id=self.project.id,
+            group_id=group2.id,
+            release_id=1,
+            first_seen=now - timedelta(days=1),
+            last_seen=now,
+        )
+
+        with self.tasks():
+            merge_group(group1.id, group2.id)
+
+        releases = GroupRelease.objects.filter(group_id=group2.id).order_by('release_id')
+        assert [(r.release_id, r.first_seen, r.last_seen) for r in releases] == [
+            (1, now - timedelta(days=2), now),
+            (2, now, now),
+        ]
+        assert not GroupRelease.objects.filter(group_id=group1.id).exists()
+
+    def test_merge_objects_in_batches(self):
+        group1 = self.create_group(self.project)
+        group2 = self.create_group(self.project)
+        for environment_id in range(1, 6):
+            GroupEnvironment.objects.create(
+                group_id=group1.id,
+                environment_id=environment_id,
+            )
+
+        with patch('sentry.tasks.merge.MERGE_TIME_BUDGET', -1):
+            assert merge_objects([GroupEnvironment], group1, group2, limit=2)
+            assert GroupEnvironment.objects.filter(group_id=group2.id).count() == 2
+            assert merge_objects([GroupEnvironment], group1, group2, limit=2)
+            assert not merge_objects([GroupEnvironment], group1, group2, limit=2)
+
+        assert GroupEnvironment.objects.filter(group_id=group2.id).count() == 5
+        assert not GroupEnvironment.objects.filter(group_id=group1.id).exists()
+
     def test_merge_with_event_integrity(self):
         project1 = self.create_project()
         group1 = self.create_group(project1)
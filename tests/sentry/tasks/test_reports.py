@@ -9,12 +9,14 @@ import pytz
 from django.core import mail
 
 from sentry.app import tsdb
-from sentry.models import Project, UserOption
+from sentry.models import Activity, GroupStatus, Project, UserOption
 from sentry.tasks.reports import (
-    DISABLED_ORGANIZATIONS_USER_OPTION_KEY, Report, Skipped, change, clean_series, colorize,
-    deliver_organization_user_report, get_calendar_range, get_percentile, has_valid_aggregates,
-    index_to_month, merge_mappings, merge_sequences, merge_series, month_to_index, prepare_reports,
-    safe_add, user_subscribed_to_organization_reports
+    DISABLED_ORGANIZATIONS_USER_OPTION_KEY, Report, Skipped, backend, change, clean_series,
+    colorize, deliver_organization_user_report, deliver_organization_user_reports,
+    fetch_organization_personal_statistics, fetch_personal_statistics, get_calendar_range,
+    get_percentile, has_valid_aggregates, index_to_month, merge_mappings, merge_sequences,
+    merge_series, month_to_index, prepare_organization_reports, prepare_project_report,
+    prepare_reports, safe_add, user_subscribed_to_organization_reports
 )
 from sentry.testutils.cases import TestCase
 from sentry.utils.dates import to_datetime, to_timestamp
@@ -298,6 +300,110 @@ class ReportTestCase(TestCase):
             message = mail.outbox[0]
             assert self.organization.name in message.subject
 
+    def test_prepare_organization_reports(self):
+        now = datetime(2016, 9, 12, tzinfo=pytz.utc)
+        interval = (now - timedelta(days=7), now)
+
+        projects = [
+            self.create_project(
+                organization=self.organization,
+                teams=[self.team],
+                date_added=now - timedelta(days=90),
+            ) for _ in xrange(3)
+        ]
+
+        for i, project in enumerate(projects):
+            group = self.create_group(
+                project=project,
+                status=GroupStatus.RESOLVED,
+                first_seen=now - timedelta(days=2),
+                resolved_at=now - timedelta(days=1),
+            )
+            for model, key in ((tsdb.models.project, project.id), (tsdb.models.group, group.id)):
+                tsdb.incr(model, key, now - timedelta(days=1), count=i + 1)
+
+        with mock.patch.object(tsdb, 'get_earliest_timestamp') as get_earliest_timestamp:
+            get_earliest_timestamp.return_value = to_timestamp(now - timedelta(days=60))
+
+            reports = prepare_organization_reports(interval, projects)
+            assert set(reports) == set(projects)
+
+            for i, project in enumerate(projects):
+                report = reports[project]
+                assert report == prepare_project_report(interval, project)
+                assert report.series[-1] == (to_timestamp(now - timedelta(days=1)), (i + 1, 0))
+                assert report.issue_summaries == [i + 1, 0, 0]
+                assert report.aggregates[-1] == i + 1
+
+    def test_fetch_organization_personal_statistics(self):
+        now = datetime(2016, 9, 12, tzinfo=pytz.utc)
+        interval = (now - timedelta(days=7), now)
+
+        other_user = self.create_user()
+        group = self.create_group(status=GroupStatus.RESOLVED)
+        Activity.objects.create(
+            project=group.project,
+            group=group,
+            user=self.user,
+            type=Activity.SET_RESOLVED,
+            datetime=now - timedelta(days=1),
+        )
+
+        statistics = fetch_organization_personal_statistics(
+            interval,
+            self.organization,
+            [self.user.id, other_user.id],
+        )
+
+        assert statistics[self.user.id]['resolved'] == 1
+        assert statistics[other_user.id] == {'resolved': 0, 'users': 0}
+        assert statistics[self.user.id] == fetch_personal_statistics(
+            interval,
+            self.organization,
+            self.user,
+        )
+
+    def test_deliver_organization_user_reports_resumes(self):
+        now = datetime(2016, 9, 12, tzinfo=pytz.utc)
+        timestamp = to_timestamp(now)
+        duration = 60 * 60 * 24 * 7
+
+        project = self.create_project(
+            organization=self.organization,
+            teams=[self.team],
+            date_added=now - timedelta(days=90),
+        )
+        tsdb.incr(tsdb.models.project, project.id, now - timedelta(days=1))
+
+        with mock.patch.object(tsdb, 'get_earliest_timestamp') as get_earliest_timestamp:
+            get_earliest_timestamp.return_value = to_timestamp(now - timedelta(days=60))
+
+            backend.prepare(timestamp, duration, self.organization)
+
+            with self.tasks():
+                deliver_organization_user_reports(
+                    timestamp,
+                    duration,
+                    self.organization.id,
+                    [self.user.id],
+                )
+            assert len(mail.outbox) == 1
+            assert backend.fetch_delivered(
+                timestamp,
+                duration,
+                self.organization,
+            ) == set([self.user.id])
+
+            # Running the same batch again should not deliver another report.
+            with self.tasks():
+                deliver_organization_user_reports(
+                    timestamp,
+                    duration,
+                    self.organization.id,
+                    [self.user.id],
+                )
+            assert len(mail.outbox) == 1
+
     def test_deliver_organization_user_report_respects_settings(self):
         user = self.user
         organization = self.organization
@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+
+from mock import patch
+
+from sentry.tasks.similarity import buffer_event, flush_buffer
+from sentry.testutils import TestCase
+
+
+class FlushBufferTest(TestCase):
+    @patch('sentry.similarity.features.bulk_record')
+    def test_flush(self, bulk_record):
+        project = self.create_project()
+        other_project = self.create_project()
+        events = [
+            self.create_event(group=self.create_group(project=project)),
+            self.create_event(group=self.create_group(project=project)),
+            self.create_event(group=self.create_group(project=other_project)),
+        ]
+
+        for event in events:
+            buffer_event(event)
+
+        flush_buffer(batch_size=2)
+
+        assert bulk_record.call_count == 2
+        recorded = [
+            event for call in bulk_record.call_args_list for event in call[0][0]
+        ]
+        assert sorted(event.id for event in recorded) == sorted(event.id for event in events)
+        for event in recorded:
+            assert event.group.project_id == event.project.id
+
+        bulk_record.reset_mock()
+        flush_buffer(batch_size=2)
+        assert bulk_record.call_count == 0
@@ -7,7 +7,11 @@ from time import time
 from sentry import quotas, tsdb
 from sentry.event_manager import EventManager, HashDiscarded
 from sentry.plugins import Plugin2
-from sentry.tasks.store import preprocess_event, process_event, save_event
+from sentry.models import SymCacheConversionPending
+from sentry.models.dsymfile import _conversion_state
+from sentry.tasks.store import (
+    SYMCACHE_MAX_ATTEMPTS, preprocess_event, process_event, save_event
+)
 from sentry.testutils import PluginTestCase
 from sentry.utils.dates import to_datetime
 
@@ -78,6 +82,32 @@ class StoreTasksTest(PluginTestCase):
         assert mock_process_event.delay.call_count == 0
         assert mock_save_event.delay.call_count == 1
 
+    @mock.patch('sentry.tasks.store.save_event')
+    @mock.patch('sentry.tasks.store.process_event')
+    @mock.patch('sentry.tasks.store.default_cache')
+    def test_inline_event_is_cached_for_processing(
+        self, mock_default_cache, mock_process_event, mock_save_event
+    ):
+        project = self.create_project()
+
+        data = {
+            'project': project.id,
+            'platform': 'mattlang',
+            'message': 'test',
+            'extra': {
+                'foo': 'bar'
+            },
+        }
+
+        preprocess_event(data=data, event_id='a' * 32)
+
+        cache_key = 'e:%s:%s' % ('a' * 32, project.id)
+        mock_default_cache.set.assert_called_once_with(cache_key, data, 3600)
+        mock_process_event.delay.assert_called_once_with(
+            cache_key=cache_key, start_time=None, event_id='a' * 32,
+        )
+        assert mock_save_event.delay.call_count == 0
+
     @mock.patch('sentry.tasks.store.save_event')
     @mock.patch('sentry.tasks.store.default_cache')
     def test_process_event_mutate_and_save(self, mock_default_cache, mock_save_event):
@@ -138,6 +168,56 @@ class StoreTasksTest(PluginTestCase):
             project_id=project.id
         )
 
+    @mock.patch('sentry.tasks.store.process_stacktraces')
+    @mock.patch('sentry.tasks.store.save_event')
+    @mock.patch('sentry.tasks.store.default_cache')
+    def test_process_event_symcache_pending(
+        self, mock_default_cache, mock_save_event, mock_process_stacktraces
+    ):
+        project = self.create_project()
+        mock_default_cache.get.return_value = {
+            'project': project.id,
+            'platform': 'noop',
+            'message': 'test',
+        }
+        mock_process_stacktraces.side_effect = SymCacheConversionPending(['a'], retry_after=5)
+
+        with mock.patch.object(process_event, 'apply_async') as apply_async:
+            process_event(cache_key='e:1', start_time=1, symcache_attempts=1)
+
+        apply_async.assert_called_once_with(kwargs=dict(
+            cache_key='e:1', start_time=1, event_id=None, symcache_attempts=2,
+        ), countdown=5)
+        assert not mock_save_event.delay.called
+
+    @mock.patch('sentry.tasks.store.process_stacktraces')
+    @mock.patch('sentry.tasks.store.save_event')
+    @mock.patch('sentry.tasks.store.default_cache')
+    def test_process_event_symcache_pending_too_long(
+        self, mock_default_cache, mock_save_event, mock_process_stacktraces
+    ):
+        project = self.create_project()
+        mock_default_cache.get.return_value = {
+            'project': project.id,
+            'platform': 'noop',
+            'message': 'test',
+        }
+
+        # After the last attempt the event is processed without waiting
+        def process_stacktraces(data):
+            assert _conversion_state.give_up
+        mock_process_stacktraces.side_effect = process_stacktraces
+
+        with mock.patch.object(process_event, 'apply_async') as apply_async:
+            process_event(cache_key='e:1', start_time=1, symcache_attempts=SYMCACHE_MAX_ATTEMPTS)
+
+        assert mock_process_stacktraces.called
+        assert not apply_async.called
+        mock_save_event.delay.assert_called_once_with(
+            cache_key='e:1', data=None, start_time=1, event_id=None,
+            project_id=project.id
+        )
+
     @mock.patch('sentry.tasks.store.save_event')
     @mock.patch('sentry.tasks.store.default_cache')
     def test_process_event_unprocessed(self, mock_default_cache, mock_save_event):
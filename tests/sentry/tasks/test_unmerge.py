@@ -188,6 +188,21 @@ class UnmergeTestCase(TestCase):
         }
 
     def test_unmerge(self):
+        with patch.object(unmerge, 'delay', wraps=unmerge.delay) as delay:
+            self.assert_unmerge()
+        assert delay.call_count == 1
+
+    @patch('sentry.tasks.unmerge.UNMERGE_TIME_BUDGET', -1)
+    def test_unmerge_out_of_time(self):
+        # Without any time left every batch is followed by a chained task,
+        # and the denormalizations of all of them add up to the same totals.
+        with patch.object(unmerge, 'delay', wraps=unmerge.delay) as delay:
+            self.assert_unmerge()
+        event_ids = sorted(Event.objects.values_list('id', flat=True), reverse=True)
+        assert [c[1].get('cursor') for c in delay.call_args_list] == \
+            [None] + [event_ids[i] for i in (4, 9, 14, 16)]
+
+    def assert_unmerge(self):
         def shift(i):
             return timedelta(seconds=1 << i)
 
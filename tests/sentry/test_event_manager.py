@@ -1191,6 +1191,91 @@ class EventManagerTest(TransactionTestCase):
             signal=event_discarded,
         )
 
+    def test_caches_hash_resolution(self):
+        for event_id in ('a' * 32, 'b' * 32):
+            manager = EventManager(
+                self.make_event(
+                    event_id=event_id,
+                    fingerprint=['a' * 32],
+                )
+            )
+            with self.tasks():
+                event = manager.save(1)
+
+        grouphash = GroupHash.objects.get(group=event.group_id)
+        cached, _ = GroupHash.fetch_cached(1, [grouphash.hash])
+        assert cached[grouphash.hash].id == grouphash.id
+        assert cached[grouphash.hash].group_id == event.group_id
+
+        manager = EventManager(
+            self.make_event(
+                event_id='c' * 32,
+                fingerprint=['a' * 32],
+            )
+        )
+        with self.tasks(), mock.patch.object(GroupHash.objects, 'filter') as filter:
+            assert manager.save(1).group_id == event.group_id
+
+        assert not filter.called
+
+    def test_stale_hash_resolution_cache(self):
+        for event_id in ('a' * 32, 'b' * 32):
+            manager = EventManager(
+                self.make_event(
+                    event_id=event_id,
+                    fingerprint=['a' * 32],
+                )
+            )
+            with self.tasks():
+                event = manager.save(1)
+
+        # Move the hash to another group without invalidating the cache, as if
+        # an invalidation had been missed while the source group was merged.
+        source = Group.objects.get(id=event.group_id)
+        source.update(status=GroupStatus.PENDING_MERGE)
+        destination = self.create_group(project=source.project)
+        GroupHash.objects.filter(group=source).update(group=destination)
+
+        manager = EventManager(
+            self.make_event(
+                event_id='c' * 32,
+                fingerprint=['a' * 32],
+            )
+        )
+        with self.tasks():
+            assert manager.save(1).group_id == destination.id
+
+        # The stale resolution is invalidated
+        assert GroupHash.fetch_cached(1, ['a' * 32])[0] == {}
+
+    def test_pending_hash_resolution_cache(self):
+        for event_id in ('a' * 32, 'b' * 32):
+            manager = EventManager(
+                self.make_event(
+                    event_id=event_id,
+                    fingerprint=['a' * 32],
+                )
+            )
+            with self.tasks():
+                event = manager.save(1)
+
+        # The cached resolution is still accurate while the group is pending
+        # merge, so it is kept.
+        Group.objects.get(id=event.group_id).update(status=GroupStatus.PENDING_MERGE)
+        cached, version = GroupHash.fetch_cached(1, ['a' * 32])
+        assert cached['a' * 32].group_id == event.group_id
+
+        manager = EventManager(
+            self.make_event(
+                event_id='c' * 32,
+                fingerprint=['a' * 32],
+            )
+        )
+        with self.tasks():
+            assert manager.save(1).group_id == event.group_id
+
+        assert GroupHash.fetch_cached(1, ['a' * 32]) == (cached, version)
+
     def test_event_saved_signal(self):
         mock_event_saved = mock.Mock()
         event_saved.connect(mock_event_saved)
@@ -0,0 +1,80 @@
+from __future__ import absolute_import
+
+import gc
+import mock
+
+from sentry.testutils import TestCase
+from sentry.utils import optioncache
+from sentry.utils.optioncache import OptionCache
+
+
+class OptionCacheTest(TestCase):
+    def test_get_and_set(self):
+        local = OptionCache()
+        assert local.get('foo:1') is None
+
+        local.set('foo:1', {'bar': 'baz'})
+        assert local.get('foo:1') == {'bar': 'baz'}
+
+        other = OptionCache()
+        assert other.get('foo:1') == {'bar': 'baz'}
+
+    def test_local_entries_are_used_until_they_expire(self):
+        local = OptionCache()
+        other = OptionCache()
+        local.set('foo:1', {'bar': 'baz'})
+        assert other.get('foo:1') == {'bar': 'baz'}
+
+        local.set('foo:1', {'bar': 'qux'})
+        assert other.get('foo:1') == {'bar': 'baz'}
+
+        self.expire_entry(other, 'foo:1')
+        assert other.get('foo:1') == {'bar': 'qux'}
+
+        # unchanged versions are not fetched again
+        self.expire_entry(other, 'foo:1')
+        with mock.patch.object(optioncache.cache, 'get_many') as get_many:
+            assert other.get('foo:1') == {'bar': 'qux'}
+            assert not get_many.called
+
+    def expire_entry(self, option_cache, cache_key):
+        values, version, _ = option_cache.entries[cache_key]
+        option_cache.entries[cache_key] = (values, version, 0)
+
+    def test_caches_are_not_kept_alive(self):
+        count = len(optioncache._caches)
+        local = OptionCache()
+        assert len(optioncache._caches) == count + 1
+
+        del local
+        gc.collect()
+        assert len(optioncache._caches) == count
+
+    def test_expire(self):
+        local = OptionCache()
+        local.set('foo:1', {'bar': 'baz'})
+
+        with self.settings(SENTRY_OPTION_CACHE_PUBSUB={'host': 'localhost'}):
+            local.expire()
+            assert 'foo:1' in local.entries
+
+        local.expire()
+        assert 'foo:1' not in local.entries
+
+    @mock.patch('sentry.utils.optioncache._get_subscriber')
+    @mock.patch('sentry.utils.optioncache._get_publisher')
+    def test_publishes_changes(self, get_publisher, get_subscriber):
+        local = OptionCache()
+        other = OptionCache()
+
+        with self.settings(SENTRY_OPTION_CACHE_PUBSUB={'host': 'localhost'}):
+            local.set('foo:1', {'bar': 'baz'})
+            assert other.get('foo:1') == {'bar': 'baz'}
+            assert get_subscriber.return_value.start.called
+
+            local.set('foo:1', {'bar': 'qux'})
+            get_publisher.return_value.publish.assert_called_with(
+                optioncache.CHANNEL, 'foo:1')
+
+            optioncache._invalidate('foo:1')
+            assert other.get('foo:1') == {'bar': 'qux'}